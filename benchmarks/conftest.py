@@ -0,0 +1,70 @@
+import json
+import threading
+
+import pytest
+
+from notify.testing import StubCredential, StubHandler, StubServer
+
+
+class RequestCounter(list):
+    """
+    Request log of the fake server that only counts the requests, so long benchmarks do not keep every body.
+    """
+
+    count = 0
+
+    def append(self, request) -> None:
+        self.count += 1
+
+
+class FakeHandler(StubHandler):
+    # keep-alive connections, like Graph and Teams, so the benchmarks measure the pooled connections of the clients.
+    protocol_version = "HTTP/1.1"
+    # the headers and body of a response are written separately, with Nagle's algorithm every response waits ~40ms.
+    disable_nagle_algorithm = True
+
+
+class FakeServer(StubServer):
+    """
+    Local stand-in for the Graph API and Teams webhooks, answering every request like the service does when it accepts
+    it: 202 for sendMail, 202 per e-mail for `$batch` and 200 for webhooks.
+    """
+
+    # the default backlog of 5 drops connections at high concurrency, which are retried by the kernel after a second.
+    request_queue_size = 128
+
+    def __init__(self):
+        super().__init__()
+        self.RequestHandlerClass = FakeHandler
+        self.requests = RequestCounter()
+
+    def next_response(self, path: str, body: bytes) -> tuple:
+        if path.endswith("/$batch"):
+            responses = [{"id": request["id"], "status": 202} for request in json.loads(body)["requests"]]
+            return 200, {}, {"responses": responses}
+        if path.endswith("/sendMail"):
+            return 202, {}, b""
+
+        return 200, {}, b"1"
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server = FakeServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def fake_graph(fake_server):
+    from notify.msgraph import Graph
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("EMAIL_USER", "sender@example.com")
+        graph = Graph(credential=StubCredential(), base_url=f"{fake_server.url}/v1.0")
+        graph.ensure_graph_for_app_only_auth()
+        yield graph
+        graph.close()
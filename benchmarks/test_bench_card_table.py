@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from notify import NotifyTeams
+
+
+def create_table_records(df: pd.DataFrame) -> dict:
+    """
+    Previous implementation of `NotifyTeams.create_adaptive_card_dataframe`, building the table cell by cell from
+    `df.to_dict("records")`, kept as reference.
+    """
+    col_widths = [{"width": "auto"} for _ in df.columns]
+    header_cells = [
+        {
+            "type": "TableCell",
+            "items": [{"type": "TextBlock", "style": "emphasis", "text": col, "wrap": True, "weight": "bolder"}],
+        }
+        for col in df.columns
+    ]
+    rows = [{"type": "TableRow", "cells": header_cells}]
+    for row in df.to_dict("records"):
+        cells = []
+        for key, value in row.items():
+            cell = {"type": "TableCell", "items": [{"type": "TextBlock", "text": value, "wrap": True}]}
+            cells.append(cell)
+        rows.append({"type": "TableRow", "cells": cells})
+    return {"type": "Table", "columns": col_widths, "rows": rows, "showGridLines": True}
+
+
+@pytest.fixture(scope="module")
+def df() -> pd.DataFrame:
+    """
+    10k x 10 frame with integer, float, text and date columns.
+    """
+    n = 10_000
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            **{f"int {i}": rng.integers(0, 1_000_000, n) for i in range(3)},
+            **{f"float {i}": rng.random(n) * 1000 for i in range(3)},
+            **{f"text {i}": rng.choice(["red", "white", "blue"], n) for i in range(2)},
+            **{
+                f"date {i}": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+                for i in range(2)
+            },
+        }
+    )
+
+
+def test_card_table_columns(benchmark, df):
+    table = benchmark(NotifyTeams.create_adaptive_card_dataframe, df, max_rows=None)
+    assert len(table["rows"]) == df.shape[0] + 1
+
+
+def test_card_table_records(benchmark, df):
+    table = benchmark(create_table_records, df)
+    assert len(table["rows"]) == df.shape[0] + 1
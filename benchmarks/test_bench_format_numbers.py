@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from babel.numbers import format_currency, format_decimal
+
+from notify import format_numbers
+
+
+def format_numbers_apply(df: pd.DataFrame, currency_columns: list, number_columns: list) -> pd.DataFrame:
+    """
+    Previous implementation of `format_numbers`, calling babel for every cell, kept as reference.
+    """
+    for col in currency_columns:
+        df[col] = df[col].apply(lambda x: format_currency(number=x, currency="EUR", locale="nl_NL"))
+    for col in number_columns:
+        df[col] = df[col].apply(lambda x: format_decimal(number=x, locale="nl_NL"))
+    return df
+
+
+@pytest.fixture(scope="module")
+def df() -> pd.DataFrame:
+    """
+    100k rows with an amount and a number column.
+    """
+    n = 100_000
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"amount": rng.normal(0, 10_000, n).round(2), "number": rng.random(n) * 1_000_000})
+
+
+def test_format_numbers_vectorized(benchmark, df):
+    result = benchmark(format_numbers, df, currency_columns=["amount"], number_columns=["number"], inplace=False)
+    assert result.shape == df.shape
+
+
+def test_format_numbers_apply(benchmark, df):
+    result = benchmark.pedantic(format_numbers_apply, setup=lambda: ((df.copy(), ["amount"], ["number"]), {}), rounds=3)
+    assert result.shape == df.shape
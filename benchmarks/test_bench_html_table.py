@@ -0,0 +1,64 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notify.utils import HTML_FOOT, HTML_HEAD, dataframe_to_html, iter_html_table
+
+
+def dataframe_to_html_pandas(df: pd.DataFrame) -> str:
+    """
+    Previous implementation of `dataframe_to_html` with `DataFrame.to_html`, kept as reference.
+    """
+    return HTML_HEAD + df.to_html(index=False, classes="styled-table", justify="center") + HTML_FOOT
+
+
+@pytest.fixture(scope="module")
+def df() -> pd.DataFrame:
+    """
+    10k x 8 frame with integer, float, text and date columns.
+    """
+    n = 10_000
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            **{f"int {i}": rng.integers(0, 1_000_000, n) for i in range(2)},
+            **{f"float {i}": rng.random(n) * 1000 for i in range(2)},
+            **{f"text {i}": rng.choice(["red", "white", "<blue>"], n) for i in range(2)},
+            **{
+                f"date {i}": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+                for i in range(2)
+            },
+        }
+    )
+
+
+def test_html_table_streaming(benchmark, df):
+    html = benchmark(dataframe_to_html, df)
+    assert html.count("<tr>") == df.shape[0]
+
+
+def test_html_table_to_html(benchmark, df):
+    html = benchmark(dataframe_to_html_pandas, df)
+    assert html.count("<tr>") == df.shape[0]
+
+
+def peak_memory(df: pd.DataFrame, chunk_size: int) -> int:
+    """
+    Peak memory in bytes while streaming the HTML table of `df` without keeping the chunks.
+    """
+    tracemalloc.start()
+    try:
+        for _ in iter_html_table(df, chunk_size=chunk_size):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_html_table_chunk_memory(df):
+    """
+    Streaming in chunks of rows keeps only the cells of one chunk in memory.
+    """
+    assert peak_memory(df, chunk_size=1_000) < peak_memory(df, chunk_size=len(df)) / 3
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_import(statement: str) -> None:
+    subprocess.run([sys.executable, "-c", statement], cwd=ROOT, check=True)
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import notify",
+        "from notify import NotifyTeams",
+        "from notify import NotifyMail",
+        "from notify import NotifyMail; import notify.msgraph",
+    ],
+)
+def test_import_time(benchmark, statement):
+    """
+    Time of importing notify in a fresh interpreter, including the start of the interpreter itself.
+    """
+    benchmark.pedantic(run_import, args=(statement,), rounds=5)
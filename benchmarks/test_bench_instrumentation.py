@@ -0,0 +1,27 @@
+import pytest
+
+from notify import NotifyTeams, instrumentation
+
+
+def ignore(event) -> None:
+    pass
+
+
+@pytest.mark.parametrize("hook", [False, True], ids=["disabled", "hook"])
+def test_build_instrumented(benchmark, hook):
+    teams = NotifyTeams(webhook=None)
+    if hook:
+        instrumentation.add_hook(ignore)
+    try:
+        benchmark(teams.build, title="Benchmark", subtitle="Instrumentation", message="Timed stages")
+    finally:
+        if hook:
+            instrumentation.remove_hook(ignore)
+
+
+def test_stage_disabled(benchmark):
+    def run():
+        with instrumentation.stage("teams", "post") as s:
+            s.set(status_code=200)
+
+    benchmark(run)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from notify import NotifyTeams
+
+
+@pytest.fixture
+def teams() -> NotifyTeams:
+    """
+    Teams message with a full dataframe card (30 rows by 10 columns, the maximum of `create_adaptive_card_dataframe`).
+    """
+    df = pd.DataFrame(np.random.randint(0, 1_000_000, size=(30, 10)), columns=[f"column {i}" for i in range(10)])
+    teams = NotifyTeams(webhook="http://127.0.0.1")
+    teams.create_message_header(title="Benchmark", subtitle="Payload size")
+    teams.create_simple_message("Reconciliation report<br>" * 5)
+    teams.add_full_dataframe(df.astype(str))
+    teams.msg["attachments"][0]["content"]["body"] = teams.body
+    return teams
+
+
+def test_payload_size_serialized(benchmark, teams):
+    size = benchmark(lambda: len(teams.serialize_message()))
+    assert size < 40_000
+
+
+def test_payload_size_asizeof(benchmark, teams):
+    asizeof = pytest.importorskip("pympler.asizeof")
+    benchmark(asizeof.asizeof, teams.body)
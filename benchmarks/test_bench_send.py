@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from notify import NotifyMail, NotifyTeams, loop
+
+MESSAGES = 100
+CONCURRENCY = [1, 10, 50]
+
+
+async def send_teams(webhook: str, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    teams = NotifyTeams(webhook=webhook)
+
+    async def send(i: int):
+        async with semaphore:
+            return await teams.basic_message_async(title=f"Benchmark {i}", message="Sent to the fake webhook")
+
+    return await asyncio.gather(*(send(i) for i in range(MESSAGES)))
+
+
+def test_teams_fanout(benchmark, fake_server):
+    # an alert to 15 channels, built once and posted concurrently
+    teams = NotifyTeams(webhook=None)
+    message = teams.build(title="Incident", message="Sent to the fake webhooks")
+    webhooks = [f"{fake_server.url}/webhook/{i}" for i in range(15)]
+    results = benchmark(teams.send_many, message, webhooks)
+    assert all(result.success for result in results)
+
+
+def create_mails(graph, n: int) -> list:
+    return [
+        NotifyMail(to=f"user{i}@example.com", subject="Benchmark", message="Sent to the fake Graph API", graph=graph)
+        for i in range(n)
+    ]
+
+
+def record_throughput(benchmark) -> None:
+    # there are no stats when the benchmarks run as plain tests with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["messages_per_second"] = MESSAGES / benchmark.stats.stats.mean
+
+
+def test_teams_latency(benchmark, fake_server):
+    teams = NotifyTeams(webhook=f"{fake_server.url}/webhook")
+    result = benchmark(teams.basic_message, title="Benchmark", message="Sent to the fake webhook")
+    assert result.success
+
+
+@pytest.mark.parametrize("concurrency", CONCURRENCY)
+def test_teams_throughput(benchmark, fake_server, concurrency):
+    results = benchmark.pedantic(
+        loop.run, setup=lambda: ((send_teams(f"{fake_server.url}/webhook", concurrency),), {}), rounds=5
+    )
+    assert all(result.success for result in results)
+    record_throughput(benchmark)
+
+
+def test_mail_latency(benchmark, fake_graph):
+    (mail,) = create_mails(fake_graph, 1)
+    assert benchmark(mail.send_email)
+
+
+@pytest.mark.parametrize("batch", [False, True], ids=["single", "batch"])
+@pytest.mark.parametrize("concurrency", CONCURRENCY)
+def test_mail_throughput(benchmark, fake_graph, concurrency, batch):
+    results = benchmark.pedantic(
+        NotifyMail.send_many,
+        setup=lambda: ((create_mails(fake_graph, MESSAGES),), {"max_concurrency": concurrency, "batch": batch}),
+        rounds=5,
+    )
+    assert all(result.success for result in results)
+    record_throughput(benchmark)
@@ -0,0 +1,37 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notify import NotifyTeams
+from notify.teams import serialize
+
+
+@pytest.fixture(scope="module")
+def msg() -> dict:
+    """
+    Teams message with a full dataframe card of 30 rows by 10 columns.
+    """
+    df = pd.DataFrame(np.random.randint(0, 1_000_000, size=(30, 10)), columns=[f"column {i}" for i in range(10)])
+    teams = NotifyTeams(webhook="http://127.0.0.1")
+    teams.create_message_header(title="Benchmark", subtitle="Serialize")
+    teams.add_full_dataframe(df)
+    teams.msg["attachments"][0]["content"]["body"] = teams.body
+    return teams.msg
+
+
+def test_serialize_json(benchmark, msg):
+    benchmark(lambda: json.dumps(msg, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def test_serialize(benchmark, msg):
+    payload = benchmark(serialize, msg)
+    assert json.loads(payload) == msg
+
+
+def test_serialize_gzip(benchmark, msg):
+    payload = serialize(msg)
+    compressed = benchmark(gzip.compress, payload, compresslevel=6)
+    assert len(compressed) < len(payload) / 4
@@ -0,0 +1,66 @@
+from notify import NotifyTeams
+from notify.templates import CardTemplate, MailTemplate
+
+PARAMS = {"job": "import", "run": 17, "error": "Connection reset by peer", "rows": 12345}
+MERGE_RECIPIENTS = 100
+# above the 30 rows in the message, so every e-mail has an overflow attachment
+MERGE_TABLE_ROWS = 1000
+
+
+def build_message(job: str, run: int, error: str, rows: int) -> bytes:
+    """
+    The message as `NotifyTeams.basic_message` builds it, for every alert from scratch.
+    """
+    teams = NotifyTeams(webhook="http://127.0.0.1")
+    teams.create_message_header(title=f"Job {job} failed", subtitle=f"Run {run}")
+    teams.create_warning_message(f"Check {job}")
+    teams.create_simple_message(f"Error: {error}<br>Rows: {rows:,}")
+    teams.create_buttons({"Logs": f"https://logs.example.com/{run}"})
+    teams.msg["attachments"][0]["content"]["body"] = teams.body
+    return teams.serialize_message()
+
+
+def test_alert_builders(benchmark):
+    benchmark(build_message, **PARAMS)
+
+
+def test_alert_template(benchmark):
+    template = CardTemplate(
+        title="Job {job} failed",
+        subtitle="Run {run}",
+        warning_message="Check {job}",
+        message="Error: {error}<br>Rows: {rows:,}",
+        buttons={"Logs": "https://logs.example.com/{run}"},
+    )
+    payload = benchmark(template.render, **PARAMS)
+    assert payload == build_message(**PARAMS)
+
+
+def merge_rows(n: int) -> list:
+    return [{"email": f"user{i}@example.com", "name": f"User {i}", "amount": i} for i in range(n)]
+
+
+def test_mail_per_row(benchmark, fake_graph):
+    # a NotifyMail per recipient, which renders the table and writes the overflow attachment of every e-mail again
+    df = [{"product": f"product {i}", "sales": i} for i in range(MERGE_TABLE_ROWS)]
+    template = MailTemplate(subject="Your figures: {amount}", message="<p>Dear {name},</p>", overflow="csv")
+
+    def create():
+        mails = [
+            template.create_mail(to=row["email"], df=df, graph=fake_graph, **row)
+            for row in merge_rows(MERGE_RECIPIENTS)
+        ]
+        return [mail.create_request_body() for mail in mails]
+
+    benchmark(create)
+
+
+def test_mail_merge(benchmark, fake_graph):
+    df = [{"product": f"product {i}", "sales": i} for i in range(MERGE_TABLE_ROWS)]
+    template = MailTemplate(subject="Your figures: {amount}", message="<p>Dear {name},</p>", overflow="csv")
+
+    def create():
+        mails = template.merge(merge_rows(MERGE_RECIPIENTS), df=df, graph=fake_graph)
+        return [mail.create_request_body() for mail in mails]
+
+    benchmark(create)
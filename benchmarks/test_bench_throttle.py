@@ -0,0 +1,15 @@
+import itertools
+
+from notify.throttle import Throttle
+
+
+def test_throttle_memory(benchmark):
+    throttle = Throttle(window=300)
+    messages = itertools.count()
+    benchmark(lambda: throttle.check("webhook", f"Job {next(messages) % 100} failed"))
+
+
+def test_throttle_sqlite(benchmark, tmp_path):
+    throttle = Throttle(window=300, path=str(tmp_path / "throttle.db"))
+    messages = itertools.count()
+    benchmark(lambda: throttle.check("webhook", f"Job {next(messages) % 100} failed"))
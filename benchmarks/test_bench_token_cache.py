@@ -0,0 +1,13 @@
+from notify.testing import StubCredential
+from notify.token_cache import CachedCredential
+
+
+def test_token_cache_new_process(benchmark, tmp_path):
+    # the first token of a new process, read from the cache shared with earlier processes
+    path = str(tmp_path / "tokens.db")
+    CachedCredential(StubCredential(), secret="secret", path=path).get_token("scope")
+
+    def first_token():
+        return CachedCredential(StubCredential(), secret="secret", path=path).get_token("scope")
+
+    assert benchmark(first_token).token == "stub-token"
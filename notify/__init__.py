@@ -1,9 +1,6 @@
+import importlib
 import logging
 
-from notify.mail import NotifyMail  # noqa
-from notify.teams import NotifyTeams  # noqa
-from notify.utils import dataframe_to_html, format_numbers  # noqa
-
 logging.basicConfig(
     format="%(asctime)s.%(msecs)03d [%(levelname)-5s] [%(name)s] - %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
@@ -12,3 +9,27 @@ logging.basicConfig(
 
 name = "notify"
 __version__ = "1.0.1"
+
+# public names and the module they are defined in. The modules are imported on first use (PEP 562), so a job that only
+# sends Teams messages does not import pandas or the Graph SDK.
+_LAZY_IMPORTS = {
+    "NotifyMail": "notify.mail",
+    "NotifyTeams": "notify.teams",
+    "dataframe_to_html": "notify.utils",
+    "format_numbers": "notify.utils",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(attribute: str):
+    if attribute not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {attribute!r}")
+
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[attribute]), attribute)
+    globals()[attribute] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
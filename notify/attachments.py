@@ -0,0 +1,320 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib import request
+from urllib.error import HTTPError
+
+# attachments above this size can not be added inline to a message and are uploaded with an upload session.
+INLINE_LIMIT = 3 * 1024 * 1024
+# upload session chunks must be a multiple of 320 KiB and smaller than 4 MiB.
+CHUNK_SIZE = 10 * 320 * 1024
+# maximum number of files that are downloaded at the same time
+MAX_DOWNLOADS = 8
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_directory() -> str:
+    """
+    Default location of the attachment cache, in the user cache directory.
+    """
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "notify", "attachments")
+
+
+@dataclass
+class Attachment:
+    """
+    File attachment stored on local disk.
+    """
+
+    name: str
+    path: str
+    size: int
+    # content read in advance, for attachments shared by many e-mails
+    content: bytes = field(default=None, repr=False, compare=False)
+
+    @property
+    def inline(self) -> bool:
+        """
+        Whether the attachment is small enough to be added inline to the message.
+        """
+        return self.size <= INLINE_LIMIT
+
+    def read(self) -> bytes:
+        """
+        Read the full content of the attachment, only used for inline attachments.
+        """
+        if self.content is not None:
+            return self.content
+
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def iter_chunks(self, chunk_size: int = CHUNK_SIZE):
+        """
+        Read the attachment in chunks, so memory use does not depend on the size of the attachment.
+
+        Parameters
+        ----------
+        chunk_size: int
+            size of the chunks in bytes
+
+        Returns
+        -------
+        chunks: Iterator of tuple
+            (offset, chunk) pairs
+        """
+        with open(self.path, "rb") as f:
+            offset = 0
+            while chunk := f.read(chunk_size):
+                yield offset, chunk
+                offset += len(chunk)
+
+
+def is_url(path: str) -> bool:
+    # There might be a more safe way to check if a string is an url, but for our purposes, this suffices.
+    return path.startswith("http") or path.startswith("www")
+
+
+class AttachmentCache:
+    def __init__(
+        self,
+        directory: str = None,
+        max_size: int = 256 * 1024 * 1024,
+        max_age: float = 60.0,
+        min_unused: float = 300.0,
+    ):
+        """
+        Content-addressed cache on local disk for attachments behind an url. Files are stored by the SHA-256 of their
+        content, so identical files are stored once. Cached urls are revalidated with their ETag or Last-Modified
+        header once they are older than `max_age`, and the least recently used files are removed when the cache
+        exceeds `max_size`. Files used in the last `min_unused` seconds are kept, as e-mails of this or another
+        process may still read or upload them, so the cache can be larger than `max_size` for a while.
+
+        Parameters
+        ----------
+        directory: str
+            directory of the cache, defaults to `default_directory()`. The directory is only accessible by its owner,
+            and a directory owned by another user is refused, as the cached files and index are trusted.
+        max_size: int
+            maximum total size of the cached files in bytes
+        max_age: float
+            seconds a cached url is used without revalidating it
+        min_unused: float
+            seconds a file must be unused before it can be removed
+        """
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+        self.max_age = max_age
+        self.min_unused = min_unused
+        self.blob_directory = os.path.join(self.directory, "blobs")
+        self.index_directory = os.path.join(self.directory, "index")
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        # getuid does not exist on Windows, where the user profile directory is private by default.
+        if hasattr(os, "getuid") and os.stat(self.directory).st_uid != os.getuid():
+            raise PermissionError(f"Attachment cache directory {self.directory} is owned by another user")
+        os.chmod(self.directory, 0o700)
+        os.makedirs(self.blob_directory, exist_ok=True)
+        os.makedirs(self.index_directory, exist_ok=True)
+        # a lock per url that is being fetched, removed when no thread holds a reference to it anymore
+        self._locks = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> str:
+        """
+        Get the path of the cached file for an url, downloading it when it is not cached or changed.
+
+        Parameters
+        ----------
+        url: str
+            url of the file
+
+        Returns
+        -------
+        path: str
+            path of the cached file
+        """
+        with self._lock:
+            url_lock = self._locks.get(url)
+            if url_lock is None:
+                url_lock = self._locks[url] = threading.Lock()
+
+        # concurrent requests for the same url wait for a single download.
+        with url_lock:
+            entry = self._read_entry(url)
+            if entry and time.time() - entry["validated"] < self.max_age:
+                path = self._touch(entry)
+                if path is not None:
+                    return path
+                entry = None  # evicted since it was read
+
+            return self._download(url, entry)
+
+    def _download(self, url: str, entry: dict = None) -> str:
+        req = request.Request(url)
+        if entry and entry.get("etag"):
+            req.add_header("If-None-Match", entry["etag"])
+        if entry and entry.get("last_modified"):
+            req.add_header("If-Modified-Since", entry["last_modified"])
+
+        try:
+            with request.urlopen(req) as response:
+                digest, size = self._store(response)
+                headers = response.headers
+        except HTTPError as e:
+            if e.code != 304 or not entry:
+                raise
+            path = self._touch(entry)
+            if path is None:
+                # evicted while it was revalidated, so it is downloaded again
+                return self._download(url)
+            logging.debug(f"Attachment {url} not modified, using cached file.")
+            entry["validated"] = time.time()
+            self._write_entry(url, entry)
+            return path
+
+        entry = {
+            "url": url,
+            "digest": digest,
+            "size": size,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "validated": time.time(),
+        }
+        self._write_entry(url, entry)
+        self.evict(keep=digest)
+        return os.path.join(self.blob_directory, digest)
+
+    def evict(self, keep: str = None) -> None:
+        """
+        Remove the least recently used files until the cache is smaller than `max_size`. Files used in the last
+        `min_unused` seconds are not removed.
+
+        Parameters
+        ----------
+        keep: str
+            digest of a file that must not be removed
+        """
+        blobs = []
+        for entry in os.scandir(self.blob_directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                blobs.append((stat.st_mtime, stat.st_size, entry.name))
+
+        total = sum(size for _, size, _ in blobs)
+        for _, size, digest in sorted(blobs):
+            if total <= self.max_size:
+                break
+            path = os.path.join(self.blob_directory, digest)
+            try:
+                # the modification time is checked again, the file may have been used since the directory was read.
+                if digest == keep or time.time() - os.stat(path).st_mtime < self.min_unused:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # e.g. on Windows, a file that is being read can not be removed
+                logging.debug(f"Attachment {digest} not removed from the cache! Error: {e}")
+                continue
+            total -= size
+
+    def _store(self, response) -> tuple:
+        # the download is written to a temporary file while hashing, and moved to its content address afterwards.
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := response.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+            os.replace(temp_path, os.path.join(self.blob_directory, digest))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        return digest, size
+
+    def _touch(self, entry: dict):
+        # marks the file as used, so it is not evicted while it is read. None when it was evicted already.
+        path = os.path.join(self.blob_directory, entry["digest"])
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.index_directory, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _read_entry(self, url: str):
+        try:
+            with open(self._entry_path(url)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if not os.path.exists(os.path.join(self.blob_directory, entry["digest"])):
+            return None  # the file was evicted
+
+        return entry
+
+    def _write_entry(self, url: str, entry: dict) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.index_directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, self._entry_path(url))
+
+
+def get_default_cache() -> AttachmentCache:
+    """
+    Get the attachment cache that is shared by all e-mails of the process.
+    """
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AttachmentCache()
+
+        return _default_cache
+
+
+def resolve_attachments(files: dict, cache: AttachmentCache = None) -> list:
+    """
+    Resolve the files of an e-mail to attachments on local disk. Files behind an url are fetched in parallel through
+    the attachment cache.
+
+    Parameters
+    ----------
+    files: dict
+        attachment names and the path or url of the file as key value pairs
+    cache: AttachmentCache
+        cache for files behind an url, defaults to the shared cache of the process
+
+    Returns
+    -------
+    attachments: list of Attachment
+    """
+    cache = cache or get_default_cache()
+    urls = [path for path in files.values() if is_url(path)]
+    with ThreadPoolExecutor(max_workers=min(MAX_DOWNLOADS, len(urls) or 1)) as executor:
+        paths = dict(zip(urls, executor.map(cache.get, urls)))
+
+    attachments = []
+    for name, path in files.items():
+        path = paths.get(path, path)
+        attachments.append(Attachment(name=name, path=path, size=os.path.getsize(path)))
+
+    return attachments
@@ -2,3 +2,21 @@ class EnvironmentVariablesError(Exception):
     """Exception when not all env variables are set"""
 
     pass
+
+
+class GraphBatchError(Exception):
+    """Exception when a request in a Graph JSON batch failed"""
+
+    def __init__(self, status_code: int, body: dict = None):
+        self.status_code = status_code
+        self.body = body
+        message = (body or {}).get("error", {}).get("message", "")
+        super().__init__(f"Batch request failed with status {status_code}: {message}")
+
+
+class PartialDeliveryError(Exception):
+    """Exception when only the first parts of a split message are delivered"""
+
+    def __init__(self, parts_sent: int, error: Exception = None):
+        self.parts_sent = parts_sent
+        super().__init__(f"{parts_sent} parts of the message delivered, part {parts_sent + 1} failed: {error}")
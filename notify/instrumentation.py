@@ -0,0 +1,241 @@
+import contextvars
+import logging
+import time
+
+from notify.types import StageEvent
+
+_hooks = []
+_tracer = None
+# the stage that is running in the current task, so stages know their parent
+_current = contextvars.ContextVar("notify_stage", default=None)
+
+
+def add_hook(hook) -> None:
+    """
+    Add a callback that is called with a StageEvent every time a stage of a delivery finishes, e.g. to log slow
+    deliveries or to export metrics. Hooks are called on the thread that runs the stage, mostly the notify event loop,
+    so they should be fast. Exceptions raised by hooks are logged and ignored.
+
+    Parameters
+    ----------
+    hook: Callable
+        function receiving a StageEvent
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook) -> None:
+    """
+    Remove a callback added with `add_hook`.
+    """
+    _hooks.remove(hook)
+
+
+class Stage:
+    def __init__(self, kind: str, name: str):
+        """
+        A timed stage of a delivery, used as context manager. Attributes of the result, like the size of the payload or
+        the status code, are added with `set`.
+
+        Parameters
+        ----------
+        kind: str
+            "mail" or "teams"
+        name: str
+            name of the stage, e.g. "build" or "post"
+        """
+        self.kind = kind
+        self.name = name
+        self.attributes = {}
+        self.parent = None
+        self.span = None
+
+    def set(self, **attributes) -> None:
+        """
+        Add attributes to the event of the stage: size, status_code, attempts or success.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        if _tracer is not None:
+            from opentelemetry import context, trace
+
+            self.span = _tracer.start_span(f"notify.{self.kind}.{self.name}")
+            self._context_token = context.attach(trace.set_span_in_context(self.span))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if exc_value is not None:
+            self.attributes.setdefault("success", False)
+        event = StageEvent(
+            kind=self.kind,
+            stage=self.name,
+            elapsed=elapsed,
+            parent=self.parent.name if self.parent is not None else None,
+            error=exc_value,
+            **self.attributes,
+        )
+        if self.span is not None:
+            self._end_span(event)
+
+        for hook in list(_hooks):
+            try:
+                hook(event)
+            except Exception as e:
+                logging.warning(f"Instrumentation hook {hook} failed! Error: {e}")
+
+    def _end_span(self, event: StageEvent) -> None:
+        from opentelemetry import context
+        from opentelemetry.trace import Status, StatusCode
+
+        context.detach(self._context_token)
+        self.span.set_attribute("notify.kind", event.kind)
+        for key in ["size", "status_code", "attempts", "success", "suppressed"]:
+            value = getattr(event, key)
+            if value is not None:
+                self.span.set_attribute(f"notify.{key}", value)
+        if event.error is not None:
+            self.span.record_exception(event.error)
+        if event.error is not None or event.success is False:
+            self.span.set_status(Status(StatusCode.ERROR))
+        self.span.end()
+
+
+class _NoopStage:
+    # returned by `stage` when instrumentation is disabled, so a stage costs a function call.
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NOOP = _NoopStage()
+
+
+def stage(kind: str, name: str):
+    """
+    Time a stage of a delivery:
+
+        with stage("teams", "post") as s:
+            result = await post(...)
+            s.set(status_code=result.status_code)
+
+    Parameters
+    ----------
+    kind: str
+        "mail" or "teams"
+    name: str
+        name of the stage
+
+    Returns
+    -------
+    stage: Stage
+        a no-op stage when instrumentation is disabled
+    """
+    if not _hooks and _tracer is None:
+        return _NOOP
+
+    return Stage(kind, name)
+
+
+def enable_opentelemetry(tracer_provider=None) -> None:
+    """
+    Create an OpenTelemetry span for every stage of a delivery. The stages of a delivery are nested under a span per
+    notification, with the size, status code and attempts as attributes.
+
+    Parameters
+    ----------
+    tracer_provider: TracerProvider
+        tracer provider, defaults to the global tracer provider
+    """
+    global _tracer
+
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        raise ImportError("OpenTelemetry requires opentelemetry-api, install it with `pip install zyppnotify[otel]`.")
+
+    from notify import __version__
+
+    _tracer = trace.get_tracer("notify", __version__, tracer_provider=tracer_provider)
+
+
+def disable_opentelemetry() -> None:
+    """
+    Stop creating OpenTelemetry spans.
+    """
+    global _tracer
+
+    _tracer = None
+
+
+def enable_prometheus(registry=None, prefix: str = "notify"):
+    """
+    Export Prometheus metrics of the deliveries: the duration of every stage, the size of the payloads, the number of
+    notifications per result, the number of attempts and the status codes of the responses. The metrics are
+    `{prefix}_stage_duration_seconds`, `{prefix}_payload_size_bytes`, `{prefix}_notifications_total`,
+    `{prefix}_attempts_total` and `{prefix}_responses_total`.
+
+    Parameters
+    ----------
+    registry: CollectorRegistry
+        registry of the metrics, defaults to the global registry of prometheus_client
+    prefix: str
+        prefix of the metric names
+
+    Returns
+    -------
+    hook: Callable
+        the hook that updates the metrics, it can be removed with `remove_hook`
+    """
+    try:
+        from prometheus_client import REGISTRY, Counter, Histogram
+    except ImportError:
+        raise ImportError(
+            "Prometheus metrics require prometheus-client, install it with `pip install zyppnotify[metrics]`."
+        )
+
+    registry = REGISTRY if registry is None else registry
+    durations = Histogram(
+        f"{prefix}_stage_duration_seconds", "Duration of the stages of a delivery", ["kind", "stage"], registry=registry
+    )
+    sizes = Histogram(
+        f"{prefix}_payload_size_bytes",
+        "Size of the payloads",
+        ["kind"],
+        buckets=[1024 * 2**i for i in range(0, 16, 2)],
+        registry=registry,
+    )
+    notifications = Counter(
+        f"{prefix}_notifications",
+        "Notifications per result: sent, failed or suppressed",
+        ["kind", "result"],
+        registry=registry,
+    )
+    attempts = Counter(f"{prefix}_attempts", "Attempts of requests, including retries", ["kind"], registry=registry)
+    responses = Counter(f"{prefix}_responses", "Responses per status code", ["kind", "status_code"], registry=registry)
+
+    def hook(event: StageEvent) -> None:
+        durations.labels(event.kind, event.stage).observe(event.elapsed)
+        if event.size is not None:
+            sizes.labels(event.kind).observe(event.size)
+        if event.attempts is not None:
+            attempts.labels(event.kind).inc(event.attempts)
+        if event.status_code is not None:
+            responses.labels(event.kind, str(event.status_code)).inc()
+        if event.parent is None and event.stage == "send":
+            result = "suppressed" if event.suppressed else "sent" if event.success else "failed"
+            notifications.labels(event.kind, result).inc()
+
+    add_hook(hook)
+    return hook
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import threading
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the process-wide event loop on which notify performs all network I/O. The loop is started lazily in a daemon
+    thread, so clients and their connection pools created on it stay usable across calls.
+
+    Returns
+    -------
+    loop: asyncio.AbstractEventLoop
+        the running shared event loop
+    """
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="notify-loop", daemon=True)
+            _thread.start()
+
+        return _loop
+
+
+def run(coro):
+    """
+    Run a coroutine on the shared event loop and block until it is finished.
+
+    Parameters
+    ----------
+    coro: Coroutine
+        coroutine to run
+
+    Returns
+    -------
+    result: Any
+        return value of the coroutine
+    """
+    loop = get_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError(
+            "notify.loop.run() can not be called from the notify event loop, await the coroutine instead."
+        )
+
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def run_async(coro):
+    """
+    Await a coroutine on the shared event loop from any other event loop.
+
+    Parameters
+    ----------
+    coro: Coroutine
+        coroutine to run
+
+    Returns
+    -------
+    result: Any
+        return value of the coroutine
+    """
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def close() -> None:
+    """
+    Stop the shared event loop and wait for its thread to finish. A new loop is started on next use.
+    """
+    global _loop, _thread
+
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+
+    if loop is None:
+        return
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _reset_after_fork() -> None:
+    # the loop thread does not survive a fork, the child starts its own loop on first use.
+    global _loop, _thread, _lock
+
+    _loop, _thread, _lock = None, None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
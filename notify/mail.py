@@ -1,23 +1,44 @@
+from __future__ import annotations
+
 import asyncio
 import base64
 import logging
 import os
-from urllib import request
+import tempfile
+import warnings
+import weakref
+from contextlib import asynccontextmanager
+from io import StringIO
+from typing import TYPE_CHECKING
+
+import httpx
 
-import pandas as pd
+from notify import loop
+from notify.attachments import Attachment, AttachmentCache, resolve_attachments
+from notify.exceptions import GraphBatchError
+from notify.instrumentation import stage
+from notify.tables import TableLike, as_table
+from notify.types import MailResult
+from notify.utils import (
+    HTML_FOOT,
+    HTML_HEAD,
+    check_environment_variables,
+    dataframe_to_html,
+    iter_html_table,
+    retry_delay,
+)
 
-from notify.msgraph import Graph
+# the Graph SDK takes most of the import time, it is imported once an e-mail is created.
+if TYPE_CHECKING:
+    from msgraph.generated.users.item.send_mail.send_mail_post_request_body import SendMailPostRequestBody
 
-from msgraph.generated.models.body_type import BodyType
-from msgraph.generated.models.message import Message
-from msgraph.generated.models.email_address import EmailAddress
-from msgraph.generated.models.item_body import ItemBody
-from msgraph.generated.models.recipient import Recipient
-from msgraph.generated.users.item.send_mail.send_mail_post_request_body import SendMailPostRequestBody
-from msgraph.generated.models.o_data_errors.o_data_error import ODataError
+    from notify.msgraph import Graph
+    from notify.throttle import Throttle
 
-from msgraph.generated.models.file_attachment import FileAttachment
-from notify.utils import check_environment_variables, dataframe_to_html
+# file extension of the overflow attachment per format
+OVERFLOW_EXTENSIONS = {"csv": ".csv.gz", "parquet": ".parquet", None: ""}
+# Exchange allows at most 4 concurrent requests per mailbox, more requests are throttled with a 429.
+MAILBOX_CONCURRENCY = 4
 
 
 class NotifyMail:
@@ -29,7 +50,12 @@ class NotifyMail:
         cc: str = None,
         bcc: str = None,
         files: dict = None,
-        df: pd.DataFrame = pd.DataFrame(),
+        df: TableLike = None,
+        graph: Graph = None,
+        attachment_cache: AttachmentCache = None,
+        max_rows: int = 30,
+        overflow: str = None,
+        throttle: Throttle = None,
     ):
         """
         This function sends an e-mail from Microsoft Exchange server
@@ -48,11 +74,30 @@ class NotifyMail:
             e-mail address to add as bcc
         files: str, list
             Path(s) to file(s) to add as attachment
-        df: pd.DataFrame
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
             dataframe that needs to be added to the HTML message.
+        graph: Graph
+            Graph client to send the e-mail with, defaults to the shared client of the app registration in the
+            environment variables.
+        attachment_cache: AttachmentCache
+            cache for attachments behind an url, defaults to the cache shared by all e-mails of the process.
+        max_rows: int
+            maximum number of rows of `df` in the message, None for no limit. Above the limit, the first rows are
+            followed by the row count and a summary of the numeric columns.
+        overflow: str
+            format of the attachment with all rows of `df` when it has more than `max_rows` rows: "csv" (gzip
+            compressed) or "parquet" (requires pyarrow). Defaults to None, no attachment.
+        throttle: Throttle
+            suppresses duplicate e-mails and limits the rate of e-mails per recipient. E-mails with the same
+            recipients, subject and message are duplicates. (optional)
         """
+        if overflow not in OVERFLOW_EXTENSIONS:
+            raise ValueError(f"Unknown overflow format {overflow}, use csv, parquet or None.")
 
-        check_environment_variables(["EMAIL_USER", "MAIL_TENANT_ID", "MAIL_CLIENT_ID", "MAIL_CLIENT_SECRET"])
+        if graph is None:
+            check_environment_variables(["EMAIL_USER", "MAIL_TENANT_ID", "MAIL_CLIENT_ID", "MAIL_CLIENT_SECRET"])
+        else:
+            check_environment_variables(["EMAIL_USER"])
         self.sender = os.environ.get("EMAIL_USER")
         self.to = to.replace(";", ",")
         self.cc = cc.replace(";", ",") if cc is not None else cc
@@ -61,19 +106,82 @@ class NotifyMail:
         self.message = message
         self.files = [files] if isinstance(files, str) else files
         self.df = df
-        self.graph = Graph()
-        self.graph.ensure_graph_for_app_only_auth()
+        self.table = as_table(df) if df is not None else None
+        self.max_rows = max_rows
+        self.overflow = overflow
+        if graph is None:
+            from notify.msgraph import get_graph
+
+            graph = get_graph()
+        self.graph = graph
+        self.attachment_cache = attachment_cache
+        self.attachments = None
+        self.throttle = throttle
+        self.rollup = None
+        self.decision = None
 
     @staticmethod
-    def read_file_content(path):
-        if path.startswith("http") or path.startswith("www"):
-            with request.urlopen(path) as download:
-                content = base64.b64encode(download.read())
-        else:
-            with open(path, "rb") as f:
-                content = base64.b64encode(f.read())
+    def read_file_content(path: str) -> bytes:
+        """
+        Read a file, or the file behind an url through the shared attachment cache, base64 encoded.
+
+        Deprecated, use `notify.attachments.resolve_attachments` and `Attachment.read` instead.
+        """
+        warnings.warn(
+            "NotifyMail.read_file_content is deprecated, use notify.attachments.resolve_attachments instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        attachment = resolve_attachments({os.path.basename(path): path})[0]
+        return base64.b64encode(attachment.read())
 
-        return content
+    def get_attachments(self) -> list:
+        """
+        Resolve the files of the e-mail to attachments on local disk. Files behind an url are downloaded in parallel, in
+        chunks, to the attachment cache. The overflow attachment with all rows of `df` is written to a temporary file.
+
+        Returns
+        -------
+        attachments: list of Attachment
+        """
+        if self.attachments is None and not (self.files or (self.truncated and self.overflow)):
+            self.attachments = []
+        elif self.attachments is None:
+            with stage("mail", "attachments") as s:
+                attachments = resolve_attachments(self.files, cache=self.attachment_cache) if self.files else []
+                if self.truncated and self.overflow:
+                    attachments.append(self._write_overflow())
+                s.set(size=sum(attachment.size for attachment in attachments))
+            self.attachments = attachments
+
+        return self.attachments
+
+    @property
+    def truncated(self) -> bool:
+        """
+        Whether `df` has more rows than fit in the message.
+        """
+        return self.table is not None and self.max_rows is not None and self.table.num_rows > self.max_rows
+
+    @property
+    def overflow_name(self) -> str:
+        """
+        File name of the overflow attachment.
+        """
+        return f"table{OVERFLOW_EXTENSIONS[self.overflow]}"
+
+    def _write_overflow(self) -> Attachment:
+        fd, path = tempfile.mkstemp(prefix="notify-", suffix=OVERFLOW_EXTENSIONS[self.overflow])
+        os.close(fd)
+        try:
+            self.table.write(path, file_format=self.overflow)
+        except BaseException:
+            os.remove(path)
+            raise
+        attachment = Attachment(name=self.overflow_name, path=path, size=os.path.getsize(path))
+        # the temporary file is removed once the attachment is garbage collected, with the e-mails sharing it.
+        weakref.finalize(attachment, os.remove, path)
+        return attachment
 
     def send_email(self):
         """
@@ -81,8 +189,374 @@ class NotifyMail:
 
         Returns
         -------
-        response: requests.Response
+        success: bool
         """
+        return loop.run(self.send_email_async())
+
+    async def send_email_async(self):
+        """
+        This coroutine sends an e-mail from Microsoft Exchange server. It can be awaited from any event loop, the request
+        itself is performed on the shared notify event loop.
+
+        Returns
+        -------
+        success: bool
+            False when the e-mail is not sent, also when it is suppressed by the throttle
+        """
+        with stage("mail", "send") as s:
+            if self.suppressed():
+                s.set(success=False, suppressed=True)
+                return False
+
+            try:
+                request_body = await self._create_request_body_async()
+                success = await loop.run_async(self.get_mail_response(request_body))
+            except BaseException:
+                self.release()
+                raise
+            s.set(success=success)
+            return success
+
+    @staticmethod
+    def send_many(mails: list, max_concurrency: int = 10, max_retries: int = 3, batch: bool = False) -> list:
+        """
+        Send a batch of e-mails concurrently over the shared Graph client. See `send_many_async` for the parameters.
+
+        Returns
+        -------
+        results: list of MailResult
+            result per e-mail, in the same order as `mails`
+        """
+        return loop.run(
+            NotifyMail.send_many_async(mails, max_concurrency=max_concurrency, max_retries=max_retries, batch=batch)
+        )
+
+    @staticmethod
+    def mail_merge(
+        recipients: TableLike,
+        subject: str,
+        message: str,
+        to: str = "email",
+        cc: str = None,
+        bcc: str = None,
+        files: dict = None,
+        df: TableLike = None,
+        graph: Graph = None,
+        max_rows: int = 30,
+        overflow: str = None,
+        throttle: Throttle = None,
+        max_concurrency: int = 10,
+        batch: bool = False,
+    ) -> list:
+        """
+        Send a personalized e-mail to every row of `recipients`. The subject and message are templates with
+        `str.format` fields like "Dear {name}", filled in with the columns of the row and HTML escaped in the message.
+        The templates are parsed once, and the table and attachments are rendered and read once for all e-mails. See
+        `MailTemplate.merge` and `send_many`.
+
+        Parameters
+        ----------
+        recipients: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            a row per e-mail
+        subject: str
+            template of the subject
+        message: str
+            template of the HTML or plain text content
+        to: str
+            column with the e-mail address of the recipient
+        cc, bcc, files, df, graph, max_rows, overflow, throttle:
+            shared by all e-mails, see NotifyMail
+        max_concurrency: int
+            maximum number of e-mails that are processed at the same time, see `send_many_async`
+        batch: bool
+            group e-mails into Graph JSON `$batch` requests, see `send_many_async`
+
+        Returns
+        -------
+        results: list of MailResult
+            result per e-mail, in the order of `recipients`
+        """
+        from notify.templates import MailTemplate
+
+        template = MailTemplate(subject, message, cc=cc, bcc=bcc, files=files, max_rows=max_rows, overflow=overflow)
+        mails = template.merge(recipients, to=to, df=df, graph=graph, throttle=throttle)
+        return NotifyMail.send_many(mails, max_concurrency=max_concurrency, batch=batch)
+
+    @staticmethod
+    async def send_many_async(
+        mails: list, max_concurrency: int = 10, max_retries: int = 3, batch: bool = False
+    ) -> list:
+        """
+        Send a batch of e-mails concurrently over the shared Graph client. At most `MAILBOX_CONCURRENCY` requests are
+        in flight per sender mailbox, throttled requests are retried after the `Retry-After` delay. A failing e-mail
+        does not stop the rest of the batch.
+
+        Parameters
+        ----------
+        mails: list of NotifyMail
+            e-mails to send
+        max_concurrency: int
+            maximum number of e-mails that are processed at the same time. With `batch`, the maximum number of batch
+            requests in flight.
+        max_retries: int
+            maximum number of retries per e-mail for throttled (429) or unavailable (5xx) responses
+        batch: bool
+            group up to `BATCH_SIZE` e-mails into a single Graph JSON `$batch` request
+
+        Returns
+        -------
+        results: list of MailResult
+            result per e-mail, in the same order as `mails`
+        """
+        if batch:
+            return await loop.run_async(NotifyMail._send_batches(mails, max_concurrency, max_retries))
+
+        return await loop.run_async(NotifyMail._send_many(mails, max_concurrency, max_retries))
+
+    @staticmethod
+    async def _send_many(mails: list, max_concurrency: int, max_retries: int) -> list:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        mailboxes = {}
+
+        async def send(index: int, mail: NotifyMail) -> MailResult:
+            with stage("mail", "send") as s:
+                result = await send_mail(index, mail)
+                if not result.success:
+                    mail.release()
+                s.set(attempts=result.attempts, success=result.success, suppressed=result.suppressed)
+                return result
+
+        async def send_mail(index: int, mail: NotifyMail) -> MailResult:
+            if mail.suppressed():
+                return MailResult(index=index, to=mail.to, success=False, attempts=0, suppressed=True)
+
+            mailbox = mailboxes.setdefault(mail.sender, asyncio.Semaphore(MAILBOX_CONCURRENCY))
+            async with semaphore:
+                try:
+                    request_body = await mail._create_request_body_async()
+                except Exception as e:
+                    logging.warning(f"E-mail to {mail.to} not sent! Error: {e}")
+                    return MailResult(index=index, to=mail.to, success=False, attempts=0, error=e)
+
+                return await mail._post_with_retry(index, request_body, mailbox, max_retries)
+
+        return list(await asyncio.gather(*(send(index, mail) for index, mail in enumerate(mails))))
+
+    async def _post_with_retry(
+        self, index: int, request_body: SendMailPostRequestBody, mailbox: asyncio.Semaphore, max_retries: int
+    ) -> MailResult:
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                async with mailbox:
+                    await self.post_mail(request_body, retry=False)
+                return MailResult(index=index, to=self.to, success=True, attempts=attempts)
+            except Exception as e:
+                status_code = getattr(e, "response_status_code", None)
+                delay = retry_delay(status_code, getattr(e, "response_headers", None), attempts)
+                if delay is None or attempts > max_retries:
+                    logging.warning(f"E-mail to {self.to} not sent! Error: {e}")
+                    return MailResult(index=index, to=self.to, success=False, attempts=attempts, error=e)
+
+                logging.info(f"E-mail to {self.to} throttled ({status_code}), retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _send_batches(mails: list, max_concurrency: int, max_retries: int) -> list:
+        from notify.msgraph import BATCH_SIZE
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        mailboxes = {}
+        mailbox_locks = {}
+        attempts = [0] * len(mails)
+        groups = {}
+        # the batches are sent when the request bodies of all e-mails are built
+        remaining = len(mails)
+        built = asyncio.Event()
+
+        async def send(index: int, mail: NotifyMail) -> MailResult:
+            # every e-mail has its own send stage, its result comes from the batch it is part of.
+            with stage("mail", "send") as s:
+                result = await send_mail(index, mail)
+                if not result.success:
+                    mail.release()
+                s.set(attempts=result.attempts, success=result.success, suppressed=result.suppressed)
+                return result
+
+        async def send_mail(index: int, mail: NotifyMail) -> MailResult:
+            nonlocal remaining
+
+            try:
+                if mail.suppressed():
+                    return MailResult(index=index, to=mail.to, success=False, attempts=0, suppressed=True)
+
+                try:
+                    request_body = await mail._create_request_body_async()
+                except Exception as e:
+                    logging.warning(f"E-mail to {mail.to} not sent! Error: {e}")
+                    return MailResult(index=index, to=mail.to, success=False, attempts=0, error=e)
+
+                if not all(attachment.inline for attachment in mail.get_attachments()):
+                    # attachments above the inline limit need an upload session, which can not be part of a batch.
+                    sending = send_single(index, mail, request_body)
+                else:
+                    sending = asyncio.get_running_loop().create_future()
+                    group = groups.setdefault((id(mail.graph), mail.sender), (mail.graph, mail.sender, []))
+                    group[2].append((index, mail, request_body, sending))
+            finally:
+                # counted before the e-mail is sent, so the batches are not held up by uploads
+                remaining -= 1
+                if remaining == 0:
+                    built.set()
+
+            return await sending
+
+        async def send_single(index: int, mail: NotifyMail, request_body: SendMailPostRequestBody) -> MailResult:
+            mailbox = mailboxes.setdefault(mail.sender, asyncio.Semaphore(MAILBOX_CONCURRENCY))
+            async with semaphore:
+                return await mail._post_with_retry(index, request_body, mailbox, max_retries)
+
+        @asynccontextmanager
+        async def whole_mailbox(sender: str):
+            # a batch takes all request slots of its mailbox, as its requests run in MAILBOX_CONCURRENCY chains. The
+            # slots are taken under a lock, so two batches waiting for the same mailbox can not hold part of them.
+            mailbox = mailboxes.setdefault(sender, asyncio.Semaphore(MAILBOX_CONCURRENCY))
+            acquired = 0
+            try:
+                async with mailbox_locks.setdefault(sender, asyncio.Lock()):
+                    for _ in range(MAILBOX_CONCURRENCY):
+                        await mailbox.acquire()
+                        acquired += 1
+                yield
+            finally:
+                for _ in range(acquired):
+                    mailbox.release()
+
+        async def send_batch(graph: Graph, sender: str, pending: list) -> None:
+            # pending is a list of (index, mail, request_body, future) of a single sender, only failed requests that
+            # may be retried are resent.
+            while pending:
+                for index, _, _, _ in pending:
+                    attempts[index] += 1
+
+                with stage("mail", "batch") as s:
+                    try:
+                        async with semaphore, whole_mailbox(sender):
+                            responses = await graph.send_mail_batch(
+                                [(mail.sender, body) for _, mail, body, _ in pending], chains=MAILBOX_CONCURRENCY
+                            )
+                    except Exception as e:
+                        status_code = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                        headers = e.response.headers if isinstance(e, httpx.HTTPStatusError) else None
+                        responses = [{"status": status_code, "headers": headers, "error": e}] * len(pending)
+                    s.set(success=all(r["status"] is not None and 200 <= r["status"] < 300 for r in responses))
+
+                retries, delays = [], []
+                for (index, mail, body, future), response in zip(pending, responses):
+                    if response["status"] is not None and 200 <= response["status"] < 300:
+                        future.set_result(MailResult(index=index, to=mail.to, success=True, attempts=attempts[index]))
+                        continue
+                    if response["status"] == 424:
+                        # not executed because the request it depends on failed, so it is sent again as it was
+                        attempts[index] -= 1
+                        retries.append((index, mail, body, future))
+                        continue
+
+                    delay = retry_delay(response["status"], response["headers"], attempts[index])
+                    if delay is None or attempts[index] > max_retries:
+                        error = response.get("error") or GraphBatchError(response["status"], response.get("body"))
+                        logging.warning(f"E-mail to {mail.to} not sent! Error: {error}")
+                        future.set_result(
+                            MailResult(index=index, to=mail.to, success=False, attempts=attempts[index], error=error)
+                        )
+                    else:
+                        retries.append((index, mail, body, future))
+                        delays.append(delay)
+
+                if delays:
+                    logging.info(f"{len(retries)} e-mails in batch not sent yet, retrying in {max(delays):.1f}s.")
+                    await asyncio.sleep(max(delays))
+                pending = retries
+
+        async def dispatch() -> None:
+            if mails:
+                await built.wait()
+            batches = []
+            for graph, sender, requests in groups.values():
+                for start in range(0, len(requests), BATCH_SIZE):
+                    batches.append(send_batch(graph, sender, requests[start : start + BATCH_SIZE]))
+            try:
+                await asyncio.gather(*batches)
+            finally:
+                for _, _, requests in groups.values():
+                    for index, mail, _, future in requests:
+                        if not future.done():
+                            future.set_exception(RuntimeError(f"E-mail to {mail.to} not sent, its batch failed."))
+
+        *results, _ = await asyncio.gather(*(send(index, mail) for index, mail in enumerate(mails)), dispatch())
+        return results
+
+    def suppressed(self) -> bool:
+        """
+        Check the e-mail with the throttle, registering it as sent when it is not suppressed. Every recipient has its
+        own rate limit, e-mails with the same recipients, cc, bcc, subject, rendered body and files are duplicates.
+        The number of e-mails suppressed before it is stored in `rollup` and added to the message.
+
+        Returns
+        -------
+        suppressed: bool
+        """
+        if self.throttle is None:
+            return False
+
+        recipients = [address.strip().lower() for address in self.to.split(",") if address.strip()]
+        decision = self.throttle.check(
+            recipients, self.cc, self.bcc, self.subject, self.message, self.create_html_table(), self.files
+        )
+        if not decision.allowed:
+            logging.info(f"E-mail to {self.to} suppressed ({decision.reason}).")
+            return True
+        self.decision = decision
+        if decision.suppressed:
+            from notify.throttle import rollup_text
+
+            self.rollup = rollup_text(decision)
+
+        return False
+
+    def release(self) -> None:
+        """
+        Undo the registration of the e-mail with the throttle when it is not delivered, so a retry is not suppressed.
+        """
+        if self.decision is not None:
+            self.throttle.release(self.decision)
+            self.decision = None
+            self.rollup = None
+
+    async def _create_request_body_async(self) -> SendMailPostRequestBody:
+        # reading attachments and writing the overflow attachment is blocking I/O, so it is done in a worker thread.
+        with stage("mail", "build"):
+            if self.files or (self.truncated and self.overflow):
+                return await asyncio.to_thread(self.create_request_body)
+
+            return self.create_request_body()
+
+    def create_request_body(self) -> SendMailPostRequestBody:
+        """
+        Create the Graph request body for the e-mail, including recipients, HTML table and attachments.
+
+        Returns
+        -------
+        request_body: SendMailPostRequestBody
+        """
+        from msgraph.generated.models.body_type import BodyType
+        from msgraph.generated.models.email_address import EmailAddress
+        from msgraph.generated.models.file_attachment import FileAttachment
+        from msgraph.generated.models.item_body import ItemBody
+        from msgraph.generated.models.message import Message
+        from msgraph.generated.models.recipient import Recipient
+        from msgraph.generated.users.item.send_mail.send_mail_post_request_body import SendMailPostRequestBody
 
         sender = EmailAddress(address=self.sender)
         sender_recipient = Recipient(email_address=sender)
@@ -114,36 +588,107 @@ class NotifyMail:
                 bcc_recipients.append(bcc_recipient)
             message.bcc_recipients = bcc_recipients
         email_body = ItemBody(content=self.message, content_type=BodyType.Html)
-        # add html table (if table less than 30 records)
-        if self.df.shape[0] in range(1, 31):
-            html_table = dataframe_to_html(df=self.df)
-        elif self.df.shape[0] > 30:
-            logging.warning(f"Only first 30 records will be added. ({self.df.shape[0]} > the limit of 30).")
-            html_table = dataframe_to_html(df=self.df.head(n=30))
-        else:
-            html_table = ""  # no data in dataframe (0 records)
-
-        email_body.content += html_table
+        email_body.content += self.create_html_table()
+        if self.rollup:
+            email_body.content += f"<p>{self.rollup}</p>"
         message.body = email_body
-        if self.files:
-            # There might be a more safe way to check if a string is an url, but for our purposes, this suffices.
+        if self.get_attachments():
+            # attachments above the inline limit are uploaded in chunks when the e-mail is posted.
             attachments = list()
-            for name, path in self.files.items():
-                content = self.read_file_content(path)
-                attachment = FileAttachment(
-                    odata_type="#microsoft.graph.fileAttachment",
-                    name=name,
-                    content_bytes=base64.urlsafe_b64decode(content),
-                )
-                attachments.append(attachment)
+            for attachment in self.get_attachments():
+                if attachment.inline:
+                    file_attachment = FileAttachment(
+                        odata_type="#microsoft.graph.fileAttachment",
+                        name=attachment.name,
+                        content_bytes=attachment.read(),
+                    )
+                    attachments.append(file_attachment)
             message.attachments = attachments
         request_body = SendMailPostRequestBody(message=message, save_to_sent_items=True)
-        success = asyncio.run(self.get_mail_response(request_body))
-        return success
+        return request_body
+
+    def create_html_table(self) -> str:
+        """
+        Create the HTML table of `df` for the message. Above `max_rows` rows, only the first rows are added, followed by
+        the row count and a summary of the numeric columns over all rows.
+
+        Returns
+        -------
+        html_table: str
+            HTML table, empty when `df` has no rows
+        """
+        rows = self.table.num_rows if self.table is not None else 0
+        if rows == 0:
+            return ""  # no data in dataframe (0 records)
+
+        if not self.truncated:
+            return dataframe_to_html(df=self.table)
+
+        note = f"Showing the first {self.max_rows} of {rows} rows."
+        if self.overflow:
+            note += f" All rows are attached as {self.overflow_name}."
+        else:
+            logging.warning(
+                f"Only first {self.max_rows} records will be added. ({rows} > the limit of {self.max_rows})."
+            )
+
+        buffer = StringIO()
+        buffer.write(HTML_HEAD)
+        for chunk in iter_html_table(self.table.head(self.max_rows)):
+            buffer.write(chunk)
+        buffer.write(f"<p>{note}</p>")
+        summary = self.table.summary()
+        if summary.num_rows:
+            for chunk in iter_html_table(summary):
+                buffer.write(chunk)
+        buffer.write(HTML_FOOT)
+
+        return buffer.getvalue()
+
+    async def post_mail(self, request_body: SendMailPostRequestBody, retry: bool = True) -> None:
+        """
+        Post the request body to the sendMail endpoint of the sender mailbox. Errors are raised as returned by Graph.
+        When the e-mail has attachments above the inline limit, it is saved as draft, the attachments are uploaded
+        with upload sessions and the draft is sent.
+
+        Parameters
+        ----------
+        request_body: SendMailPostRequestBody
+            the e-mail to send
+        retry: bool
+            let the Graph client retry throttled requests itself. Disabled when the caller handles retries.
+        """
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from kiota_http.middleware.options import RetryHandlerOption
+
+        request_configuration = None
+        if not retry:
+            request_configuration = RequestConfiguration(
+                options=[RetryHandlerOption(max_retries=0, should_retry=False)]
+            )
+
+        uploads = [attachment for attachment in self.get_attachments() if not attachment.inline]
+        with stage("mail", "post") as s:
+            try:
+                if uploads:
+                    await self.graph.send_mail_with_uploads(
+                        self.sender, request_body.message, uploads, request_configuration=request_configuration
+                    )
+                else:
+                    await self.graph.app_client.users.by_user_id(self.sender).send_mail.post(
+                        request_body, request_configuration=request_configuration
+                    )
+            except Exception as e:
+                s.set(status_code=getattr(e, "response_status_code", None), success=False)
+                raise
+            # sendMail answers 202 Accepted
+            s.set(status_code=202, success=True)
 
     async def get_mail_response(self, request_body):
+        from msgraph.generated.models.o_data_errors.o_data_error import ODataError
+
         try:
-            await self.graph.app_client.users.by_user_id(self.sender).send_mail.post(request_body)
+            await self.post_mail(request_body)
         except ODataError as e:
             # Handle Microsoft Graph API errors
             raise ODataError(f"Error sending email: {e.message}")
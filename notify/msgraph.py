@@ -1,7 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
 import os
+import threading
+from urllib.parse import quote
 
+import httpx
 from azure.identity import ClientSecretCredential
+from kiota_serialization_json.json_serialization_writer import JsonSerializationWriter
 from msgraph import GraphServiceClient
+from msgraph.generated.models.attachment_item import AttachmentItem
+from msgraph.generated.models.attachment_type import AttachmentType
+from msgraph.generated.users.item.messages.item.attachments.create_upload_session.create_upload_session_post_request_body import (
+    CreateUploadSessionPostRequestBody,
+)
+
+from notify import loop
+from notify.attachments import CHUNK_SIZE
+from notify.instrumentation import stage
+
+SCOPES = ["https://graph.microsoft.com/.default"]
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+# maximum number of requests in a single JSON batch
+BATCH_SIZE = 20
+# uploading a chunk of an attachment can take longer than the httpx default of 5 seconds
+HTTP_TIMEOUT = 60.0
+
+# seconds a Graph client replaced after a secret rotation stays open, for e-mails that are still sending with it
+RETIRE_DELAY = 300.0
+
+_graphs = {}
+# replaced Graph clients and the timers closing them, by id of the client
+_retired = {}
+_graphs_lock = threading.Lock()
+
+
+class TimedCredential:
+    def __init__(self, credential):
+        """
+        Credential that times fetching tokens as the "token" stage of a delivery, passing everything else to the
+        wrapped credential.
+
+        Parameters
+        ----------
+        credential: TokenCredential
+            the wrapped credential
+        """
+        self.credential = credential
+
+    def get_token(self, *scopes, **kwargs):
+        if inspect.iscoroutinefunction(self.credential.get_token):
+            return self._get_token_async(*scopes, **kwargs)
+
+        with stage("mail", "token"):
+            return self.credential.get_token(*scopes, **kwargs)
+
+    async def _get_token_async(self, *scopes, **kwargs):
+        with stage("mail", "token"):
+            return await self.credential.get_token(*scopes, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.credential, name)
 
 
 class Graph:
@@ -9,15 +71,312 @@ class Graph:
     client_credential: ClientSecretCredential
     app_client: GraphServiceClient
 
+    def __init__(
+        self,
+        tenant_id: str = None,
+        client_id: str = None,
+        client_secret: str = None,
+        credential=None,
+        base_url: str = None,
+        token_cache: str | bool = None,
+    ):
+        """
+        Microsoft Graph client using app-only authentication. Credentials default to the environment variables
+        `MAIL_TENANT_ID`, `MAIL_CLIENT_ID` and `MAIL_CLIENT_SECRET`.
+
+        Parameters
+        ----------
+        tenant_id: str
+            tenant of the app registration
+        client_id: str
+            client id of the app registration
+        client_secret: str
+            client secret of the app registration
+        credential: TokenCredential
+            credential to use instead of a ClientSecretCredential (optional)
+        base_url: str
+            base url of the Graph API, e.g. of a local stand-in (optional)
+        token_cache: str or bool
+            keep access tokens in an encrypted database shared by all processes, at this path or with True at the
+            default path. Defaults to the path in env variable `MAIL_TOKEN_CACHE`, no cache when it is not set.
+        """
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url
+        self.token_cache = token_cache if token_cache is not None else os.environ.get("MAIL_TOKEN_CACHE")
+        if credential is not None:
+            self.client_credential = credential
+
     def ensure_graph_for_app_only_auth(self):
         if not hasattr(self, "client_credential"):
-            client_id = os.environ["MAIL_CLIENT_ID"]
-            tenant_id = os.environ["MAIL_TENANT_ID"]
-            client_secret = os.environ["MAIL_CLIENT_SECRET"]
+            client_id = self.client_id or os.environ["MAIL_CLIENT_ID"]
+            tenant_id = self.tenant_id or os.environ["MAIL_TENANT_ID"]
+            client_secret = self.client_secret or os.environ["MAIL_CLIENT_SECRET"]
 
             self.client_credential = ClientSecretCredential(tenant_id, client_id, client_secret)
+            if self.token_cache:
+                from notify.token_cache import CachedCredential
+
+                self.client_credential = CachedCredential(
+                    self.client_credential,
+                    secret=f"{tenant_id}\0{client_id}\0{client_secret}",
+                    path=self.token_cache if isinstance(self.token_cache, str) else None,
+                )
 
         if not hasattr(self, "app_client"):
-            self.app_client = GraphServiceClient(
-                credentials=self.client_credential, scopes=["https://graph.microsoft.com/.default"]
+            self.app_client = GraphServiceClient(credentials=TimedCredential(self.client_credential), scopes=SCOPES)
+            if self.base_url:
+                self.app_client.request_adapter.base_url = self.base_url
+
+    async def send_mail_batch(self, requests: list, chains: int = None) -> list:
+        """
+        Send up to `BATCH_SIZE` e-mails with a single JSON `$batch` request. Graph executes the requests of a batch
+        concurrently, with `chains` they are linked with `dependsOn` into that many sequences, so at most `chains`
+        requests are executed at the same time. A request whose predecessor failed is not executed and has status 424.
+
+        Parameters
+        ----------
+        requests: list
+            list of (sender, SendMailPostRequestBody) tuples
+        chains: int
+            maximum number of requests executed at the same time, None for no limit
+
+        Returns
+        -------
+        responses: list of dict
+            response per e-mail with keys status, headers and body, in the same order as `requests`
+        """
+        if len(requests) > BATCH_SIZE:
+            raise ValueError(f"A batch can contain at most {BATCH_SIZE} requests, got {len(requests)}.")
+
+        batch = {
+            "requests": [
+                {
+                    "id": str(i),
+                    "method": "POST",
+                    "url": f"/users/{quote(sender)}/sendMail",
+                    "headers": {"Content-Type": "application/json"},
+                    "body": serialize(request_body),
+                }
+                for i, (sender, request_body) in enumerate(requests)
+            ]
+        }
+        if chains is not None:
+            for i, request in enumerate(batch["requests"][chains:], start=chains):
+                request["dependsOn"] = [str(i - chains)]
+        token = await asyncio.to_thread(TimedCredential(self.client_credential).get_token, *SCOPES)
+        response = await self.get_http_client().post(
+            f"{self.base_url or GRAPH_URL}/$batch", json=batch, headers={"Authorization": f"Bearer {token.token}"}
+        )
+        response.raise_for_status()
+        responses = {item["id"]: item for item in response.json()["responses"]}
+
+        return [
+            {
+                "status": responses[str(i)]["status"],
+                "headers": responses[str(i)].get("headers") or {},
+                "body": responses[str(i)].get("body"),
+            }
+            for i in range(len(requests))
+        ]
+
+    async def send_mail_with_uploads(self, sender: str, message, attachments: list, request_configuration=None) -> None:
+        """
+        Send an e-mail with attachments above the inline limit. The message is saved as draft, every attachment is
+        uploaded in chunks with an upload session and the draft is sent. Failed drafts are removed.
+
+        Parameters
+        ----------
+        sender: str
+            mailbox to send the e-mail from
+        message: Message
+            the e-mail, including the inline attachments
+        attachments: list of Attachment
+            attachments to upload
+        request_configuration: RequestConfiguration
+            configuration of the Graph requests (optional)
+        """
+        user = self.app_client.users.by_user_id(sender)
+        draft = await user.messages.post(message, request_configuration=request_configuration)
+        draft_message = user.messages.by_message_id(draft.id)
+        try:
+            for attachment in attachments:
+                attachment_item = AttachmentItem(
+                    attachment_type=AttachmentType.File, name=attachment.name, size=attachment.size
+                )
+                upload_session = await draft_message.attachments.create_upload_session.post(
+                    CreateUploadSessionPostRequestBody(attachment_item=attachment_item),
+                    request_configuration=request_configuration,
+                )
+                await self.upload(upload_session.upload_url, attachment)
+            await draft_message.send.post(request_configuration=request_configuration)
+        except Exception:
+            await draft_message.delete()
+            raise
+
+    async def upload(self, upload_url: str, attachment) -> None:
+        """
+        Upload an attachment in chunks of `CHUNK_SIZE` bytes to an upload session.
+
+        Parameters
+        ----------
+        upload_url: str
+            url of the upload session, which is pre-authenticated
+        attachment: Attachment
+            attachment to upload
+        """
+        chunks = attachment.iter_chunks(CHUNK_SIZE)
+        try:
+            while chunk := await asyncio.to_thread(next, chunks, None):
+                offset, content = chunk
+                content_range = f"bytes {offset}-{offset + len(content) - 1}/{attachment.size}"
+                response = await self.get_http_client().put(
+                    upload_url, content=content, headers={"Content-Range": content_range}
+                )
+                response.raise_for_status()
+        finally:
+            chunks.close()
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        """
+        HTTP client for requests outside the Graph SDK, like JSON batches and upload sessions.
+        """
+        if not hasattr(self, "http_client"):
+            self.http_client = httpx.AsyncClient(timeout=HTTP_TIMEOUT)
+
+        return self.http_client
+
+    def close(self) -> None:
+        """
+        Close the HTTP connection pool of the Graph client and the credential.
+        """
+        if hasattr(self, "http_client"):
+            loop.run(self.http_client.aclose())
+            del self.http_client
+
+        if hasattr(self, "app_client"):
+            http_client = getattr(self.app_client.request_adapter, "_http_client", None)
+            if http_client is not None:
+                loop.run(http_client.aclose())
+            del self.app_client
+
+        if hasattr(self, "client_credential"):
+            if hasattr(self.client_credential, "close"):
+                self.client_credential.close()
+            del self.client_credential
+
+
+def serialize(parsable) -> dict:
+    """
+    Serialize a Graph model to its JSON representation.
+
+    Parameters
+    ----------
+    parsable: Parsable
+        Graph model, e.g. a SendMailPostRequestBody
+
+    Returns
+    -------
+    content: dict
+        JSON representation of the model
+    """
+    writer = JsonSerializationWriter()
+    writer.write_object_value(None, parsable)
+    return json.loads(writer.get_serialized_content())
+
+
+def get_graph(
+    tenant_id: str = None, client_id: str = None, client_secret: str = None, token_cache: str | bool = None
+) -> Graph:
+    """
+    Get the shared Graph client for an app registration. Clients are kept in a process-wide registry keyed by
+    (tenant_id, client_id), so credentials, cached access tokens and keep-alive connections are reused by every
+    NotifyMail instance.
+
+    Parameters
+    ----------
+    tenant_id: str
+        tenant of the app registration, defaults to env variable `MAIL_TENANT_ID`
+    client_id: str
+        client id of the app registration, defaults to env variable `MAIL_CLIENT_ID`
+    client_secret: str
+        client secret of the app registration, defaults to env variable `MAIL_CLIENT_SECRET`
+    token_cache: str or bool
+        path of the token cache shared by processes, see `Graph`. Only used when the client is created.
+
+    Returns
+    -------
+    graph: Graph
+        authenticated Graph client
+    """
+    tenant_id = tenant_id or os.environ["MAIL_TENANT_ID"]
+    client_id = client_id or os.environ["MAIL_CLIENT_ID"]
+    client_secret = client_secret or os.environ["MAIL_CLIENT_SECRET"]
+    key = (tenant_id, client_id)
+
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is not None and graph.client_secret != client_secret:
+            logging.info(f"Client secret changed for client {client_id}, creating a new Graph client.")
+            _retire(_graphs.pop(key))
+            graph = None
+
+        if graph is None:
+            graph = Graph(
+                tenant_id=tenant_id, client_id=client_id, client_secret=client_secret, token_cache=token_cache
             )
+            graph.ensure_graph_for_app_only_auth()
+            _graphs[key] = graph
+
+    return graph
+
+
+def _retire(graph: Graph) -> None:
+    # the replaced client may still be used by e-mails that got it before the rotation, so it is closed after a delay.
+    # Must be called with _graphs_lock held.
+    timer = threading.Timer(RETIRE_DELAY, _close_retired, args=(id(graph),))
+    timer.daemon = True
+    _retired[id(graph)] = (graph, timer)
+    timer.start()
+
+
+def _close_retired(graph_id: int) -> None:
+    with _graphs_lock:
+        graph, _ = _retired.pop(graph_id, (None, None))
+
+    if graph is not None:
+        try:
+            graph.close()
+        except Exception as e:
+            logging.warning(f"Graph client not closed! Error: {e}")
+
+
+def close_graphs() -> None:
+    """
+    Close all shared Graph clients, including clients replaced after a secret rotation. New clients are created on
+    next use.
+    """
+    with _graphs_lock:
+        graphs = list(_graphs.values())
+        _graphs.clear()
+        for graph, timer in _retired.values():
+            timer.cancel()
+            graphs.append(graph)
+        _retired.clear()
+
+    for graph in graphs:
+        graph.close()
+
+
+def _reset_after_fork() -> None:
+    # connections of the parent process must not be shared with the child, so the child starts with an empty registry.
+    global _graphs_lock
+
+    _graphs.clear()
+    _retired.clear()
+    _graphs_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,415 @@
+import dataclasses
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from io import StringIO
+
+import httpx
+
+from notify.exceptions import PartialDeliveryError
+from notify.mail import NotifyMail
+from notify.tables import RowTable, as_table, is_table
+from notify.teams import NotifyTeams
+from notify.types import RetryPolicy
+from notify.utils import RETRY_STATUS_CODES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created REAL NOT NULL
+)
+"""
+# key in the payload of a split Teams message with the number of parts delivered by earlier attempts
+PARTS_SENT = "__parts_sent__"
+
+
+class NotificationQueue:
+    def __init__(
+        self,
+        path: str = "notify_queue.db",
+        workers: int = 2,
+        max_retries: int = 5,
+        backoff: float = 2.0,
+        poll_interval: float = 1.0,
+        lease: float = 300.0,
+    ):
+        """
+        Persistent queue for e-mails and Teams messages. Notifications are stored in a local SQLite database and
+        delivered by a pool of worker threads, with retries and exponential backoff. Notifications that are not
+        delivered yet survive a restart of the process and are delivered once a queue on the same database is started.
+
+        Parameters
+        ----------
+        path: str
+            path of the SQLite database
+        workers: int
+            number of worker threads delivering notifications
+        max_retries: int
+            maximum number of retries per notification, after which it is marked as failed. Notifications that can not
+            be delivered by retrying, e.g. a 400 response or an invalid recipient, are marked as failed at once.
+        backoff: float
+            base delay in seconds between retries, doubled on every attempt
+        poll_interval: float
+            seconds an idle worker waits before checking the database for new notifications
+        lease: float
+            seconds a notification is reserved for a worker. Notifications of a crashed worker are picked up again
+            after the lease expires.
+        """
+        self.path = path
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def enqueue_mail(self, **kwargs) -> int:
+        """
+        Add an e-mail to the queue.
+
+        Parameters
+        ----------
+        kwargs:
+            arguments of NotifyMail, e.g. to, subject, message, cc, bcc, files and df
+
+        Returns
+        -------
+        id: int
+            id of the notification in the queue
+        """
+        return self._enqueue("mail", kwargs)
+
+    def enqueue_teams(self, webhook: str, **kwargs) -> int:
+        """
+        Add a Teams message to the queue.
+
+        Parameters
+        ----------
+        webhook: str
+            url for sending the teams message
+        kwargs:
+            arguments of NotifyTeams.basic_message, e.g. title, message, buttons and df
+
+        Returns
+        -------
+        id: int
+            id of the notification in the queue
+        """
+        return self._enqueue("teams", {"webhook": webhook, **kwargs})
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+        """
+        self._stop.clear()
+        for i in range(self.workers - len(self._threads)):
+            thread = threading.Thread(target=self._work, name=f"notify-queue-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stop the worker threads after their current delivery. Undelivered notifications stay in the queue.
+
+        Parameters
+        ----------
+        timeout: float
+            maximum seconds to wait per worker
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Wait until all notifications in the queue are delivered or failed.
+
+        Parameters
+        ----------
+        timeout: float
+            maximum seconds to wait
+
+        Returns
+        -------
+        done: bool
+            False when the timeout expired before the queue was empty
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(min(self.poll_interval, 0.1))
+
+        return True
+
+    def pending(self) -> int:
+        """
+        Number of notifications that are not delivered or failed yet.
+        """
+        with closing(self._connect()) as connection:
+            (count,) = connection.execute("SELECT COUNT(*) FROM notifications WHERE status = 'pending'").fetchone()
+
+        return count
+
+    def failed(self) -> list:
+        """
+        Notifications that could not be delivered within `max_retries` retries.
+
+        Returns
+        -------
+        failed: list of dict
+            id, kind, payload, attempts and last_error per notification
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT id, kind, payload, attempts, last_error FROM notifications WHERE status = 'failed' ORDER BY id"
+            ).fetchall()
+
+        return [
+            {"id": id_, "kind": kind, "payload": json.loads(payload), "attempts": attempts, "last_error": last_error}
+            for id_, kind, payload, attempts, last_error in rows
+        ]
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _enqueue(self, kind: str, kwargs: dict) -> int:
+        payload = json.dumps(serialize_payload(kwargs), default=str)
+        now = time.time()
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "INSERT INTO notifications (kind, payload, next_attempt, created) VALUES (?, ?, ?, ?)",
+                (kind, payload, now, now),
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def _claim(self, connection: sqlite3.Connection):
+        # BEGIN IMMEDIATE takes the write lock, so a notification is claimed by a single worker, also across processes.
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT id, kind, payload, attempts FROM notifications "
+                "WHERE status = 'pending' AND next_attempt <= ? AND locked_until <= ? ORDER BY id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE notifications SET locked_until = ? WHERE id = ?", (now + self.lease, row[0]))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return row
+
+    def _work(self) -> None:
+        # a database error, e.g. a database that stays locked or a full disk, restarts the worker with a new connection.
+        while not self._stop.is_set():
+            try:
+                self._deliver_pending()
+            except sqlite3.Error as e:
+                logging.warning(f"Notification queue worker failed, restarting in {self.poll_interval}s! Error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _deliver_pending(self) -> None:
+        connection = self._connect()
+        try:
+            while not self._stop.is_set():
+                row = self._claim(connection)
+                if row is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+
+                id_, kind, payload, attempts = row
+                try:
+                    kwargs = json.loads(payload)
+                    parts_sent = kwargs.pop(PARTS_SENT, 0)
+                    deliver(kind, deserialize_payload(kwargs), parts_sent=parts_sent)
+                except PartialDeliveryError as e:
+                    # the parts that are delivered are not sent again on the next attempt
+                    connection.execute(
+                        "UPDATE notifications SET payload = ? WHERE id = ?",
+                        (json.dumps({**kwargs, PARTS_SENT: e.parts_sent}), id_),
+                    )
+                    self._retry(connection, id_, attempts + 1, e)
+                except Exception as e:
+                    self._retry(connection, id_, attempts + 1, e)
+                else:
+                    connection.execute(
+                        "UPDATE notifications SET status = 'done', attempts = ?, locked_until = 0 WHERE id = ?",
+                        (attempts + 1, id_),
+                    )
+        finally:
+            connection.close()
+
+    def _retry(self, connection: sqlite3.Connection, id_: int, attempts: int, error: Exception) -> None:
+        if attempts > self.max_retries or not is_retryable(error):
+            logging.warning(f"Notification {id_} failed after {attempts} attempts! Error: {error}")
+            connection.execute(
+                "UPDATE notifications SET status = 'failed', attempts = ?, last_error = ?, locked_until = 0 WHERE id = ?",
+                (attempts, str(error), id_),
+            )
+            return
+
+        delay = self.backoff * 2 ** (attempts - 1)
+        delay += random.uniform(0, delay / 2)
+        logging.info(f"Notification {id_} not delivered, retrying in {delay:.1f}s. Error: {error}")
+        connection.execute(
+            "UPDATE notifications SET attempts = ?, last_error = ?, next_attempt = ?, locked_until = 0 WHERE id = ?",
+            (attempts, str(error), time.time() + delay, id_),
+        )
+
+
+def deliver(kind: str, kwargs: dict, parts_sent: int = 0) -> None:
+    """
+    Deliver a notification from the queue, raising an exception when it is not delivered.
+
+    Parameters
+    ----------
+    kind: str
+        "mail" or "teams"
+    kwargs: dict
+        arguments of the notification
+    parts_sent: int
+        number of parts of a split Teams message delivered before, which are not sent again
+
+    Raises
+    ------
+    PartialDeliveryError
+        when a part of a split Teams message is not delivered, with the number of parts delivered so far
+    """
+    if kind == "mail":
+        NotifyMail(**kwargs).send_email()
+    elif kind == "teams":
+        webhook = kwargs.pop("webhook")
+        teams = NotifyTeams(webhook=webhook, retry=RetryPolicy(max_retries=0))
+        message = teams.build(**kwargs)
+        if not message.split:
+            result = teams.send(message)
+            if not result.success:
+                raise result.error
+            return
+
+        # the message is split the same way on every attempt, so the parts delivered before can be skipped.
+        results = teams.send(dataclasses.replace(message, payloads=message.payloads[parts_sent:]))
+        for i, result in enumerate(results):
+            if not result.success:
+                raise PartialDeliveryError(parts_sent + i, result.error) from result.error
+    else:
+        raise ValueError(f"Unknown notification kind {kind}")
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a notification that failed with `error` may be delivered by retrying it. Throttled (429) and unavailable
+    (5xx) responses, connection errors and timeouts are retried, other responses like 400 (bad request) or an invalid
+    recipient and other errors are not. The status code is looked up in the exceptions the error was raised from, as
+    the Graph errors are wrapped.
+
+    Parameters
+    ----------
+    error: Exception
+        error raised by `deliver`
+
+    Returns
+    -------
+    retryable: bool
+    """
+    while error is not None:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRY_STATUS_CODES
+        status_code = getattr(error, "response_status_code", None) or getattr(error, "status_code", None)
+        if status_code is not None:
+            return status_code in RETRY_STATUS_CODES
+        if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+            return True
+        error = error.__cause__ or error.__context__
+
+    return False
+
+
+def serialize_payload(kwargs: dict) -> dict:
+    """
+    Convert the arguments of a notification to JSON serializable values. Tables are stored as column names and values
+    per column, pandas dataframes with the dtype per column, so they are restored with the same column types.
+    """
+    payload = {}
+    for key, value in kwargs.items():
+        if is_table(value) and type(value).__module__.startswith("pandas"):
+            table = as_table(value)
+            value = {
+                "__dataframe__": {
+                    "columns": list(value.columns),
+                    "dtypes": [str(dtype) for dtype in value.dtypes],
+                    "data": [table.column_values(i) for i in range(len(table.columns))],
+                }
+            }
+        elif is_table(value):
+            table = as_table(value)
+            data = [table.column_values(i) for i in range(len(table.columns))]
+            value = {"__table__": {"columns": [str(col) for col in table.columns], "data": data}}
+        payload[key] = value
+
+    return payload
+
+
+def deserialize_payload(payload: dict) -> dict:
+    """
+    Convert a payload created with `serialize_payload` back to the arguments of the notification.
+    """
+    kwargs = {}
+    for key, value in payload.items():
+        if isinstance(value, dict) and "__dataframe__" in value:
+            value = _deserialize_dataframe(value["__dataframe__"])
+        elif isinstance(value, dict) and "__table__" in value:
+            value = RowTable(**value["__table__"])
+        kwargs[key] = value
+
+    return kwargs
+
+
+def _deserialize_dataframe(frame):
+    import pandas as pd
+
+    if isinstance(frame, str):
+        # stored in split orientation by earlier versions, the column types are not guessed.
+        return pd.read_json(StringIO(frame), orient="split", dtype=False, convert_dates=False)
+
+    columns = {}
+    for i, (values, dtype) in enumerate(zip(frame["data"], frame["dtypes"])):
+        column = pd.Series(values, dtype=object)
+        try:
+            columns[i] = column.astype(dtype)
+        except (TypeError, ValueError):
+            columns[i] = column
+    # the columns are set by position, as column names may be duplicated.
+    df = pd.DataFrame(columns)
+    df.columns = frame["columns"]
+    return df
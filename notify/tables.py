@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import itertools
+import math
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Iterable, Union
+
+# pandas, pyarrow and polars are optional: a table is recognized by the module of its type, and the libraries are only
+# imported by the table classes that wrap their objects.
+if TYPE_CHECKING:
+    import pandas as pd
+    import polars as pl
+    import pyarrow as pa
+
+TableLike = Union["pd.DataFrame", "pa.Table", "pl.DataFrame", "Table", Iterable]
+
+SUMMARY_COLUMNS = ["column", "sum", "mean", "min", "max"]
+
+
+def is_missing(value) -> bool:
+    """
+    Whether a cell value is missing: None or NaN.
+    """
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _library(data) -> str:
+    # the dataframe library of `data`, or None. The library is already imported when `data` is one of its objects.
+    module = type(data).__module__.split(".")[0]
+    if module == "pandas":
+        import pandas as pd
+
+        return module if isinstance(data, pd.DataFrame) else None
+    if module == "pyarrow":
+        import pyarrow as pa
+
+        return module if isinstance(data, pa.Table) else None
+    if module == "polars":
+        import polars as pl
+
+        return module if isinstance(data, pl.DataFrame) else None
+
+    return None
+
+
+def is_table(data) -> bool:
+    """
+    Whether `data` is a pandas DataFrame, pyarrow Table, polars DataFrame or Table. Iterables of rows are not
+    recognized, as they can not be told apart from other lists.
+    """
+    return isinstance(data, Table) or _library(data) is not None
+
+
+def as_table(data: TableLike, columns: list = None) -> Table:
+    """
+    Wrap tabular data in a Table, without converting it to another library.
+
+    Parameters
+    ----------
+    data: pd.DataFrame, pyarrow.Table, polars.DataFrame, Table or iterable of rows
+        the data. Rows are dicts of column names and values, or sequences of values in the order of `columns`.
+    columns: list
+        column names of rows that are sequences, defaults to their position (optional)
+
+    Returns
+    -------
+    table: Table
+    """
+    if isinstance(data, Table):
+        return data
+
+    module = _library(data)
+    if module is None and type(data).__module__.split(".")[0] in ("pandas", "pyarrow", "polars"):
+        raise TypeError(f"Can not use a {type(data).__name__} as table, use a DataFrame or pyarrow Table.")
+    if module == "pandas":
+        return PandasTable(data)
+    if module == "pyarrow":
+        return ArrowTable(data)
+    if module == "polars":
+        # polars stores its columns in Arrow memory, so this does not copy the data.
+        return ArrowTable(data.to_arrow())
+
+    return RowTable.from_rows(data, columns=columns)
+
+
+def series_to_texts(column: pd.Series) -> list:
+    """
+    Convert a pandas column to the texts of its cells in one vectorized pass. Missing values become empty texts.
+    """
+    texts = column.astype(str).to_numpy(dtype=object)
+    missing = column.isna().to_numpy()
+    if missing.any():
+        texts[missing] = ""
+
+    return texts.tolist()
+
+
+class Table(ABC):
+    """
+    Column oriented view on tabular data, used to render tables in e-mails and Teams messages. Subclasses wrap the
+    objects of a dataframe library, `RowTable` holds plain python values.
+    """
+
+    columns: list
+
+    @property
+    @abstractmethod
+    def num_rows(self) -> int:
+        """
+        The number of rows.
+        """
+
+    @property
+    def shape(self) -> tuple:
+        return self.num_rows, len(self.columns)
+
+    @property
+    def empty(self) -> bool:
+        return self.num_rows == 0 or len(self.columns) == 0
+
+    @abstractmethod
+    def slice(self, start: int, stop: int) -> Table:
+        """
+        The rows from `start` up to `stop`.
+        """
+
+    def head(self, n: int) -> Table:
+        """
+        The first `n` rows.
+        """
+        return self.slice(0, n)
+
+    @abstractmethod
+    def select(self, n: int) -> Table:
+        """
+        The first `n` columns.
+        """
+
+    @abstractmethod
+    def column_values(self, i: int) -> list:
+        """
+        The values of the `i`-th column as python objects, None for missing values.
+        """
+
+    def column_texts(self, i: int) -> list:
+        """
+        The texts of the cells of the `i`-th column. Missing values become empty texts.
+        """
+        return ["" if is_missing(value) else str(value) for value in self.column_values(i)]
+
+    def format_column(self, i: int, formatter) -> list:
+        """
+        The texts of the cells of the `i`-th column, converted with `formatter`. Missing values become empty texts.
+        """
+        return ["" if is_missing(value) else str(formatter(value)) for value in self.column_values(i)]
+
+    def summary(self) -> RowTable:
+        """
+        The sum, mean, minimum and maximum of the numeric columns, one row per column.
+        """
+        rows = []
+        for i, col in enumerate(self.columns):
+            values = [value for value in self.column_values(i) if not is_missing(value)]
+            if values and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                rows.append([col, sum(values), round(sum(values) / len(values), 2), min(values), max(values)])
+
+        return RowTable.from_rows(rows, columns=SUMMARY_COLUMNS)
+
+    def write(self, path: str, file_format: str = "csv", chunk_size: int = 100_000) -> None:
+        """
+        Write the table to a gzip compressed CSV or a Parquet file in chunks of rows, so no full copy of the file is
+        built in memory.
+
+        Parameters
+        ----------
+        path: str
+            path of the file
+        file_format: str
+            "csv" for a gzip compressed CSV, or "parquet" (requires pyarrow)
+        chunk_size: int
+            number of rows written at a time
+        """
+        if file_format == "csv":
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+                self._write_csv(f, chunk_size)
+        elif file_format == "parquet":
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError(
+                    "Writing Parquet files requires pyarrow, install it with `pip install zyppnotify[parquet]`."
+                )
+
+            # the schema of the file is taken from the first chunk, the other chunks are converted to it.
+            writer = None
+            try:
+                for start in range(0, max(self.num_rows, 1), chunk_size):
+                    chunk = self.slice(start, start + chunk_size)._to_arrow(writer.schema if writer else None)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, chunk.schema)
+                    writer.write_table(chunk)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            raise ValueError(f"Unknown file format {file_format}, use csv or parquet.")
+
+    def _write_csv(self, f, chunk_size: int) -> None:
+        writer = csv.writer(f)
+        writer.writerow(self.columns)
+        for start in range(0, self.num_rows, chunk_size):
+            chunk = self.slice(start, start + chunk_size)
+            columns = [chunk.column_values(i) for i in range(len(self.columns))]
+            writer.writerows(zip(*columns))
+
+    def _to_arrow(self, schema=None) -> pa.Table:
+        import pyarrow as pa
+
+        data = {str(col): self.column_values(i) for i, col in enumerate(self.columns)}
+        return pa.Table.from_pydict(data, schema=schema)
+
+
+class PandasTable(Table):
+    def __init__(self, df: pd.DataFrame):
+        """
+        Table backed by a pandas DataFrame.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            the dataframe
+        """
+        self.df = df
+        self.columns = list(df.columns)
+
+    @property
+    def num_rows(self) -> int:
+        return self.df.shape[0]
+
+    def slice(self, start: int, stop: int) -> Table:
+        return PandasTable(self.df.iloc[start:stop])
+
+    def select(self, n: int) -> Table:
+        return PandasTable(self.df.iloc[:, :n])
+
+    def column_values(self, i: int) -> list:
+        column = self.df.iloc[:, i]
+        return column.astype(object).where(column.notna(), None).tolist()
+
+    def column_texts(self, i: int) -> list:
+        return series_to_texts(self.df.iloc[:, i])
+
+    def format_column(self, i: int, formatter) -> list:
+        return series_to_texts(self.df.iloc[:, i].map(formatter, na_action="ignore"))
+
+    def summary(self) -> RowTable:
+        numeric = self.df.select_dtypes("number")
+        # the aggregates are computed per column, so integer columns are not shown as floats. Columns are selected by
+        # position, as column names may be duplicated. Columns without values are skipped, as their aggregates are NA.
+        rows = [
+            [col, *(numeric.iloc[:, i].agg(name).item() for name in ["sum", "mean", "min", "max"])]
+            for i, col in enumerate(numeric.columns)
+            if numeric.iloc[:, i].notna().any()
+        ]
+        for row in rows:
+            row[2] = round(row[2], 2)
+
+        return RowTable.from_rows(rows, columns=SUMMARY_COLUMNS)
+
+    def _write_csv(self, f, chunk_size: int) -> None:
+        for start in range(0, max(self.num_rows, 1), chunk_size):
+            self.df.iloc[start : start + chunk_size].to_csv(f, index=False, header=start == 0)
+
+    def _to_arrow(self, schema=None) -> pa.Table:
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(self.df, schema=schema, preserve_index=False)
+
+
+class ArrowTable(Table):
+    def __init__(self, table: pa.Table):
+        """
+        Table backed by a pyarrow Table, also used for polars DataFrames.
+
+        Parameters
+        ----------
+        table: pyarrow.Table
+            the table
+        """
+        self.table = table
+        self.columns = list(table.column_names)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    def slice(self, start: int, stop: int) -> Table:
+        return ArrowTable(self.table.slice(start, max(stop - start, 0)))
+
+    def select(self, n: int) -> Table:
+        return ArrowTable(self.table.select(list(range(min(n, len(self.columns))))))
+
+    def column_values(self, i: int) -> list:
+        return self.table.column(i).to_pylist()
+
+    def column_texts(self, i: int) -> list:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        column = self.table.column(i)
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) or pa.types.is_string(column.type):
+            # converted in one vectorized pass per column.
+            return pc.fill_null(pc.cast(column, pa.string()), "").to_pylist()
+
+        return super().column_texts(i)
+
+    def summary(self) -> RowTable:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        rows = []
+        for col, column in zip(self.columns, self.table.columns):
+            numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+            if not numeric or column.null_count == len(column):
+                continue
+
+            min_max = pc.min_max(column).as_py()
+            mean = round(pc.mean(column).as_py(), 2)
+            rows.append([col, pc.sum(column).as_py(), mean, min_max["min"], min_max["max"]])
+
+        return RowTable.from_rows(rows, columns=SUMMARY_COLUMNS)
+
+    def _write_csv(self, f, chunk_size: int) -> None:
+        import pyarrow.csv
+
+        # pyarrow writes bytes, the gzip file is opened in text mode, so its underlying binary stream is used.
+        f.flush()
+        with pyarrow.csv.CSVWriter(f.buffer, self.table.schema) as writer:
+            for batch in self.table.to_batches(max_chunksize=chunk_size):
+                writer.write_batch(batch)
+
+    def _to_arrow(self, schema=None) -> pa.Table:
+        return self.table if schema is None else self.table.cast(schema)
+
+
+class RowTable(Table):
+    def __init__(self, columns: list, data: list):
+        """
+        Table of plain python values, stored per column.
+
+        Parameters
+        ----------
+        columns: list
+            column names
+        data: list of list
+            values per column
+        """
+        self.columns = list(columns)
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, rows: Iterable, columns: list = None) -> RowTable:
+        """
+        Create a table from rows.
+
+        Parameters
+        ----------
+        rows: Iterable
+            dicts of column names and values, or sequences of values in the order of `columns`. Shorter rows are padded
+            with None.
+        columns: list
+            column names. Defaults to the keys of the dicts in order of appearance, or the position of the values.
+
+        Returns
+        -------
+        table: RowTable
+        """
+        rows = list(rows)
+        if rows and isinstance(rows[0], dict):
+            if columns is None:
+                columns = list(dict.fromkeys(key for row in rows for key in row))
+            return cls(columns, [[row.get(col) for row in rows] for col in columns])
+
+        width = max((len(row) for row in rows), default=0)
+        if columns is None:
+            columns = list(range(width))
+        elif width > len(columns):
+            raise ValueError(f"Rows have up to {width} values, but only {len(columns)} columns are given.")
+        data = [list(values) for values in itertools.zip_longest(*rows)]
+        data += [[None] * len(rows) for _ in range(len(columns) - len(data))]
+        return cls(columns, data)
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def slice(self, start: int, stop: int) -> Table:
+        return RowTable(self.columns, [values[start:stop] for values in self.data])
+
+    def select(self, n: int) -> Table:
+        return RowTable(self.columns[:n], self.data[:n])
+
+    def column_values(self, i: int) -> list:
+        return [None if is_missing(value) else value for value in self.data[i]]
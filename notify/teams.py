@@ -1,22 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import dataclasses
+import json
 import logging
+from typing import TYPE_CHECKING
+
+import httpx
+from notify import loop
+from notify import webhook as webhook_module
+from notify.instrumentation import stage
+from notify.tables import TableLike, as_table, is_table
+from notify.throttle import rollup_text
+from notify.types import DeliveryResult, DfsInfo, RetryPolicy, TeamsMessage
+from notify.utils import escape_markdown, paused_gc
+
+if TYPE_CHECKING:
+    from notify.templates import CardTemplate
+    from notify.throttle import Throttle
+
+# orjson is an optional, faster encoder. Dates and dataclasses are passed to `str` like the json module does, so texts,
+# integers and tables (which are texts in a card) are encoded the same by both. Floats are not: orjson writes NaN and
+# infinity as null, where the json module writes the invalid JSON NaN and Infinity, and orjson writes exponents
+# shorter (1e20 instead of 1e+20). The payload size, and the throttle key of messages with such floats in `extra`
+# elements, then depend on whether orjson is installed.
+try:
+    import orjson
+
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+except ImportError:
+    orjson = None
+
+# maximum size of the JSON payload of a Teams message
+MAX_PAYLOAD_SIZE = 28 * 1024
+
+
+def serialize(obj) -> bytes:
+    """
+    Serialize (a part of) a message to compact UTF-8 encoded JSON, as it is posted to the webhook. Uses orjson when it
+    is installed, which writes NaN and infinity as null and shorter exponents of floats than the json module.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers above 64 bits, which the json module does support
+
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
 
-import pandas as pd
-import requests
-from notify.types import DfsInfo
-from pympler import asizeof
+
+def part_label(part: int, parts: int) -> dict:
+    """
+    Label of a part of a message that is split in multiple messages.
+    """
+    return {"type": "TextBlock", "text": f"Part {part}/{parts}", "isSubtle": "true", "size": "Small", "wrap": "true"}
+
+
+def append_block(payload: bytes, block: dict) -> bytes:
+    """
+    Add a block at the end of the body of a serialized message, without serializing the message again. The body is
+    the last item of the card, so it is closed by the last bytes of the payload.
+    """
+    end = b"]}}]}"
+    if not payload.endswith(end):
+        raise ValueError("The payload is not a message serialized by NotifyTeams.")
+
+    return payload[: -len(end)] + b"," + serialize(block) + end
 
 
 class NotifyTeams:
-    def __init__(self, webhook: str):
+    def __init__(
+        self,
+        webhook: str,
+        timeout: httpx.Timeout = None,
+        retry: RetryPolicy = None,
+        compress: bool = False,
+        throttle: Throttle = None,
+    ):
         """
 
         Parameters
         ----------
         webhook: str
             url for sending the teams message
+        timeout: httpx.Timeout, float
+            connect and read timeouts of the request, defaults to 5 seconds to connect and 10 seconds to read
+        retry: RetryPolicy
+            retry policy for throttled (429) and failed (5xx) requests, defaults to 3 retries with exponential backoff
+        compress: bool
+            gzip the request body, for endpoints that accept a gzip Content-Encoding, e.g. a Power Automate flow or a
+            proxy in front of the webhook. The size limit applies to the uncompressed message.
+        throttle: Throttle
+            suppresses duplicate messages and limits the rate of messages to the webhook, can be shared by instances
+            (optional)
         """
 
         self.webhook = webhook
+        self.timeout = webhook_module.DEFAULT_TIMEOUT if timeout is None else timeout
+        self.retry = retry or webhook_module.DEFAULT_RETRY
+        self.compress = compress
+        self.throttle = throttle
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear the message built with the create and add methods, so the instance can be used for a new message.
+        """
         self.msg = {
             "type": "message",
             "attachments": [
@@ -35,66 +125,73 @@ class NotifyTeams:
         self.body = []
 
     @staticmethod
-    def create_adaptive_card_dataframe(df: pd.DataFrame) -> dict:
+    def create_adaptive_card_dataframe(df: TableLike, max_rows: int = 30, max_columns: int = 10) -> dict:
         """
         Function to create a full dataframe used in adaptive cards in an adaptive card.
+        Parameters
+        ----------
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            Dataframe that will be converted to a table.
+        max_rows: int
+            maximum number of rows in the table, None for all rows.
+        max_columns: int
+            maximum number of columns in the table, None for all columns.
         """
-        if df.shape[0] > 30:
-            logging.warning(f"only first 30 records will be added.({df.shape[0]}> the limit of 30).")
-            df = df.head(n=30)
-        if df.shape[1] > 10:
-            logging.warning("Only the first 10 columns will be shown")
-            df = df.iloc[:, :10].copy()
-
-        df_dict = df.to_dict("records")
-        col_widths = []
-        header_cells = []
-        for col in df.columns:
-            width = {"width": "auto"}
-            col_widths.append(width)
-            header_cell = {
+        table = as_table(df)
+        if max_rows is not None and table.num_rows > max_rows:
+            logging.warning(f"only first {max_rows} records will be added.({table.num_rows}> the limit of {max_rows}).")
+            table = table.head(max_rows)
+        if max_columns is not None and len(table.columns) > max_columns:
+            logging.warning(f"Only the first {max_columns} columns will be shown")
+            table = table.select(max_columns)
+
+        # the table is built column wise: every column is converted to text and escaped in one pass, then zipped into
+        # rows. Markdown in the cells is escaped, so values like "*" or "- 1" are shown as they are.
+        columns = [escape_markdown(table.column_texts(i)) for i in range(len(table.columns))]
+        col_widths = [{"width": "auto"} for _ in table.columns]
+        header_cells = [
+            {
                 "type": "TableCell",
                 "items": [
                     {
                         "type": "TextBlock",
                         "style": "emphasis",
-                        "text": col,
+                        "text": text,
                         "wrap": True,
                         "weight": "bolder",
                     }
                 ],
             }
-            header_cells.append(header_cell)
-        header_row = {"type": "TableRow", "cells": header_cells}
-        rows = [header_row]
-        for row in df_dict:
-            cells = []
-            for key, value in row.items():
-                cell = {
-                    "type": "TableCell",
-                    "items": [
-                        {
-                            "type": "TextBlock",
-                            "text": value,
-                            "wrap": True,
-                        }
+            for text in escape_markdown([str(col) for col in table.columns])
+        ]
+        rows = [{"type": "TableRow", "cells": header_cells}]
+        with paused_gc():
+            rows.extend(
+                {
+                    "type": "TableRow",
+                    "cells": [
+                        {"type": "TableCell", "items": [{"type": "TextBlock", "text": text, "wrap": True}]}
+                        for text in row
                     ],
                 }
-                cells.append(cell)
-            row = {"type": "TableRow", "cells": cells}
-            rows.append(row)
+                for row in zip(*columns)
+            )
         table = {"type": "Table", "columns": col_widths, "rows": rows, "showGridLines": True}
         return table
 
-    def add_full_dataframe(self, df: pd.DataFrame) -> None:
+    def add_full_dataframe(self, df: TableLike, max_rows: int = 30, max_columns: int = 10) -> None:
         """
         Function to add a full dataframe to the adaptive card.
         Parameters
         ----------
-        df: pd.DataFrame
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
             Dataframe that will be added to the card.
+        max_rows: int
+            maximum number of rows in the table, None for all rows.
+        max_columns: int
+            maximum number of columns in the table, None for all columns.
         """
-        table = self.create_adaptive_card_dataframe(df)
+        table = self.create_adaptive_card_dataframe(df, max_rows=max_rows, max_columns=max_columns)
         self.body.append(table)
 
     def create_dataframe_report(self, dfs: DfsInfo) -> None:
@@ -103,9 +200,11 @@ class NotifyTeams:
         Parameters
         ----------
         dfs: dict
-            Dataframes containing {name, df} as key value pairs
+            names and the shape (records, columns) or the table itself of the processed dataframes as key value pairs
         """
         for df_name, df_shape in dfs.items():
+            if is_table(df_shape):
+                df_shape = as_table(df_shape).shape
             df_report = {
                 "type": "Container",
                 "style": "accent",
@@ -302,18 +401,91 @@ class NotifyTeams:
         message: str = None,
         buttons: dict = None,
         warning_message: str = None,
-        df: pd.DataFrame = pd.DataFrame(),
+        df: TableLike = None,
         dfs: DfsInfo = None,
         extra: list = None,
+        split: bool = False,
     ):
         """
-        This function posts a message, containing a section, in a Microsoft Teams channel
+        This function posts a message, containing a section, in a Microsoft Teams channel. See `build` for the
+        parameters.
+
+        Returns
+        -------
+        result: DeliveryResult or list of DeliveryResult
+            sends a message in a teams channel, reporting col en records as information.
+        """
+        return loop.run(
+            self.basic_message_async(
+                title=title,
+                subtitle=subtitle,
+                message=message,
+                buttons=buttons,
+                warning_message=warning_message,
+                df=df,
+                dfs=dfs,
+                extra=extra,
+                split=split,
+            )
+        )
+
+    async def basic_message_async(
+        self,
+        title: str,
+        subtitle: str = None,
+        message: str = None,
+        buttons: dict = None,
+        warning_message: str = None,
+        df: TableLike = None,
+        dfs: DfsInfo = None,
+        extra: list = None,
+        split: bool = False,
+    ):
+        """
+        This coroutine posts a message, containing a section, in a Microsoft Teams channel. It can be awaited from any
+        event loop, the request itself is performed on the shared notify event loop. See `build` for the parameters.
+
+        Returns
+        -------
+        result: DeliveryResult or list of DeliveryResult
+            sends a message in a teams channel, reporting col en records as information. With `split` a list with the
+            result per message, sending stops at the first message that fails.
+        """
+        with stage("teams", "send") as s:
+            teams_message = self.build(
+                title=title,
+                subtitle=subtitle,
+                message=message,
+                buttons=buttons,
+                warning_message=warning_message,
+                df=df,
+                dfs=dfs,
+                extra=extra,
+                split=split,
+            )
+            return await self._send(teams_message, s)
+
+    def build(
+        self,
+        title: str,
+        subtitle: str = None,
+        message: str = None,
+        buttons: dict = None,
+        warning_message: str = None,
+        df: TableLike = None,
+        dfs: DfsInfo = None,
+        extra: list = None,
+        split: bool = False,
+    ) -> TeamsMessage:
+        """
+        Build and serialize a message without sending it. The message is built on a copy of the instance, so the
+        instance itself is not changed and can build and send many messages, also concurrently.
 
         Parameters
         ----------
         dfs: dict
-            Dataframes dictionary, with keys as dataframe name and value as dataframe.
-        df: pd.DataFrame
+            Dataframes dictionary, with keys as dataframe name and value as dataframe or its shape.
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
             df that will be added to a card section. length of dataframe should not exceed 10.
         title: str
             Title of the message
@@ -328,36 +500,360 @@ class NotifyTeams:
         extra: list
             dictionary containing index and item as key values where item should be a dict containing the item to be
             added to the card.
+        split: bool
+            split a message above the Teams size limit into multiple messages, instead of raising a ValueError. The
+            header is repeated in every message, tables are continued and "Part i/n" is added. With `split`, all rows
+            and columns of `df` are added.
+
         Returns
         -------
-        response
-            sends a message in a teams channel, reporting col en records as information.
+        message: TeamsMessage
+            the serialized message, to be sent with `send`
         """
-        self.create_message_header(title, subtitle)
+        with stage("teams", "build") as s:
+            teams_message = self._build(title, subtitle, message, buttons, warning_message, df, dfs, extra, split)
+            s.set(size=teams_message.size)
+        return teams_message
+
+    def _build(self, title, subtitle, message, buttons, warning_message, df, dfs, extra, split) -> TeamsMessage:
+        card = copy.copy(self)
+        card.reset()
+        card.create_message_header(title, subtitle)
 
         if warning_message:
-            self.create_warning_message(warning_message)
+            card.create_warning_message(warning_message)
+        header = list(card.body)
 
         if message:
-            self.create_simple_message(message)
+            card.create_simple_message(message)
 
         if dfs:
-            self.create_dataframe_report(dfs)
+            card.create_dataframe_report(dfs)
 
-        if not df.empty:
-            self.add_full_dataframe(df)
+        table = as_table(df) if df is not None else None
+        if table is not None and not table.empty:
+            card.add_full_dataframe(table, max_rows=None if split else 30, max_columns=None if split else 10)
 
         if buttons:
-            self.create_buttons(buttons)
+            card.create_buttons(buttons)
 
         if extra:
-            self.add_extra_elements(extra)
-        self.msg["attachments"][0]["content"]["body"] = self.body
-        body_size = asizeof.asizeof(self.body)
-        if body_size > 40_000:
-            raise ValueError(f"Body size is {body_size} bytes. This is will result in a Teams message above 28KB.")
-        try:
-            response = requests.post(url=self.webhook, json=self.msg)
-            return response
-        except Exception as e:
-            logging.warning(f"Teams notification not sent! Error: {e}")
+            card.add_extra_elements(extra)
+        card.msg["attachments"][0]["content"]["body"] = card.body
+        with stage("teams", "serialize") as s:
+            payload = card.serialize_message()
+            s.set(size=len(payload))
+        if split:
+            # the header runs up to its last block, extra items inserted before or between its blocks are repeated too.
+            header_blocks = 1 + max(i for i, block in enumerate(card.body) if any(block is h for h in header))
+            payloads = [payload] if len(payload) <= MAX_PAYLOAD_SIZE else card.split_message(header_blocks)
+            return TeamsMessage(payloads=tuple(payloads), split=True)
+
+        if len(payload) > MAX_PAYLOAD_SIZE:
+            raise ValueError(f"Message size is {len(payload)} bytes. This is above the Teams limit of 28KB.")
+        return TeamsMessage(payloads=(payload,))
+
+    def send(self, message: TeamsMessage):
+        """
+        Send a message built with `build` to the webhook. See `send_async`.
+        """
+        return loop.run(self.send_async(message))
+
+    async def send_async(self, message: TeamsMessage):
+        """
+        Send a message built with `build` to the webhook. A message can be sent more than once and to other webhooks.
+
+        Parameters
+        ----------
+        message: TeamsMessage
+            the message
+
+        Returns
+        -------
+        result: DeliveryResult or list of DeliveryResult
+            for a split message a list with the result per part, sending stops at the first part that fails
+        """
+        with stage("teams", "send") as s:
+            return await self._send(message, s)
+
+    def send_many(self, message: TeamsMessage, webhooks: list, max_concurrency: int = None) -> list:
+        """
+        Send a message built with `build` to many webhooks concurrently. See `send_many_async`.
+
+        Returns
+        -------
+        results: list
+            result per webhook, in the same order as `webhooks`
+        """
+        return loop.run(self.send_many_async(message, webhooks, max_concurrency=max_concurrency))
+
+    async def send_many_async(self, message: TeamsMessage, webhooks: list, max_concurrency: int = None) -> list:
+        """
+        Send a message built with `build` to many webhooks concurrently, e.g. an alert to many channels. The message is
+        built and serialized once and posted over the pooled connections of the webhook hosts. Every webhook is sent with
+        the retry policy, throttle and compression of this instance. A webhook that fails or is slow does not stop or
+        delay the others.
+
+        Parameters
+        ----------
+        message: TeamsMessage
+            the message
+        webhooks: list of str
+            urls of the webhooks
+        max_concurrency: int
+            maximum number of webhooks posted to at the same time, all at once by default
+
+        Returns
+        -------
+        results: list
+            result per webhook, in the same order as `webhooks`. A DeliveryResult, or for a split message a list of
+            DeliveryResult.
+        """
+        return await loop.run_async(self._send_many(message, webhooks, max_concurrency))
+
+    async def _send_many(self, message: TeamsMessage, webhooks: list, max_concurrency: int) -> list:
+        semaphore = asyncio.Semaphore(max_concurrency or max(len(webhooks), 1))
+
+        async def send(webhook: str):
+            channel = copy.copy(self)
+            channel.webhook = webhook
+            with stage("teams", "send") as s:
+                try:
+                    async with semaphore:
+                        return await channel._send(message, s)
+                except Exception as e:
+                    logging.warning(f"Teams notification not sent! Error: {e}")
+                    s.set(success=False)
+                    result = DeliveryResult(webhook=webhook, success=False, error=e)
+                    return [result] if message.split else result
+
+        return list(await asyncio.gather(*(send(webhook) for webhook in webhooks)))
+
+    async def _send(self, message: TeamsMessage, s):
+        # s is the stage of the delivery, the outcome is added to it.
+        decision = None
+        if self.throttle is not None:
+            decision = self.throttle.check(self.webhook, *message.payloads)
+            if not decision.allowed:
+                logging.info(f"Teams notification suppressed ({decision.reason}).")
+                s.set(success=False, suppressed=True)
+                result = DeliveryResult(webhook=self.webhook, success=False, suppressed=True)
+                return [result] if message.split else result
+            if decision.suppressed:
+                message = self._with_rollup(message, rollup_text(decision))
+
+        s.set(size=message.size)
+        if message.split:
+            results = await loop.run_async(self.post_messages(list(message.payloads)))
+            s.set(success=len(results) == len(message.payloads) and results[-1].success)
+            if decision is not None and not results[0].success:
+                # nothing was delivered, so a retry is not a duplicate
+                self.throttle.release(decision)
+            return results
+
+        result = await loop.run_async(self.post_message(message.payloads[0]))
+        s.set(success=result.success)
+        if not result.success:
+            logging.warning(f"Teams notification not sent! Error: {result.error}")
+            if decision is not None:
+                self.throttle.release(decision)
+
+        return result
+
+    def template_message(self, template: CardTemplate | str, df: TableLike = None, **params) -> DeliveryResult:
+        """
+        This function posts a message rendered from a template in a Microsoft Teams channel. See
+        `template_message_async` for the parameters.
+
+        Returns
+        -------
+        result: DeliveryResult
+        """
+        return loop.run(self.template_message_async(template, df=df, **params))
+
+    async def template_message_async(
+        self, template: CardTemplate | str, df: TableLike = None, **params
+    ) -> DeliveryResult:
+        """
+        This coroutine posts a message rendered from a template in a Microsoft Teams channel. The template is built
+        once, so only the parameters and the table are serialized per message.
+
+        Parameters
+        ----------
+        template: CardTemplate or str
+            the template, or the name it is registered with
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            df that will be added to the table of the template (optional)
+        params:
+            values of the fields in the texts of the template
+
+        Returns
+        -------
+        result: DeliveryResult
+        """
+        if isinstance(template, str):
+            from notify.templates import get_template
+
+            template = get_template(template)
+
+        with stage("teams", "send") as s:
+            with stage("teams", "build") as b:
+                payload = template.render(df=df, **params)
+                b.set(size=len(payload))
+            if len(payload) > MAX_PAYLOAD_SIZE:
+                raise ValueError(f"Message size is {len(payload)} bytes. This is above the Teams limit of 28KB.")
+            return await self._send(TeamsMessage(payloads=(payload,)), s)
+
+    @staticmethod
+    def _with_rollup(message: TeamsMessage, text: str) -> TeamsMessage:
+        # the rollup is added to the last part, unless it does not fit in the size limit.
+        block = {"type": "TextBlock", "text": text, "isSubtle": "true", "size": "Small", "wrap": "true"}
+        payload = append_block(message.payloads[-1], block)
+        if len(payload) > MAX_PAYLOAD_SIZE:
+            logging.info(f"Teams notification sent without rollup: {text}")
+            return message
+
+        return dataclasses.replace(message, payloads=(*message.payloads[:-1], payload))
+
+    def split_message(self, header_blocks: int = 1) -> list:
+        """
+        Split the message into messages below the Teams size limit. The first `header_blocks` blocks of the body are
+        repeated in every message, followed by a "Part i/n" label. Tables that do not fit are continued in the next
+        message, repeating the header row of the table.
+
+        Parameters
+        ----------
+        header_blocks: int
+            number of blocks at the start of the body that are repeated in every message
+
+        Returns
+        -------
+        payloads: list of bytes
+            the serialized messages
+        """
+        header, content = self.body[:header_blocks], self.body[header_blocks:]
+        # the label is measured with the widest part numbers that fit in a message.
+        budget = MAX_PAYLOAD_SIZE - len(serialize(self._with_body(header + [part_label(9999, 9999)])))
+        parts = [[]]
+        used = 0
+
+        def space() -> int:
+            return budget - used - (1 if parts[-1] else 0)  # blocks are separated by a comma
+
+        def new_part() -> None:
+            nonlocal used
+            if parts[-1]:
+                parts.append([])
+                used = 0
+
+        def add(block: dict, size: int) -> None:
+            nonlocal used
+            if size > space():
+                new_part()
+            if size > space():
+                raise ValueError(f"A {block.get('type')} block of {size} bytes is above the Teams limit of 28KB.")
+            used += size + (1 if parts[-1] else 0)
+            parts[-1].append(block)
+
+        for block in content:
+            size = len(serialize(block))
+            if size <= space() or block.get("type") != "Table" or len(block["rows"]) < 2:
+                add(block, size)
+                continue
+
+            head, rows = block["rows"][0], block["rows"][1:]
+            empty_size = len(serialize({**block, "rows": [head]}))
+            chunk, chunk_size = [], empty_size
+            for row in rows:
+                row_size = len(serialize(row)) + 1
+                if chunk_size + row_size > space():
+                    if chunk:
+                        add({**block, "rows": [head, *chunk]}, chunk_size)
+                        chunk, chunk_size = [], empty_size
+                    new_part()
+                    if chunk_size + row_size > space():
+                        raise ValueError(f"A table row of {row_size} bytes is above the Teams limit of 28KB.")
+                chunk.append(row)
+                chunk_size += row_size
+            if chunk:
+                add({**block, "rows": [head, *chunk]}, chunk_size)
+
+        return [
+            serialize(self._with_body(header + [part_label(i, len(parts))] + blocks))
+            for i, blocks in enumerate(parts, start=1)
+        ]
+
+    def _with_body(self, body: list) -> dict:
+        # copy of the message with another body, the blocks themselves are shared.
+        attachment = self.msg["attachments"][0]
+        return {**self.msg, "attachments": [{**attachment, "content": {**attachment["content"], "body": body}}]}
+
+    async def post_messages(self, payloads: list) -> list:
+        """
+        Post messages in order to the webhook, stopping at the first message that is not delivered.
+
+        Parameters
+        ----------
+        payloads: list of bytes
+            the serialized messages
+
+        Returns
+        -------
+        results: list of DeliveryResult
+        """
+        results = []
+        for payload in payloads:
+            result = await self.post_message(payload)
+            results.append(result)
+            if not result.success:
+                logging.warning(f"Teams notification not sent! Error: {result.error}")
+                break
+
+        return results
+
+    def serialize_message(self) -> bytes:
+        """
+        Serialize the message to the UTF-8 encoded JSON that is posted to the webhook. The length of the result is the
+        exact size of the message on the wire.
+
+        Returns
+        -------
+        payload: bytes
+        """
+        return serialize(self.msg)
+
+    async def post_message(self, payload: bytes = None) -> DeliveryResult:
+        """
+        Post the message to the webhook over the pooled connection of the webhook host, retrying throttled and failed
+        requests according to the retry policy.
+
+        Parameters
+        ----------
+        payload: bytes
+            the serialized message, serialized with `serialize_message` when not given
+
+        Returns
+        -------
+        result: DeliveryResult
+        """
+        with stage("teams", "post") as s:
+            try:
+                if payload is None:
+                    payload = self.serialize_message()
+                result = await webhook_module.post(
+                    self.webhook,
+                    content=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.timeout,
+                    retry=self.retry,
+                    compress=self.compress,
+                )
+            except Exception as e:
+                result = DeliveryResult(webhook=self.webhook, success=False, error=e)
+            s.set(
+                size=len(payload or b""),
+                status_code=result.status_code,
+                attempts=result.attempts,
+                success=result.success,
+            )
+            return result
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import dataclasses
+import html
+import re
+import threading
+from json.encoder import encode_basestring
+from string import Formatter
+
+from notify.mail import NotifyMail
+from notify.tables import TableLike, as_table, is_missing
+from notify.teams import NotifyTeams, serialize
+
+# placeholders in the card while it is serialized, replaced by the bound parameters on render
+_SLOT = "__notify_slot_{}__"
+_SLOT_PATTERN = re.compile(r'"__notify_slot_(\d+)__"')
+_TABLE_SLOT = '"__notify_table__"'
+
+_formatter = Formatter()
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+class Html(str):
+    """
+    Text that is inserted into a mail template as HTML, without escaping.
+    """
+
+
+class TextTemplate:
+    def __init__(self, text: str):
+        """
+        Text with `str.format` fields like "Job {job} failed", parsed once into its literal parts and fields.
+
+        Parameters
+        ----------
+        text: str
+            the text, literal braces are written as {{ and }}
+        """
+        self.text = text
+        self.parts = list(_formatter.parse(text))
+        self.fields = [field for _, field, _, _ in self.parts if field is not None]
+
+    @property
+    def static(self) -> bool:
+        """
+        Whether the text has no fields.
+        """
+        return not self.fields
+
+    def render(self, params: dict, escape=None) -> str:
+        """
+        Fill in the fields.
+
+        Parameters
+        ----------
+        params: dict
+            values of the fields
+        escape: Callable
+            function applied to the values of the fields, e.g. `html.escape`. Values marked as `Html` are not escaped.
+            (optional)
+
+        Returns
+        -------
+        text: str
+        """
+        if escape is None:
+            try:
+                return self.text.format_map(params)
+            except (KeyError, IndexError, AttributeError) as e:
+                raise ValueError(f"Missing template parameter {e} in {self.text!r}.")
+
+        pieces = []
+        for literal, field, format_spec, conversion in self.parts:
+            pieces.append(literal)
+            if field is None:
+                continue
+
+            try:
+                value, _ = _formatter.get_field(field, (), params)
+            except (KeyError, IndexError, AttributeError):
+                raise ValueError(f"Missing template parameter {field!r} in {self.text!r}.")
+            text = _formatter.format_field(_formatter.convert_field(value, conversion), format_spec)
+            pieces.append(escape(text) if escape and not isinstance(value, Html) else text)
+
+        return "".join(pieces)
+
+
+class CardTemplate:
+    def __init__(
+        self,
+        title: str,
+        subtitle: str = None,
+        message: str = None,
+        buttons: dict = None,
+        warning_message: str = None,
+        extra: list = None,
+        table: bool = False,
+    ):
+        """
+        Teams message layout that is built and serialized once. The title, subtitle, message, warning message and
+        button urls can contain `str.format` fields like "Job {job} failed", which are filled in per message by
+        `render`, so sending a message is mostly joining the precomputed JSON fragments. The button names and the
+        `extra` items are used as they are, braces in them are not fields.
+
+        Parameters
+        ----------
+        title: str
+            Title of the message
+        subtitle: str
+            Subtitle of the message (optional)
+        message: str
+            Content of the message, <br> tags in the template split it in text blocks (optional)
+        buttons: dict
+            dictionary of button_name, button_url as key value pairs, the urls can contain fields (optional)
+        warning_message: str
+            warning message that will be added to the card (optional)
+        extra: list
+            dictionary containing index and item as key values where item should be a dict containing the item to be
+            added to the card (optional)
+        table: bool
+            the message contains a table, passed as `df` to `render`
+        """
+        # the card is built by the same builders as `NotifyTeams.basic_message`, so both produce the same layout. Only
+        # the texts declared as templates are parsed, texts with fields are passed to the builders as placeholders.
+        self.slots = []
+        builder = NotifyTeams(webhook=None)
+        builder.create_message_header(self._slot(title), self._slot(subtitle) if subtitle else subtitle)
+        if warning_message:
+            builder.create_warning_message(self._slot(warning_message))
+        if message:
+            # the message is split in text blocks on <br> tags, so every block is a template of its own.
+            builder.create_simple_message("<br>".join(self._slot(part) for part in message.split("<br>")))
+        if table:
+            builder.body.append(_TABLE_SLOT.strip('"'))
+        if buttons:
+            builder.create_buttons({name: self._slot(url) for name, url in buttons.items()})
+        if extra:
+            builder.add_extra_elements(extra)
+        builder.msg["attachments"][0]["content"]["body"] = builder.body
+
+        content = serialize(builder.msg).decode("utf-8")
+        # the table slot includes the comma before it, so the table can be left out.
+        before, table_slot, after = content.partition("," + _TABLE_SLOT)
+        self.table = bool(table_slot)
+        self.fragments = [_SLOT_PATTERN.split(part) for part in ([before, after] if table_slot else [content])]
+
+    def _slot(self, template: str) -> str:
+        # a text with fields is replaced by a numbered placeholder, a static text by its literal text.
+        text = TextTemplate(template)
+        if text.static:
+            return text.render({})
+        self.slots.append(text)
+        return _SLOT.format(len(self.slots) - 1)
+
+    def render(self, df: TableLike = None, max_rows: int = 30, **params) -> bytes:
+        """
+        Render the message for a set of parameters.
+
+        Parameters
+        ----------
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            table of the message, for templates created with `table=True` (optional)
+        max_rows: int
+            maximum number of rows in the table, None for all rows
+        params:
+            values of the fields in the texts of the template
+
+        Returns
+        -------
+        payload: bytes
+            the serialized message
+        """
+        if df is not None and not self.table:
+            raise ValueError("The template has no table, create it with table=True to add a df.")
+
+        table = as_table(df) if df is not None else None
+        pieces = []
+        for i, fragments in enumerate(self.fragments):
+            if i and table is not None and not table.empty:
+                pieces.append(",")
+                pieces.append(serialize(NotifyTeams.create_adaptive_card_dataframe(table, max_rows)).decode("utf-8"))
+
+            # splitting on the placeholders gives literal JSON and slot numbers, alternating.
+            for j, fragment in enumerate(fragments):
+                if j % 2:
+                    text = self.slots[int(fragment)].render(params)
+                    pieces.append(encode_basestring(text))
+                else:
+                    pieces.append(fragment)
+
+        return "".join(pieces).encode("utf-8")
+
+
+class MailTemplate:
+    def __init__(
+        self,
+        subject: str,
+        message: str,
+        cc: str = None,
+        bcc: str = None,
+        files: dict = None,
+        max_rows: int = 30,
+        overflow: str = None,
+    ):
+        """
+        E-mail layout that is parsed once. The subject and message can contain `str.format` fields like
+        "Invoice {number}", which are filled in per e-mail. Values are HTML escaped in the message, unless they are
+        wrapped in `Html`.
+
+        Parameters
+        ----------
+        subject: str
+            subject of the message
+        message: str
+            HTML or plain text content of the message
+        cc: str
+            e-mail address to add as cc (optional)
+        bcc: str
+            e-mail address to add as bcc (optional)
+        files: dict
+            attachment names and the path or url of the file as key value pairs (optional)
+        max_rows: int
+            maximum number of rows of the table in the message, see NotifyMail
+        overflow: str
+            format of the attachment with all rows of the table, see NotifyMail
+        """
+        self.subject = TextTemplate(subject)
+        self.message = TextTemplate(message)
+        self.cc = cc
+        self.bcc = bcc
+        self.files = files
+        self.max_rows = max_rows
+        self.overflow = overflow
+
+    def render(self, **params) -> tuple:
+        """
+        Render the subject and message for a set of parameters.
+
+        Returns
+        -------
+        subject, message: tuple of str
+        """
+        return self.subject.render(params), self.message.render(params, escape=html.escape)
+
+    def create_mail(self, to: str, df: TableLike = None, graph=None, **params) -> NotifyMail:
+        """
+        Create the e-mail for a recipient.
+
+        Parameters
+        ----------
+        to: str
+            the e-mail adress to send email to
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            table that needs to be added to the HTML message (optional)
+        graph: Graph
+            Graph client to send the e-mail with (optional)
+        params:
+            values of the fields in the subject and message
+
+        Returns
+        -------
+        mail: NotifyMail
+        """
+        subject, message = self.render(**params)
+        return NotifyMail(
+            to=to,
+            subject=subject,
+            message=message,
+            cc=self.cc,
+            bcc=self.bcc,
+            files=self.files,
+            df=df,
+            graph=graph,
+            max_rows=self.max_rows,
+            overflow=self.overflow,
+        )
+
+    def merge(self, recipients: TableLike, to: str = "email", df: TableLike = None, graph=None, throttle=None) -> list:
+        """
+        Create a personalized e-mail per row of `recipients`, for a mail merge. The columns of a row are the values of
+        the fields in the subject and message. The table and attachments are shared by all e-mails, so they are
+        rendered, written and read once. Send the e-mails with `NotifyMail.send_many`.
+
+        Parameters
+        ----------
+        recipients: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            a row per e-mail
+        to: str
+            column with the e-mail address of the recipient
+        df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+            table that is added to every e-mail (optional)
+        graph: Graph
+            Graph client to send the e-mails with, defaults to the shared client of the app registration in the
+            environment variables.
+        throttle: Throttle
+            throttle of the e-mails, see NotifyMail (optional)
+
+        Returns
+        -------
+        mails: list of NotifyMail
+            an e-mail per row, in the order of `recipients`
+        """
+        table = as_table(recipients)
+        columns = [str(column) for column in table.columns]
+        if to not in columns:
+            raise ValueError(f"Column {to} with the recipients not found, the columns are {columns}.")
+
+        if graph is None:
+            from notify.msgraph import get_graph
+
+            graph = get_graph()
+
+        # the table and attachments are created on an e-mail that is not sent, and shared by the merged e-mails.
+        shared = NotifyMail(
+            to="",
+            subject="",
+            message="",
+            files=self.files,
+            df=df,
+            graph=graph,
+            max_rows=self.max_rows,
+            overflow=self.overflow,
+        )
+        html_table = shared.create_html_table()
+        attachments = [
+            dataclasses.replace(attachment, content=attachment.read()) if attachment.inline else attachment
+            for attachment in shared.get_attachments()
+        ]
+
+        mails = []
+        values = [table.column_values(i) for i in range(len(columns))]
+        for row in zip(*values):
+            params = {column: "" if is_missing(value) else value for column, value in zip(columns, row)}
+            subject, message = self.render(**params)
+            mail = NotifyMail(
+                to=str(params[to]),
+                subject=subject,
+                message=message + html_table,
+                cc=self.cc,
+                bcc=self.bcc,
+                graph=graph,
+                throttle=throttle,
+            )
+            mail.attachments = attachments
+            mails.append(mail)
+
+        return mails
+
+
+def register_template(name: str, template) -> None:
+    """
+    Register a CardTemplate or MailTemplate under a name, so it is built once and can be used by name everywhere in
+    the process.
+
+    Parameters
+    ----------
+    name: str
+        name of the template
+    template: CardTemplate or MailTemplate
+        the template
+    """
+    with _templates_lock:
+        _templates[name] = template
+
+
+def get_template(name: str):
+    """
+    Get a registered template.
+
+    Parameters
+    ----------
+    name: str
+        name of the template
+
+    Returns
+    -------
+    template: CardTemplate or MailTemplate
+    """
+    with _templates_lock:
+        try:
+            return _templates[name]
+        except KeyError:
+            raise KeyError(f"No template registered with name {name!r}.") from None
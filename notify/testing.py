@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# local stand-ins for Teams webhooks, the Graph API and Azure AD, so tests and benchmarks run offline without importing
+# notify.tests, which loads the secrets of the e2e tests from Key Vault.
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local stand-in for a Teams webhook or the Graph API. Received requests are stored in `requests`, responses are
+    taken from `responses` (status, headers, body) and default to 200 with an empty body. A response can also be a
+    callable receiving the path and body of the request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []
+        self.responses = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def next_response(self, path: str, body: bytes) -> tuple:
+        with self.lock:
+            response = self.responses.pop(0) if self.responses else (200, {}, b"")
+
+        # callables run outside the lock, so slow responses are served concurrently
+        return response(path, body) if callable(response) else response
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.requests.append(
+            {"method": self.command, "path": self.path, "headers": dict(self.headers), "body": body}
+        )
+        status, headers, response_body = self.server.next_response(self.path, body)
+        if isinstance(response_body, (dict, list)):
+            response_body = json.dumps(response_body).encode()
+            headers = {"Content-Type": "application/json", **headers}
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    do_PUT = do_POST
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubCredential:
+    """
+    Credential returning a static access token, so no token is requested from Azure AD.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+
+        self.calls += 1
+        return AccessToken("stub-token", int(time.time()) + 3600)
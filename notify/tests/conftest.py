@@ -0,0 +1,26 @@
+import threading
+
+import pytest
+
+from notify.testing import StubCredential, StubServer
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_graph(stub_server, monkeypatch):
+    from notify.msgraph import Graph
+
+    monkeypatch.setenv("EMAIL_USER", "sender@example.com")
+    graph = Graph(credential=StubCredential(), base_url=f"{stub_server.url}/v1.0")
+    graph.ensure_graph_for_app_only_auth()
+    yield graph
+    graph.close()
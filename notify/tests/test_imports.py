@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HEAVY_MODULES = ["pandas", "numpy", "babel", "msgraph", "azure.identity"]
+
+
+def imported_modules(statement: str) -> list:
+    """
+    Run an import statement in a fresh interpreter and return which of the heavy modules it imported.
+    """
+    code = f"import sys, json\n{statement}\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "statement", ["import notify", "from notify import NotifyTeams", "from notify import NotifyMail, format_numbers"]
+)
+def test_lazy_imports(statement):
+    """
+    importeren van notify laadt pandas en de Graph SDK pas als ze nodig zijn
+    """
+    assert imported_modules(statement) == []
+
+
+def test_lazy_attribute():
+    import notify
+    from notify.teams import NotifyTeams
+
+    assert notify.NotifyTeams is NotifyTeams
+    assert "NotifyMail" in dir(notify)
+    with pytest.raises(AttributeError):
+        notify.does_not_exist
@@ -0,0 +1,182 @@
+import json
+
+import pytest
+
+from notify import NotifyMail, NotifyTeams, instrumentation
+from notify.throttle import Throttle
+from notify.types import RetryPolicy
+
+
+@pytest.fixture
+def events():
+    events = []
+    instrumentation.add_hook(events.append)
+    yield events
+    instrumentation.remove_hook(events.append)
+
+
+def stages(events: list) -> list:
+    return [(event.stage, event.parent) for event in events]
+
+
+def test_disabled():
+    """
+    zonder hooks en tracer kost een stage niets
+    """
+    assert instrumentation.stage("teams", "post") is instrumentation.stage("mail", "send")
+
+
+def test_teams_stages(stub_server, events):
+    """
+    build, serialize en post worden getimed binnen de verzending
+    """
+    stub_server.responses = [(429, {"Retry-After": "0"}, b""), (200, {}, b"1")]
+    teams = NotifyTeams(webhook=stub_server.url, retry=RetryPolicy(backoff=0.01))
+    result = teams.basic_message(title="Job failed", message="Error")
+    assert result.success
+
+    assert stages(events) == [("serialize", "build"), ("build", "send"), ("post", "send"), ("send", None)]
+    serialize, build, post, send = events
+    assert serialize.size == build.size == post.size == send.size == len(stub_server.requests[0]["body"])
+    assert (post.status_code, post.attempts, post.success) == (200, 2, True)
+    assert send.success
+    assert send.elapsed >= post.elapsed >= 0
+    assert all(event.kind == "teams" for event in events)
+
+
+def test_teams_failure(stub_server, events):
+    stub_server.responses = [(400, {}, b"Bad payload")]
+    teams = NotifyTeams(webhook=stub_server.url)
+    assert not teams.basic_message(title="Job failed").success
+
+    post, send = events[-2:]
+    assert (post.status_code, post.success) == (400, False)
+    assert send.success is False
+
+
+def test_teams_suppressed(stub_server, events):
+    teams = NotifyTeams(webhook=stub_server.url, throttle=Throttle())
+    message = teams.build(title="Job failed")
+    teams.send(message)
+    events.clear()
+
+    assert teams.send(message).suppressed
+    (send,) = events
+    assert (send.stage, send.success, send.suppressed) == ("send", False, True)
+
+
+def test_hook_errors(stub_server, events):
+    """
+    een falende hook stopt de verzending niet
+    """
+
+    def failing(event):
+        raise RuntimeError("hook failed")
+
+    instrumentation.add_hook(failing)
+    try:
+        assert NotifyTeams(webhook=stub_server.url).basic_message(title="Job failed").success
+    finally:
+        instrumentation.remove_hook(failing)
+    assert len(events) == 4
+
+
+def test_mail_stages(stub_server, stub_graph, events):
+    """
+    token, build en post worden getimed, de token komt van de credential van de Graph client
+    """
+    mail = NotifyMail(to="user@example.com", subject="Job failed", message="Error", graph=stub_graph)
+    assert mail.send_email()
+
+    assert stages(events) == [("build", "send"), ("token", "post"), ("post", "send"), ("send", None)]
+    assert stub_graph.client_credential.calls == 1
+    post, send = events[2:]
+    assert (post.status_code, post.success, send.success) == (202, True, True)
+
+
+def test_mail_failure(stub_server, stub_graph, events):
+    stub_server.responses = [(400, {}, {"error": {"code": "ErrorInvalidRecipients", "message": "Invalid"}})]
+    mails = [NotifyMail(to="user@example.com", subject="Job failed", message="Error", graph=stub_graph)]
+    (result,) = NotifyMail.send_many(mails)
+    assert not result.success
+
+    post, send = events[-2:]
+    assert (post.stage, post.status_code, post.success) == ("post", 400, False)
+    assert (send.stage, send.parent, send.attempts, send.success) == ("send", None, 1, False)
+
+
+def test_mail_batch_stages(stub_server, stub_graph, events):
+    """
+    iedere e-mail in een batch heeft een eigen send stage, zodat ze als verzonden notificaties tellen
+    """
+
+    def respond(path: str, body: bytes) -> tuple:
+        requests = json.loads(body)["requests"]
+        statuses = [400 if position == 1 else 202 for position in range(len(requests))]
+        return 200, {}, {"responses": [{"id": r["id"], "status": s} for r, s in zip(requests, statuses)]}
+
+    stub_server.responses = [respond]
+    mails = [
+        NotifyMail(to=f"user{i}@example.com", subject="Job failed", message="Error", graph=stub_graph) for i in range(3)
+    ]
+    results = NotifyMail.send_many(mails, batch=True)
+    assert [result.success for result in results] == [True, False, True]
+
+    assert stages(events).count(("build", "send")) == 3
+    assert stages(events).count(("batch", None)) == 1
+    sends = [event for event in events if event.stage == "send"]
+    assert [(send.parent, send.attempts) for send in sends] == [(None, 1)] * 3
+    assert sorted(send.success for send in sends) == [False, True, True]
+
+
+def test_opentelemetry(stub_server):
+    """
+    de stages worden geneste spans
+    """
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    instrumentation.enable_opentelemetry(provider)
+    try:
+        assert NotifyTeams(webhook=stub_server.url).basic_message(title="Job failed").success
+    finally:
+        instrumentation.disable_opentelemetry()
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert list(spans) == ["notify.teams.serialize", "notify.teams.build", "notify.teams.post", "notify.teams.send"]
+    send, post = spans["notify.teams.send"], spans["notify.teams.post"]
+    assert send.parent is None
+    assert post.parent.span_id == spans["notify.teams.build"].parent.span_id == send.context.span_id
+    assert post.attributes["notify.status_code"] == 200
+    assert post.attributes["notify.attempts"] == 1
+    assert send.attributes["notify.success"] is True
+    assert instrumentation.stage("teams", "send") is instrumentation.stage("teams", "post")
+
+
+def test_prometheus(stub_server):
+    prometheus_client = pytest.importorskip("prometheus_client")
+
+    registry = prometheus_client.CollectorRegistry()
+    hook = instrumentation.enable_prometheus(registry)
+    try:
+        teams = NotifyTeams(webhook=stub_server.url)
+        stub_server.responses = [(200, {}, b"1"), (400, {}, b"Bad payload")]
+        teams.basic_message(title="Job sent")
+        teams.basic_message(title="Job failed")
+    finally:
+        instrumentation.remove_hook(hook)
+
+    def value(name: str, **labels) -> float:
+        return registry.get_sample_value(name, {"kind": "teams", **labels})
+
+    assert value("notify_notifications_total", result="sent") == 1
+    assert value("notify_notifications_total", result="failed") == 1
+    assert value("notify_responses_total", status_code="400") == 1
+    assert value("notify_attempts_total") == 2
+    assert value("notify_stage_duration_seconds_count", stage="post") == 2
+    assert value("notify_payload_size_bytes_count") == 6
@@ -0,0 +1,146 @@
+import base64
+import json
+import os
+
+import pytest
+
+from notify import NotifyMail
+from notify.attachments import CHUNK_SIZE, INLINE_LIMIT, AttachmentCache, resolve_attachments
+
+
+def test_send_inline_attachment(stub_server, stub_graph, tmp_path):
+    path = tmp_path / "small.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    mail = NotifyMail(
+        to="user@example.com", subject="Test", message="Test", files={"small.csv": str(path)}, graph=stub_graph
+    )
+    assert mail.send_email()
+
+    attachment = json.loads(stub_server.requests[0]["body"])["Message"]["attachments"][0]
+    assert attachment["name"] == "small.csv"
+    assert base64.b64decode(attachment["contentBytes"]) == b"a,b\n1,2\n"
+
+
+def test_send_large_attachment(stub_server, stub_graph, tmp_path):
+    size = CHUNK_SIZE * 2 + 1000
+    assert size > INLINE_LIMIT
+    large = tmp_path / "large.bin"
+    large.write_bytes(b"x" * size)
+    small = tmp_path / "small.csv"
+    small.write_bytes(b"a,b\n1,2\n")
+    stub_server.responses = [
+        (201, {}, {"id": "draft-1"}),
+        (200, {}, {"uploadUrl": f"{stub_server.url}/upload/1"}),
+        (200, {}, b""),
+        (200, {}, b""),
+        (201, {}, b""),
+        (202, {}, b""),
+    ]
+    files = {"large.bin": str(large), "small.csv": str(small)}
+    mail = NotifyMail(to="user@example.com", subject="Test", message="Test", files=files, graph=stub_graph)
+    assert mail.send_email()
+
+    draft, session, *uploads, send = stub_server.requests
+    assert draft["path"] == "/v1.0/users/sender%40example.com/messages"
+    assert [a["name"] for a in json.loads(draft["body"])["attachments"]] == ["small.csv"]
+    assert session["path"] == "/v1.0/users/sender%40example.com/messages/draft-1/attachments/createUploadSession"
+    assert json.loads(session["body"])["AttachmentItem"]["size"] == size
+    assert [upload["headers"]["Content-Range"] for upload in uploads] == [
+        f"bytes 0-{CHUNK_SIZE - 1}/{size}",
+        f"bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}/{size}",
+        f"bytes {2 * CHUNK_SIZE}-{size - 1}/{size}",
+    ]
+    assert "Authorization" not in uploads[0]["headers"]
+    assert sum(len(upload["body"]) for upload in uploads) == size
+    assert send["path"] == "/v1.0/users/sender%40example.com/messages/draft-1/send"
+
+
+def test_attachment_cache(stub_server, stub_graph, tmp_path):
+    cache = AttachmentCache(directory=str(tmp_path), max_age=0)
+    stub_server.responses = [(200, {"ETag": '"v1"'}, b"%PDF report"), (304, {}, b"")]
+    files = {"report.pdf": f"{stub_server.url}/report.pdf"}
+    mails = [
+        NotifyMail(
+            to=f"user{i}@example.com",
+            subject="Test",
+            message="Test",
+            files=files,
+            graph=stub_graph,
+            attachment_cache=cache,
+        )
+        for i in range(2)
+    ]
+    assert mails[0].get_attachments()[0].read() == b"%PDF report"
+    assert mails[1].get_attachments()[0].path == mails[0].get_attachments()[0].path
+
+    downloads = [r for r in stub_server.requests if r["method"] == "GET"]
+    assert len(downloads) == 2
+    assert downloads[1]["headers"]["If-None-Match"] == '"v1"'
+
+
+def test_attachment_cache_concurrent(stub_server, tmp_path):
+    cache = AttachmentCache(directory=str(tmp_path))
+    stub_server.responses = [(200, {}, f"file {i}".encode()) for i in range(3)]
+    files = {f"file{i}.txt": f"{stub_server.url}/file{i}.txt" for i in range(3)}
+    files["copy.txt"] = files["file0.txt"]
+    attachments = resolve_attachments(files, cache=cache)
+
+    assert len(stub_server.requests) == 3
+    assert attachments[0].path == attachments[3].path
+    assert {attachment.read() for attachment in attachments} == {b"file 0", b"file 1", b"file 2"}
+
+
+def test_attachment_cache_evict(stub_server, tmp_path):
+    cache = AttachmentCache(directory=str(tmp_path), max_size=10, min_unused=0)
+    stub_server.responses = [(200, {}, b"x" * 8), (200, {}, b"y" * 8)]
+    first = cache.get(f"{stub_server.url}/first.txt")
+    second = cache.get(f"{stub_server.url}/second.txt")
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert len(cache._locks) == 0
+
+
+def test_attachment_cache_keeps_used_files(stub_server, tmp_path):
+    """
+    een bestand dat net is opgehaald door een andere mail wordt niet verwijderd, een verwijderd bestand wordt opnieuw
+    gedownload
+    """
+    cache = AttachmentCache(directory=str(tmp_path), max_size=10)
+    stub_server.responses = [(200, {}, b"x" * 8), (200, {}, b"y" * 8), (200, {}, b"x" * 8)]
+    first = cache.get(f"{stub_server.url}/first.txt")
+    second = cache.get(f"{stub_server.url}/second.txt")
+    assert os.path.exists(first) and os.path.exists(second)
+
+    entry = cache._read_entry(f"{stub_server.url}/first.txt")
+    os.remove(first)
+    cache._read_entry = lambda url: entry
+    assert cache.get(f"{stub_server.url}/first.txt") == first
+    assert len(stub_server.requests) == 3
+    with open(first, "rb") as f:
+        assert f.read() == b"x" * 8
+
+
+def test_attachment_cache_directory(tmp_path, monkeypatch):
+    """
+    de cache staat standaard in de cache map van de gebruiker en een map van een andere gebruiker wordt geweigerd
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    cache = AttachmentCache()
+    assert cache.directory == str(tmp_path / "notify" / "attachments")
+    assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+
+    if hasattr(os, "getuid"):
+        monkeypatch.setattr(os, "getuid", lambda: os.stat(cache.directory).st_uid + 1)
+        with pytest.raises(PermissionError):
+            AttachmentCache()
+
+
+def test_read_file_content(tmp_path):
+    """
+    de oude read_file_content werkt nog, met een DeprecationWarning
+    """
+    path = tmp_path / "small.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    with pytest.warns(DeprecationWarning):
+        assert base64.b64decode(NotifyMail.read_file_content(str(path))) == b"a,b\n1,2\n"
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+from notify import NotifyMail
+from notify.attachments import INLINE_LIMIT
+from notify.mail import MAILBOX_CONCURRENCY
+from notify.exceptions import GraphBatchError
+from notify.types import MailResult
+
+
+def create_mails(graph, n: int) -> list:
+    return [NotifyMail(to=f"user{i}@example.com", subject=f"Test {i}", message="Test", graph=graph) for i in range(n)]
+
+
+def test_send_many(stub_server, stub_graph):
+    stub_server.responses = [(202, {}, b"")] * 25
+    results = NotifyMail.send_many(create_mails(stub_graph, 25), max_concurrency=8)
+
+    assert [result.index for result in results] == list(range(25))
+    assert all(result.success and result.attempts == 1 for result in results)
+    assert len(stub_server.requests) == 25
+    assert all(r["path"] == "/v1.0/users/sender%40example.com/sendMail" for r in stub_server.requests)
+
+
+def test_send_many_retry_after(stub_server, stub_graph):
+    throttled = (429, {"Retry-After": "0"}, {"error": {"code": "ApplicationThrottled", "message": "Throttled"}})
+    stub_server.responses = [throttled] * 2 + [(202, {}, b"")]
+    results = NotifyMail.send_many(create_mails(stub_graph, 1), max_retries=2)
+
+    assert results[0].success
+    assert results[0].attempts == 3
+
+
+def test_send_many_max_retries(stub_server, stub_graph):
+    throttled = (429, {"Retry-After": "0"}, {"error": {"code": "ApplicationThrottled", "message": "Throttled"}})
+    stub_server.responses = [throttled] * 3
+    results = NotifyMail.send_many(create_mails(stub_graph, 1), max_retries=1)
+
+    assert not results[0].success
+    assert results[0].attempts == 2
+
+
+def test_send_many_continues_after_error(stub_server, stub_graph):
+    error = (403, {}, {"error": {"code": "ErrorAccessDenied", "message": "Access is denied."}})
+    stub_server.responses = [error]
+    results = NotifyMail.send_many(create_mails(stub_graph, 3), max_concurrency=1)
+
+    assert [result.success for result in results] == [False, True, True]
+    assert results[0].attempts == 1
+    assert results[0].error is not None
+
+
+def test_send_email_stub(stub_server, stub_graph):
+    assert create_mails(stub_graph, 1)[0].send_email()
+
+
+def batch_response(statuses: dict = None):
+    """
+    Create a `$batch` stub that answers every request with 202, or with the status given for its position.
+    """
+    statuses = statuses or {}
+
+    def respond(path: str, body: bytes) -> tuple:
+        assert path == "/v1.0/$batch"
+        requests = json.loads(body)["requests"]
+        responses = []
+        for position, request in enumerate(requests):
+            status = statuses.get(position, 202)
+            headers = {"Retry-After": "0"} if status == 429 else {}
+            body = {"error": {"code": "Error", "message": "Batch item failed"}} if status >= 400 else None
+            responses.append({"id": request["id"], "status": status, "headers": headers, "body": body})
+        return 200, {}, {"responses": list(reversed(responses))}
+
+    return respond
+
+
+def test_send_many_batch(stub_server, stub_graph):
+    stub_server.responses = [batch_response(), batch_response(), batch_response()]
+    results = NotifyMail.send_many(create_mails(stub_graph, 45), batch=True)
+
+    assert len(stub_server.requests) == 3
+    sizes = sorted(len(json.loads(r["body"])["requests"]) for r in stub_server.requests)
+    assert sizes == [5, 20, 20]
+    request = json.loads(stub_server.requests[0]["body"])["requests"][0]
+    assert request["url"] == "/users/sender%40example.com/sendMail"
+    assert request["body"]["Message"]["subject"].startswith("Test")
+    assert stub_server.requests[0]["headers"]["Authorization"] == "Bearer stub-token"
+    assert all(result.success for result in results)
+
+
+def test_send_many_batch_item_status(stub_server, stub_graph):
+    stub_server.responses = [batch_response({1: 429, 2: 400}), batch_response()]
+    results = NotifyMail.send_many(create_mails(stub_graph, 3), batch=True)
+
+    assert [result.success for result in results] == [True, True, False]
+    assert [result.attempts for result in results] == [1, 2, 1]
+    assert isinstance(results[2].error, GraphBatchError)
+    assert results[2].error.status_code == 400
+    assert len(json.loads(stub_server.requests[1]["body"])["requests"]) == 1
+
+
+def test_send_many_batch_per_mailbox(stub_server, stub_graph):
+    """
+    een batch bevat e-mails van één mailbox, in ketens van MAILBOX_CONCURRENCY verzoeken; verzoeken met status 424
+    worden opnieuw verstuurd zonder extra poging
+    """
+    failing, accepted = batch_response({0: 429, 4: 424}), batch_response()
+
+    def respond(path: str, body: bytes) -> tuple:
+        # the first batch of the first mailbox fails partly, the batches run concurrently
+        return (failing if len(json.loads(body)["requests"]) == 6 else accepted)(path, body)
+
+    stub_server.responses = [respond] * 3
+    mails = create_mails(stub_graph, 7)
+    mails[6].sender = "other@example.com"
+    results = NotifyMail.send_many(mails, batch=True)
+
+    assert all(result.success for result in results)
+    assert [result.attempts for result in results] == [2, 1, 1, 1, 1, 1, 1]
+    batches = [json.loads(r["body"])["requests"] for r in stub_server.requests]
+    assert sorted(len(requests) for requests in batches) == [1, 2, 6]
+    (first,) = [requests for requests in batches if len(requests) == 6]
+    assert [request.get("dependsOn") for request in first] == [None] * MAILBOX_CONCURRENCY + [["0"], ["1"]]
+    assert all(len({request["url"] for request in requests}) == 1 for requests in batches)
+
+
+def test_send_many_batch_not_held_up_by_uploads(stub_server, stub_graph, tmp_path, monkeypatch):
+    """
+    de batch wordt verstuurd zonder te wachten op een e-mail met een upload
+    """
+    large = tmp_path / "large.bin"
+    large.write_bytes(b"x" * (INLINE_LIMIT + 1))
+    mails = create_mails(stub_graph, 4)
+    mails[0].files = {"large.bin": str(large)}
+
+    async def slow_upload(self, index, request_body, mailbox, max_retries):
+        # the upload only succeeds when the batch was sent while it was running
+        for _ in range(100):
+            if any(r["path"] == "/v1.0/$batch" for r in stub_server.requests):
+                return MailResult(index=index, to=self.to, success=True, attempts=1)
+            await asyncio.sleep(0.05)
+        return MailResult(index=index, to=self.to, success=False, attempts=1)
+
+    monkeypatch.setattr(NotifyMail, "_post_with_retry", slow_upload)
+    stub_server.responses = [batch_response()]
+    results = NotifyMail.send_many(mails, batch=True)
+
+    assert all(result.success for result in results)
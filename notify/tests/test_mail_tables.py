@@ -0,0 +1,85 @@
+import base64
+import gzip
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from notify import NotifyMail
+
+
+def sent_message(stub_server) -> dict:
+    return json.loads(stub_server.requests[0]["body"])["Message"]
+
+
+def test_send_table_with_overflow(stub_server, stub_graph):
+    """
+    grote tabel: eerste rijen in de mail, samenvatting en alle rijen als gzip csv bijlage
+    """
+    df = pd.DataFrame({"name": [f"row {i}" for i in range(100)], "amount": range(100)})
+    mail = NotifyMail(
+        to="user@example.com", subject="Test", message="Test", df=df, max_rows=10, overflow="csv", graph=stub_graph
+    )
+    assert mail.send_email()
+
+    message = sent_message(stub_server)
+    body = message["body"]["content"]
+    assert "<td>row 9</td>" in body and "<td>row 10</td>" not in body
+    assert "Showing the first 10 of 100 rows. All rows are attached as table.csv.gz." in body
+    assert "<td>amount</td><td>4950</td><td>49.5</td><td>0</td><td>99</td>" in body
+
+    (attachment,) = message["attachments"]
+    assert attachment["name"] == "table.csv.gz"
+    content = gzip.decompress(base64.b64decode(attachment["contentBytes"]))
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(content)), df)
+
+
+def test_send_table_parquet_overflow(stub_server, stub_graph):
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"name": [f"row {i}" for i in range(50)], "amount": range(50)})
+    mail = NotifyMail(
+        to="user@example.com", subject="Test", message="Test", df=df, max_rows=5, overflow="parquet", graph=stub_graph
+    )
+    assert mail.send_email()
+
+    (attachment,) = sent_message(stub_server)["attachments"]
+    assert attachment["name"] == "table.parquet"
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(base64.b64decode(attachment["contentBytes"]))), df)
+
+
+def test_send_table_without_overflow(stub_server, stub_graph):
+    """
+    zonder overflow worden standaard alleen de eerste rijen verstuurd, zonder bijlage
+    """
+    df = pd.DataFrame({"name": [f"row {i}" for i in range(40)]})
+    mail = NotifyMail(to="user@example.com", subject="Test", message="Test", df=df, graph=stub_graph)
+    assert mail.send_email()
+
+    message = sent_message(stub_server)
+    assert message["body"]["content"].count("<tr>") == 30
+    assert not message.get("attachments")
+
+
+def test_send_small_table(stub_server, stub_graph):
+    df = pd.DataFrame({"name": ["a", "b"]})
+    mail = NotifyMail(to="user@example.com", subject="Test", message="Test", df=df, graph=stub_graph)
+    assert mail.send_email()
+
+    message = sent_message(stub_server)
+    assert "Showing the first" not in message["body"]["content"]
+    assert not message.get("attachments")
+
+
+def test_send_arrow_table_with_overflow(stub_server, stub_graph):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"name": [f"row {i}" for i in range(20)], "amount": list(range(20))})
+    mail = NotifyMail(
+        to="user@example.com", subject="Test", message="Test", df=table, max_rows=5, overflow="csv", graph=stub_graph
+    )
+    assert mail.send_email()
+
+    message = sent_message(stub_server)
+    assert "<td>amount</td><td>190</td><td>9.5</td><td>0</td><td>19</td>" in message["body"]["content"]
+    content = gzip.decompress(base64.b64decode(message["attachments"][0]["contentBytes"]))
+    assert pd.read_csv(io.BytesIO(content))["amount"].tolist() == list(range(20))
@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+from notify import msgraph
+from notify.msgraph import close_graphs, get_graph
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    close_graphs()
+    yield
+    close_graphs()
+
+
+def test_get_graph_is_shared():
+    graph = get_graph(tenant_id="tenant", client_id="client", client_secret="secret")
+    assert get_graph(tenant_id="tenant", client_id="client", client_secret="secret") is graph
+    assert get_graph(tenant_id="tenant", client_id="other", client_secret="secret") is not graph
+
+
+def test_get_graph_new_secret(monkeypatch):
+    """
+    na een nieuw secret blijft de oude client open voor e-mails die hem nog gebruiken, en wordt later gesloten
+    """
+    monkeypatch.setattr(msgraph, "RETIRE_DELAY", 0.2)
+    graph = get_graph(tenant_id="tenant", client_id="client", client_secret="secret")
+    rotated = get_graph(tenant_id="tenant", client_id="client", client_secret="rotated")
+    assert rotated is not graph
+    assert get_graph(tenant_id="tenant", client_id="client", client_secret="rotated") is rotated
+    assert hasattr(graph, "app_client")
+
+    for _ in range(100):
+        if not hasattr(graph, "app_client"):
+            break
+        time.sleep(0.05)
+    assert not hasattr(graph, "app_client")
+    assert hasattr(rotated, "app_client")
+
+
+def test_close_graphs_retired():
+    graph = get_graph(tenant_id="tenant", client_id="client", client_secret="secret")
+    get_graph(tenant_id="tenant", client_id="client", client_secret="rotated")
+    close_graphs()
+    assert not hasattr(graph, "app_client")
+
+
+def test_close_graphs():
+    graph = get_graph(tenant_id="tenant", client_id="client", client_secret="secret")
+    close_graphs()
+    assert not hasattr(graph, "app_client")
+    assert get_graph(tenant_id="tenant", client_id="client", client_secret="secret") is not graph
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not available on this platform")
+def test_get_graph_after_fork():
+    graph = get_graph(tenant_id="tenant", client_id="client", client_secret="secret")
+    pid = os.fork()
+    if pid == 0:
+        child_graph = get_graph(tenant_id="tenant", client_id="client", client_secret="secret")
+        os._exit(0 if child_graph is not graph else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,137 @@
+import json
+import re
+import sqlite3
+
+import httpx
+import pandas as pd
+
+import notify.msgraph
+from notify.queue import NotificationQueue, deserialize_payload, is_retryable, serialize_payload
+from notify.tables import as_table
+from notify.tests import import_sample_dfs
+
+
+def test_queue_teams(stub_server, tmp_path):
+    df = import_sample_dfs().get("Transactions")
+    with NotificationQueue(path=str(tmp_path / "queue.db"), poll_interval=0.1) as queue:
+        for i in range(3):
+            queue.enqueue_teams(webhook=stub_server.url, title=f"Pytest {i}", df=df)
+        assert queue.join(timeout=10)
+
+    assert len(stub_server.requests) == 3
+    table = json.loads(stub_server.requests[0]["body"])["attachments"][0]["content"]["body"][1]
+    assert len(table["rows"]) == df.shape[0] + 1
+
+
+def test_queue_retry(stub_server, tmp_path):
+    stub_server.responses = [(503, {}, b""), (429, {}, b"")]
+    with NotificationQueue(path=str(tmp_path / "queue.db"), backoff=0.01, poll_interval=0.01) as queue:
+        queue.enqueue_teams(webhook=stub_server.url, title="Pytest")
+        assert queue.join(timeout=10)
+        assert not queue.failed()
+
+    assert len(stub_server.requests) == 3
+
+
+def test_queue_failed(stub_server, tmp_path):
+    stub_server.responses = [(503, {}, b"")] * 2
+    with NotificationQueue(path=str(tmp_path / "queue.db"), max_retries=1, backoff=0.01, poll_interval=0.01) as queue:
+        id_ = queue.enqueue_teams(webhook=stub_server.url, title="Pytest")
+        assert queue.join(timeout=10)
+        failed = queue.failed()
+
+    assert [(f["id"], f["attempts"]) for f in failed] == [(id_, 2)]
+    assert failed[0]["payload"]["title"] == "Pytest"
+
+
+def test_queue_not_retryable(stub_server, stub_graph, tmp_path, monkeypatch):
+    """
+    een 400 of een ongeldige ontvanger wordt niet opnieuw geprobeerd
+    """
+    stub_server.responses = [
+        (400, {}, b"Bad payload"),
+        (400, {}, {"error": {"code": "ErrorInvalidRecipients", "message": "Invalid recipient"}}),
+    ]
+    for variable in ["MAIL_TENANT_ID", "MAIL_CLIENT_ID", "MAIL_CLIENT_SECRET"]:
+        monkeypatch.setenv(variable, "test")
+    monkeypatch.setattr(notify.msgraph, "get_graph", lambda *args, **kwargs: stub_graph)
+    with NotificationQueue(path=str(tmp_path / "queue.db"), backoff=0.01, poll_interval=0.01) as queue:
+        queue.enqueue_teams(webhook=stub_server.url, title="Pytest")
+        assert queue.join(timeout=10)
+        queue.enqueue_mail(to="invalid", subject="Pytest", message="Test")
+        assert queue.join(timeout=10)
+        failed = queue.failed()
+
+    assert [f["attempts"] for f in failed] == [1, 1]
+    assert len(stub_server.requests) == 2
+    assert not is_retryable(ValueError("invalid payload"))
+    assert is_retryable(httpx.ConnectError("refused"))
+
+
+def test_queue_database_error(stub_server, tmp_path, monkeypatch, caplog):
+    """
+    een databasefout stopt de worker niet, hij start opnieuw met een nieuwe verbinding
+    """
+    errors = [sqlite3.OperationalError("database is locked")]
+    claim = NotificationQueue._claim
+
+    def failing_claim(self, connection):
+        if errors:
+            raise errors.pop()
+        return claim(self, connection)
+
+    monkeypatch.setattr(NotificationQueue, "_claim", failing_claim)
+    with NotificationQueue(path=str(tmp_path / "queue.db"), workers=1, poll_interval=0.01) as queue:
+        queue.enqueue_teams(webhook=stub_server.url, title="Pytest")
+        assert queue.join(timeout=10)
+        assert queue._threads[0].is_alive()
+
+    assert len(stub_server.requests) == 1
+    assert "database is locked" in caplog.text
+
+
+def test_queue_split_message(stub_server, tmp_path):
+    """
+    een opgesplitst bericht wordt afgeleverd, na een fout worden alleen de ontbrekende delen opnieuw verstuurd
+    """
+    df = import_sample_dfs(transactions=600).get("Transactions")
+    stub_server.responses = [(200, {}, b"1")] * 2 + [(503, {}, b"")]
+    with NotificationQueue(path=str(tmp_path / "queue.db"), backoff=0.01, poll_interval=0.01) as queue:
+        queue.enqueue_teams(webhook=stub_server.url, title="Pytest", df=df, split=True)
+        assert queue.join(timeout=10)
+        assert not queue.failed()
+
+    labels = [re.search(r"Part (\d+)/(\d+)", r["body"].decode()).groups() for r in stub_server.requests]
+    parts = int(labels[0][1])
+    assert parts > 3
+    assert [int(part) for part, _ in labels] == [1, 2, 3] + list(range(3, parts + 1))
+
+
+def test_payload_round_trip():
+    """
+    een dataframe in de wachtrij houdt dezelfde kolomtypes
+    """
+    df = pd.DataFrame(
+        {
+            "code": ["0012", "0450"],
+            "date": pd.to_datetime(["2024-01-01", None]),
+            "amount": pd.array([1, None], dtype="Int64"),
+            "price": [1.5, None],
+        }
+    )
+    payload = json.loads(json.dumps(serialize_payload({"df": df}), default=str))
+    restored = deserialize_payload(payload)["df"]
+
+    pd.testing.assert_frame_equal(restored, df)
+    assert as_table(restored).column_texts(0) == ["0012", "0450"]
+
+
+def test_queue_persistent(stub_server, tmp_path):
+    path = str(tmp_path / "queue.db")
+    NotificationQueue(path=path).enqueue_teams(webhook=stub_server.url, title="Pytest")
+    assert not stub_server.requests
+
+    with NotificationQueue(path=path, poll_interval=0.1) as queue:
+        assert queue.join(timeout=10)
+
+    assert len(stub_server.requests) == 1
@@ -0,0 +1,119 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+from notify import NotifyTeams
+from notify.tables import RowTable, Table, as_table, is_table
+from notify.utils import dataframe_to_html
+
+ROWS = [{"name": "a", "amount": 1}, {"name": "b", "amount": None}, {"name": "<c>", "amount": 3}]
+
+
+def tables() -> dict:
+    pa = pytest.importorskip("pyarrow")
+    return {
+        "pandas": pd.DataFrame({"name": ["a", "b", "<c>"], "amount": pd.array([1, None, 3], dtype="Int64")}),
+        "pyarrow": pa.table({"name": ["a", "b", "<c>"], "amount": [1, None, 3]}),
+        "dicts": ROWS,
+        "tuples": RowTable.from_rows([("a", 1), ("b", None), ("<c>", 3)], columns=["name", "amount"]),
+    }
+
+
+@pytest.mark.parametrize("kind", ["pandas", "pyarrow", "dicts", "tuples"])
+def test_table_sources(kind):
+    """
+    pandas, pyarrow en rijen geven dezelfde tabel, zonder omzetten naar pandas
+    """
+    table = as_table(tables()[kind])
+    assert table.columns == ["name", "amount"]
+    assert table.shape == (3, 2)
+    assert table.column_texts(0) == ["a", "b", "<c>"]
+    assert table.column_texts(1) == ["1", "", "3"]
+    assert table.head(2).num_rows == 2
+    assert table.select(1).columns == ["name"]
+    assert table.summary().column_values(0) == ["amount"]
+    assert table.summary().column_values(1) == [4]
+    assert table.summary().column_values(2) == [2.0]
+
+
+@pytest.mark.parametrize("kind", ["pandas", "pyarrow", "dicts"])
+def test_table_html(kind):
+    html = dataframe_to_html(tables()[kind])
+    assert "<tr><td>&lt;c&gt;</td><td>3</td></tr>" in html
+    assert "<tr><td>b</td><td></td></tr>" in html
+
+
+@pytest.mark.parametrize("kind", ["pandas", "pyarrow", "dicts"])
+def test_table_write(kind, tmp_path):
+    table = as_table(tables()[kind])
+    table.write(str(tmp_path / "table.csv.gz"), file_format="csv", chunk_size=2)
+    with gzip.open(tmp_path / "table.csv.gz", "rt") as f:
+        df = pd.read_csv(f)
+    assert df["name"].tolist() == ["a", "b", "<c>"]
+    assert df["amount"].isna().tolist() == [False, True, False]
+
+    table.write(str(tmp_path / "table.parquet"), file_format="parquet", chunk_size=2)
+    assert pd.read_parquet(tmp_path / "table.parquet")["name"].tolist() == ["a", "b", "<c>"]
+
+
+def test_table_polars():
+    pl = pytest.importorskip("polars")
+    table = as_table(pl.DataFrame({"name": ["a", "b"], "amount": [1, 2]}))
+    assert table.shape == (2, 2)
+    assert table.column_texts(1) == ["1", "2"]
+
+
+def test_is_table():
+    assert is_table(pd.DataFrame()) and is_table(RowTable([], []))
+    assert not is_table(ROWS) and not is_table({"a": 1})
+    assert not is_table(pd.Series([1, 2])) and not is_table(pd.Index([1, 2]))
+    with pytest.raises(TypeError):
+        as_table(pd.Series([1, 2]))
+    with pytest.raises(TypeError):
+        Table()
+
+
+def test_summary_duplicate_columns():
+    """
+    de samenvatting werkt ook met dubbele kolomnamen
+    """
+    df = pd.DataFrame([[1, 2, "a"], [3, 4, "b"]], columns=["amount", "amount", "name"])
+    summary = as_table(df).summary()
+    assert summary.column_values(0) == ["amount", "amount"]
+    assert summary.column_values(1) == [4, 6]
+
+
+def test_summary_missing_column():
+    """
+    kolommen zonder waarden worden overgeslagen in de samenvatting
+    """
+    df = pd.DataFrame({"amount": [1, 3], "empty": pd.array([pd.NA, pd.NA], dtype="Int64")})
+    summary = as_table(df).summary()
+    assert summary.column_values(0) == ["amount"]
+    assert summary.column_values(1) == [4]
+
+
+def test_from_rows_ragged():
+    """
+    kortere rijen worden aangevuld met None, langere rijen dan kolommen geven een fout
+    """
+    table = as_table([[1, 2], [3]])
+    assert table.shape == (2, 2)
+    assert table.column_values(1) == [2, None]
+    assert table.column_texts(1) == ["2", ""]
+    assert RowTable.from_rows([[1]], columns=["a", "b"]).column_values(1) == [None]
+    with pytest.raises(ValueError):
+        RowTable.from_rows([[1, 2, 3]], columns=["a", "b"])
+
+
+def test_teams_rows(stub_server):
+    teams = NotifyTeams(webhook=stub_server.url)
+    table = teams.create_adaptive_card_dataframe(ROWS)
+    assert [row["cells"][0]["items"][0]["text"] for row in table["rows"]] == ["name", "a", "b", "<c>"]
+
+    result = teams.basic_message(title="Pytest", df=ROWS, dfs={"rows": ROWS, "shape": (10, 2)})
+    assert result.success
+    body = stub_server.requests[0]["body"].decode()
+    assert '"text":"&lt;c&gt;"' not in body and '"text":"<c>"' in body
+    assert '"text":"10"' in body
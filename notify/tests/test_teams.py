@@ -1,9 +1,18 @@
+import asyncio
+import gzip
+import json
 import os
+import time
 
+import pandas as pd
 import pytest
 
 from notify import NotifyTeams
+from notify import teams as teams_module
+from notify.teams import serialize
 from notify.tests import import_sample_dfs
+from notify.types import RetryPolicy
+from notify.webhook import get_client
 
 
 def test_teams_basic_message():
@@ -85,5 +94,261 @@ def test_teams_size_basic_message():
         teams.basic_message(title="Pytest", message="This is message is too large" * 9999)
 
 
+def test_teams_basic_message_async(stub_server):
+    """
+    versturen van meerdere berichten tegelijk vanuit een draaiende event loop
+    """
+
+    async def send_all():
+        messages = [NotifyTeams(webhook=stub_server.url).basic_message_async(title=f"Pytest {i}") for i in range(5)]
+        return await asyncio.gather(*messages)
+
+    results = asyncio.run(send_all())
+    assert [result.status_code for result in results] == [200] * 5
+    titles = {
+        json.loads(r["body"])["attachments"][0]["content"]["body"][0]["columns"][1]["items"][0]["text"]
+        for r in stub_server.requests
+    }
+    assert titles == {f"Pytest {i}" for i in range(5)}
+
+
+def test_teams_retry(stub_server):
+    """
+    opnieuw versturen na throttling en een tijdelijke fout
+    """
+    stub_server.responses = [(429, {"Retry-After": "0"}, b""), (502, {}, b"")]
+    teams = NotifyTeams(webhook=stub_server.url, retry=RetryPolicy(backoff=0.01))
+    result = teams.basic_message(title="Pytest")
+
+    assert result.success
+    assert result.attempts == 3
+    assert len(stub_server.requests) == 3
+
+
+def test_teams_no_retry(stub_server):
+    """
+    niet opnieuw versturen bij een fout in het bericht
+    """
+    stub_server.responses = [(400, {}, b"Bad payload")]
+    result = NotifyTeams(webhook=stub_server.url).basic_message(title="Pytest")
+
+    assert not result.success
+    assert result.status_code == 400
+    assert result.attempts == 1
+    assert result.error is not None
+
+
+def test_teams_pooled_client(stub_server):
+    """
+    hergebruik van de verbinding per webhook host
+    """
+    assert get_client(f"{stub_server.url}/webhook/1") is get_client(f"{stub_server.url}/webhook/2")
+    assert get_client(f"{stub_server.url}/webhook/1") is not get_client("https://example.com/webhook/1")
+
+
+def test_create_adaptive_card_dataframe():
+    """
+    tabel met tekst in elke cel, ook voor datums en ontbrekende waarden
+    """
+    df = pd.DataFrame(
+        {"amount": [1, 2, None], "date": pd.to_datetime(["2024-01-01", None, "2024-01-03"]), "name": ["a", "b", "c"]}
+    )
+    table = NotifyTeams.create_adaptive_card_dataframe(df)
+    texts = [[cell["items"][0]["text"] for cell in row["cells"]] for row in table["rows"]]
+
+    assert texts == [
+        ["amount", "date", "name"],
+        ["1.0", "2024-01-01", "a"],
+        ["2.0", "", "b"],
+        ["", "2024-01-03", "c"],
+    ]
+    assert len(table["columns"]) == 3
+
+
+def test_adaptive_card_dataframe_markdown():
+    """
+    markdown in de cellen wordt getoond zoals het is
+    """
+    df = pd.DataFrame({"total_amount": ["*bold*", "- 1", "[link](https://x.nl)", "-1.5"]})
+    table = NotifyTeams.create_adaptive_card_dataframe(df)
+    texts = [row["cells"][0]["items"][0]["text"] for row in table["rows"]]
+    assert texts == ["total\\_amount", "\\*bold\\*", "\\- 1", "\\[link\\]\\(https://x.nl\\)", "-1.5"]
+
+
+def test_teams_split_message(stub_server):
+    """
+    een te groot bericht opsplitsen in meerdere berichten
+    """
+    df = import_sample_dfs(transactions=600).get("Transactions")
+    teams = NotifyTeams(webhook=stub_server.url)
+    results = teams.basic_message(
+        title="Pytest", warning_message="Large report", df=df, buttons={"b": "https://x.nl"}, split=True
+    )
+
+    assert len(results) > 1
+    assert all(result.success for result in results)
+    assert all(len(r["body"]) <= 28 * 1024 for r in stub_server.requests)
+    rows = []
+    for i, request in enumerate(stub_server.requests, start=1):
+        body = json.loads(request["body"])["attachments"][0]["content"]["body"]
+        assert body[0]["type"] == "ColumnSet"
+        assert body[2]["text"] == f"Part {i}/{len(results)}"
+        assert body[3]["rows"][0]["cells"][0]["items"][0]["text"] == "amount"
+        rows.extend(row["cells"][0]["items"][0]["text"] for row in body[3]["rows"][1:])
+    assert rows == df["amount"].astype(str).tolist()
+
+
+def test_teams_split_extra_header():
+    """
+    extra elementen voor de header worden herhaald, bij opsplitsen worden alle kolommen getoond
+    """
+    df = pd.DataFrame({f"column {i}": range(1000) for i in range(12)})
+    extra = [{"index": 0, "item": {"type": "TextBlock", "text": "Extra"}}]
+    message = NotifyTeams(webhook=None).build(
+        title="Pytest", warning_message="Large report", df=df, extra=extra, split=True
+    )
+
+    assert len(message.payloads) > 1
+    for i, payload in enumerate(message.payloads, start=1):
+        body = json.loads(payload)["attachments"][0]["content"]["body"]
+        assert [block.get("text") for block in body[:4:3]] == ["Extra", f"Part {i}/{len(message.payloads)}"]
+        assert body[1]["type"] == body[2]["type"] == "ColumnSet"
+        assert len(body[4]["columns"]) == 12
+
+
+def test_teams_split_small_message(stub_server):
+    """
+    een klein bericht wordt niet opgesplitst
+    """
+    results = NotifyTeams(webhook=stub_server.url).basic_message(title="Pytest", split=True)
+    assert len(results) == 1
+    assert "Part" not in stub_server.requests[0]["body"].decode()
+
+
+def test_serialize_same_as_json():
+    """
+    de snelle encoder geeft dezelfde JSON als de json module
+    """
+    df = import_sample_dfs().get("Transactions")
+    teams = NotifyTeams(webhook=None)
+    teams.create_message_header(title="Pytest 🚀", subtitle='"quoted" \\ \n')
+    teams.add_full_dataframe(df)
+    teams.msg["attachments"][0]["content"]["body"] = teams.body
+    teams.body.append({"type": "TextBlock", "text": pd.Timestamp("2024-01-01"), 1: 2**70})
+
+    expected = json.dumps(teams.msg, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    assert serialize(teams.msg) == expected
+
+
+def test_serialize_floats():
+    """
+    orjson schrijft NaN en oneindig als null en exponenten korter, de waarden zijn verder gelijk
+    """
+    obj = {"type": "FactSet", "values": [1e20, 1e-7, 0.1, 1.0, float("nan"), float("inf"), -float("inf")]}
+    expected = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    payload = serialize(obj)
+    if teams_module.orjson is None:
+        assert payload == expected
+    else:
+        assert payload == b'{"type":"FactSet","values":[1e20,1e-7,0.1,1.0,null,null,null]}'
+        assert json.loads(payload)["values"][:4] == json.loads(expected)["values"][:4]
+
+
+def test_teams_compress(stub_server):
+    """
+    gzip van grote berichten, kleine berichten worden niet gecomprimeerd
+    """
+    df = import_sample_dfs().get("Transactions")
+    teams = NotifyTeams(webhook=stub_server.url, compress=True)
+    assert teams.basic_message(title="Pytest", df=df).success
+    assert NotifyTeams(webhook=stub_server.url, compress=True).basic_message(title="Pytest").success
+
+    (payload,) = teams.build(title="Pytest", df=df).payloads
+    large, small = stub_server.requests
+    assert large["headers"]["Content-Encoding"] == "gzip"
+    assert gzip.decompress(large["body"]) == payload
+    assert len(large["body"]) < len(payload)
+    assert "Content-Encoding" not in small["headers"]
+    assert json.loads(small["body"])["type"] == "message"
+
+
+def test_teams_reuse_instance(stub_server):
+    """
+    een instantie hergebruiken voor meerdere berichten, ook tegelijk, zonder dat blokken zich opstapelen
+    """
+    teams = NotifyTeams(webhook=stub_server.url)
+    assert teams.basic_message(title="Pytest 1", message="First").success
+    assert teams.basic_message(title="Pytest 2").success
+    assert teams.body == [] and "body" not in teams.msg["attachments"][0]["content"]
+
+    async def send_all():
+        return await asyncio.gather(*(teams.basic_message_async(title=f"Pytest {i}") for i in range(3, 8)))
+
+    assert all(result.success for result in asyncio.run(send_all()))
+    bodies = [json.loads(r["body"])["attachments"][0]["content"]["body"] for r in stub_server.requests]
+    assert [len(body) for body in bodies] == [2, 1, 1, 1, 1, 1, 1]
+    assert {body[0]["columns"][1]["items"][0]["text"] for body in bodies[2:]} == {f"Pytest {i}" for i in range(3, 8)}
+
+
+def test_teams_build_and_send(stub_server):
+    """
+    een bericht bouwen zonder te versturen, en daarna versturen naar meerdere webhooks
+    """
+    message = NotifyTeams(webhook=None).build(title="Pytest", buttons={"b": "https://x.nl"})
+    assert message.size == len(message.payloads[0])
+    assert json.loads(message.payloads[0])["attachments"][0]["content"]["actions"][0]["url"] == "https://x.nl"
+
+    for i in range(2):
+        assert NotifyTeams(webhook=f"{stub_server.url}/webhook/{i}").send(message).success
+    assert [r["body"] for r in stub_server.requests] == [message.payloads[0]] * 2
+
+    with pytest.raises(ValueError):
+        NotifyTeams(webhook=None).build(title="Pytest", message="This is message is too large" * 9999)
+    split = NotifyTeams(webhook=None).build(
+        title="Pytest", message="This is message is too large<br>" * 2000, split=True
+    )
+    assert split.split and len(split.payloads) > 1
+
+
+def test_teams_send_many(stub_server):
+    """
+    een bericht tegelijk naar meerdere kanalen, een falend of traag kanaal houdt de rest niet op
+    """
+
+    def respond(path: str, body: bytes) -> tuple:
+        if path.startswith("/slow"):
+            time.sleep(0.3)
+        return (400, {}, b"Bad payload") if path == "/failing" else (200, {}, b"1")
+
+    webhooks = [f"{stub_server.url}/slow/{i}" for i in range(4)] + [f"{stub_server.url}/failing", stub_server.url]
+    stub_server.responses = [respond] * len(webhooks)
+    teams = NotifyTeams(webhook=None)
+    message = teams.build(title="Incident", message="Database unavailable")
+
+    start = time.perf_counter()
+    results = teams.send_many(message, webhooks)
+    assert time.perf_counter() - start < 1.0
+    assert [result.webhook for result in results] == webhooks
+    assert [result.success for result in results] == [True] * 4 + [False, True]
+    assert results[4].status_code == 400
+    assert {r["body"] for r in stub_server.requests} == {message.payloads[0]}
+
+    stub_server.requests.clear()
+    results = teams.send_many(message, [stub_server.url, "http://127.0.0.1:1/unreachable"], max_concurrency=1)
+    assert [result.success for result in results] == [True, False]
+
+
+def test_teams_reset():
+    """
+    handmatig opgebouwd bericht leegmaken
+    """
+    teams = NotifyTeams(webhook=None)
+    teams.create_message_header(title="Pytest")
+    teams.create_buttons({"b": "https://x.nl"})
+    teams.reset()
+    assert teams.body == []
+    assert "actions" not in teams.msg["attachments"][0]["content"]
+
+
 if __name__ == "__main__":
     test_teams_with_df()
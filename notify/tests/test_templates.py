@@ -0,0 +1,180 @@
+import json
+
+import pandas as pd
+import pytest
+
+from notify import NotifyMail, NotifyTeams, templates
+from notify.templates import CardTemplate, Html, MailTemplate, get_template, register_template
+from notify.types import RetryPolicy
+
+
+def basic_payload(**kwargs) -> dict:
+    """
+    Message that `NotifyTeams.basic_message` builds for the same arguments.
+    """
+    df = kwargs.pop("df", None)
+    teams = NotifyTeams(webhook=None)
+    teams.create_message_header(kwargs["title"], kwargs.get("subtitle"))
+    if kwargs.get("warning_message"):
+        teams.create_warning_message(kwargs["warning_message"])
+    if kwargs.get("message"):
+        teams.create_simple_message(kwargs["message"])
+    if df is not None:
+        teams.add_full_dataframe(df)
+    if kwargs.get("buttons"):
+        teams.create_buttons(kwargs["buttons"])
+    if kwargs.get("extra"):
+        teams.add_extra_elements(kwargs["extra"])
+    teams.msg["attachments"][0]["content"]["body"] = teams.body
+    return teams.msg
+
+
+def test_card_template_same_as_basic_message():
+    """
+    een template geeft hetzelfde bericht als basic_message met de ingevulde teksten
+    """
+    template = CardTemplate(
+        title="Job {job} failed",
+        subtitle="Run {run}",
+        message='Error: {error}<br>Rows: {rows:,}<br>Quote " and {{braces}}',
+        warning_message="Check {job}",
+        buttons={"Logs": "https://logs.example.com/{run}"},
+    )
+    payload = template.render(job="import", run=17, error='key "ü" <missing>', rows=12345)
+
+    expected = basic_payload(
+        title="Job import failed",
+        subtitle="Run 17",
+        message='Error: key "ü" <missing><br>Rows: 12,345<br>Quote " and {braces}',
+        warning_message="Check import",
+        buttons={"Logs": "https://logs.example.com/17"},
+    )
+    assert json.loads(payload) == expected
+
+
+def test_card_template_literal_braces():
+    """
+    accolades in extra items en knopnamen zijn geen velden
+    """
+    extra = [{"index": 1, "item": {"type": "TextBlock", "text": 'Query: {"id": {id}}'}}]
+    template = CardTemplate(
+        title="Job {job} failed", buttons={"Logs {latest}": "https://logs.example.com"}, extra=extra
+    )
+    payload = template.render(job="import")
+
+    expected = basic_payload(
+        title="Job import failed", buttons={"Logs {latest}": "https://logs.example.com"}, extra=extra
+    )
+    assert json.loads(payload) == expected
+
+
+def test_card_template_table():
+    """
+    een template met een tabel, met en zonder df
+    """
+    template = CardTemplate(title="Report {name}", table=True, buttons={"Open": "https://example.com"})
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", None]})
+
+    payload = template.render(df=df, name="daily")
+    assert json.loads(payload) == basic_payload(title="Report daily", df=df, buttons={"Open": "https://example.com"})
+
+    payload = template.render(name="daily")
+    assert json.loads(payload) == basic_payload(title="Report daily", buttons={"Open": "https://example.com"})
+
+
+def test_card_template_errors():
+    """
+    ontbrekende parameters en een df zonder tabel geven een duidelijke fout
+    """
+    template = CardTemplate(title="Job {job} failed")
+    with pytest.raises(ValueError, match="job"):
+        template.render()
+    with pytest.raises(ValueError, match="table=True"):
+        template.render(df=pd.DataFrame({"a": [1]}), job="import")
+
+
+def test_template_message(stub_server, monkeypatch):
+    """
+    versturen van een bericht met een geregistreerde template
+    """
+    monkeypatch.setattr(templates, "_templates", {})
+    register_template("job failed", CardTemplate(title="Job {job} failed", message="{error}"))
+    teams = NotifyTeams(webhook=f"{stub_server.url}/webhook", retry=RetryPolicy(max_retries=0))
+
+    result = teams.template_message("job failed", job="import", error="timeout")
+
+    assert result.success
+    assert json.loads(stub_server.requests[0]["body"]) == basic_payload(title="Job import failed", message="timeout")
+    assert stub_server.requests[0]["headers"]["Content-Type"] == "application/json"
+
+
+def test_get_template_unknown():
+    with pytest.raises(KeyError, match="unknown"):
+        get_template("unknown")
+
+
+def test_mail_template(stub_server, stub_graph):
+    """
+    parameters in een mail worden ge-escaped, behalve Html
+    """
+    template = MailTemplate(subject="Invoice {number}", message="<p>Dear {name},</p>{details}", cc="cc@example.com")
+
+    subject, message = template.render(number=42, name="<Jan & Piet>", details=Html("<b>paid</b>"))
+    assert subject == "Invoice 42"
+    assert message == "<p>Dear &lt;Jan &amp; Piet&gt;,</p><b>paid</b>"
+
+    mail = template.create_mail(to="to@example.com", graph=stub_graph, number=42, name="Jan", details="")
+    assert mail.send_email()
+
+    message = json.loads(stub_server.requests[0]["body"])["Message"]
+    assert message["subject"] == "Invoice 42"
+    assert message["body"]["content"].startswith("<p>Dear Jan,</p>")
+    assert message["ccRecipients"][0]["emailAddress"]["address"] == "cc@example.com"
+
+
+def test_mail_merge(stub_server, stub_graph, tmp_path):
+    """
+    persoonlijke mail per rij, tabel en bijlagen worden eenmalig gemaakt en gedeeld
+    """
+    path = tmp_path / "terms.txt"
+    path.write_bytes(b"Terms and conditions")
+    recipients = pd.DataFrame(
+        {
+            "email": ["a@example.com", "b@example.com", "c@example.com"],
+            "name": ["Ann", "<Bob>", None],
+            "amount": [1, 2, 3],
+        }
+    )
+    df = pd.DataFrame({"product": [f"product {i}" for i in range(50)], "sales": range(50)})
+    accepted = {"responses": [{"id": str(i), "status": 202} for i in range(3)]}
+    stub_server.responses = [(200, {}, accepted)]
+    results = NotifyMail.mail_merge(
+        recipients,
+        subject="Your figures: {amount}",
+        message="<p>Dear {name},</p>",
+        files={"terms.txt": str(path)},
+        df=df,
+        max_rows=10,
+        overflow="csv",
+        graph=stub_graph,
+        batch=True,
+    )
+    assert [(result.to, result.success) for result in results] == [
+        ("a@example.com", True),
+        ("b@example.com", True),
+        ("c@example.com", True),
+    ]
+
+    (batch,) = stub_server.requests
+    messages = [request["body"]["Message"] for request in json.loads(batch["body"])["requests"]]
+    assert [message["subject"] for message in messages] == ["Your figures: 1", "Your figures: 2", "Your figures: 3"]
+    bodies = [message["body"]["content"] for message in messages]
+    assert [body[: body.index("</p>")] for body in bodies] == ["<p>Dear Ann,", "<p>Dear &lt;Bob&gt;,", "<p>Dear ,"]
+    assert all("<td>product 9</td>" in body and "<td>product 10</td>" not in body for body in bodies)
+    assert all([a["name"] for a in message["attachments"]] == ["terms.txt", "table.csv.gz"] for message in messages)
+
+    template = MailTemplate(subject="Figures", message="Dear {name}", files={"terms.txt": str(path)})
+    mails = template.merge(recipients, df=df, graph=stub_graph)
+    assert mails[0].attachments is mails[2].attachments
+    with pytest.raises(ValueError):
+        template.merge(recipients, to="address", graph=stub_graph)
@@ -0,0 +1,168 @@
+import json
+import time
+
+from notify import NotifyMail, NotifyTeams
+from notify.throttle import ROLLUP_RETENTION, Throttle, rollup_text
+from notify.types import RetryPolicy, ThrottleDecision
+
+
+def test_throttle_duplicates():
+    """
+    hetzelfde bericht binnen het venster wordt onderdrukt, daarna verstuurd met het aantal onderdrukte berichten
+    """
+    throttle = Throttle(window=0.2)
+    assert throttle.check("webhook", "Job failed").allowed
+    assert throttle.check("webhook", "Job failed") == ThrottleDecision(allowed=False, reason="duplicate")
+    assert not throttle.check("webhook", "Job failed").allowed
+    assert throttle.check("webhook", "Job succeeded").allowed
+    assert throttle.check("other webhook", "Job failed").allowed
+
+    time.sleep(0.25)
+    decision = throttle.check("webhook", "Job failed")
+    assert decision.allowed
+    assert decision.duplicates == 2
+    assert rollup_text(decision) == "2 similar notifications were suppressed."
+
+
+def test_throttle_rate_limit():
+    """
+    token bucket per kanaal
+    """
+    throttle = Throttle(window=0, rate=600, burst=2)
+    decisions = [throttle.check("webhook", f"Message {i}") for i in range(4)]
+    assert [decision.allowed for decision in decisions] == [True, True, False, False]
+    assert decisions[2].reason == "rate_limit"
+    assert throttle.check("other webhook", "Message").allowed
+
+    time.sleep(0.15)  # 600 per minute refills a token every 0.1 seconds
+    decision = throttle.check("webhook", "Message 4")
+    assert decision.allowed
+    assert decision.rate_limited == 2
+    assert not throttle.check("webhook", "Message 5").allowed
+
+
+def test_throttle_shared_database(tmp_path):
+    """
+    meerdere processen delen de staat via SQLite
+    """
+    path = str(tmp_path / "throttle.db")
+    assert Throttle(path=path).check("webhook", "Job failed").allowed
+    assert not Throttle(path=path).check("webhook", "Job failed").allowed
+
+    decision = Throttle(window=0, path=path).check("webhook", "Job failed")
+    assert decision.allowed
+    assert decision.duplicates == 1
+
+
+def test_teams_throttle(stub_server):
+    """
+    een flapperende job stuurt een bericht, plus een samenvatting na het venster
+    """
+    throttle = Throttle(window=0.2)
+    teams = NotifyTeams(webhook=stub_server.url, throttle=throttle)
+    results = [teams.basic_message(title="Job failed") for _ in range(5)]
+    assert [result.suppressed for result in results] == [False, True, True, True, True]
+    assert len(stub_server.requests) == 1
+
+    time.sleep(0.25)
+    assert teams.basic_message(title="Job failed").success
+    first, second = (json.loads(r["body"])["attachments"][0]["content"]["body"] for r in stub_server.requests)
+    assert second[:-1] == first
+    assert second[-1]["text"] == "4 similar notifications were suppressed."
+
+
+def test_mail_throttle(stub_server, stub_graph):
+    """
+    e-mails met dezelfde ontvangers, onderwerp en bericht worden onderdrukt
+    """
+    throttle = Throttle(window=0.2)
+
+    def mail(to: str = "user@example.com") -> NotifyMail:
+        return NotifyMail(to=to, subject="Job failed", message="Error", graph=stub_graph, throttle=throttle)
+
+    assert mail().send_email()
+    assert not mail().send_email()
+    results = NotifyMail.send_many([mail(), mail("other@example.com")])
+    assert [(result.success, result.suppressed) for result in results] == [(False, True), (True, False)]
+    assert len(stub_server.requests) == 2
+
+    time.sleep(0.25)
+    assert mail().send_email()
+    body = json.loads(stub_server.requests[-1]["body"])["Message"]["body"]["content"]
+    assert body.endswith("<p>2 similar notifications were suppressed.</p>")
+
+
+def test_teams_throttle_failed_post(stub_server):
+    """
+    een bericht dat niet aankomt wordt niet als verstuurd geregistreerd, de retry wordt niet onderdrukt
+    """
+    throttle = Throttle(window=60, rate=60, burst=1)
+    teams = NotifyTeams(webhook=stub_server.url, throttle=throttle, retry=RetryPolicy(max_retries=0))
+    stub_server.responses = [(429, {"Retry-After": "0"}, b""), (200, {}, b"1")]
+    failed = teams.basic_message(title="Job failed")
+    assert not failed.success and not failed.suppressed
+
+    assert teams.basic_message(title="Job failed").success
+    assert len(stub_server.requests) == 2
+    assert teams.basic_message(title="Job failed").suppressed
+
+
+def test_throttle_release_keeps_counts():
+    throttle = Throttle(window=0.1)
+    throttle.check("webhook", "Job failed")
+    throttle.check("webhook", "Job failed")
+    time.sleep(0.15)
+    decision = throttle.check("webhook", "Job failed")
+    assert decision.duplicates == 1
+
+    throttle.release(decision)
+    decision = throttle.check("webhook", "Job failed")
+    assert decision.allowed and decision.duplicates == 1
+
+
+def test_mail_throttle_failed_post(stub_server, stub_graph):
+    throttle = Throttle(window=60)
+    stub_server.responses = [(400, {}, {"error": {"code": "ErrorInvalidRecipients", "message": "Invalid"}})]
+    mails = [
+        NotifyMail(to="user@example.com", subject="Job failed", message="Error", graph=stub_graph, throttle=throttle)
+    ]
+    assert not NotifyMail.send_many(mails)[0].success
+
+    mail = NotifyMail(to="user@example.com", subject="Job failed", message="Error", graph=stub_graph, throttle=throttle)
+    assert mail.send_email()
+
+
+def test_mail_throttle_per_recipient(stub_server, stub_graph):
+    """
+    elke ontvanger heeft een eigen rate limit, en mails met een andere tabel zijn geen duplicaten
+    """
+    throttle = Throttle(window=60, rate=1, burst=1)
+
+    def mail(to: str, df=None) -> NotifyMail:
+        return NotifyMail(to=to, subject="Report", message="Report", df=df, graph=stub_graph, throttle=throttle)
+
+    assert mail("a@example.com").send_email()
+    assert not mail("b@example.com,A@example.com", df=[{"x": 1}]).send_email()
+    assert mail("b@example.com").send_email()
+
+    throttle = Throttle(window=60)
+    assert mail("a@example.com", df=[{"x": 1}]).send_email()
+    assert mail("a@example.com", df=[{"x": 2}]).send_email()
+    assert not mail("a@example.com", df=[{"x": 2}]).send_email()
+
+
+def test_throttle_prune(monkeypatch):
+    """
+    oude tellingen van onderdrukte berichten worden opgeruimd
+    """
+    throttle = Throttle(window=10)
+    throttle.check("webhook", "Job failed")
+    throttle.check("webhook", "Job failed")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 10 + ROLLUP_RETENTION + 1)
+    assert throttle.check("webhook", "Other").allowed
+    with throttle._connect() as connection:
+        keys = [key for (key,) in connection.execute("SELECT key FROM throttle_messages")]
+        channels = connection.execute("SELECT COUNT(*) FROM throttle_channels").fetchone()[0]
+    assert len(keys) == 1 and channels == 1
@@ -0,0 +1,74 @@
+import time
+
+from notify.msgraph import Graph
+from notify.token_cache import CachedCredential
+
+
+class ExpiringCredential:
+    """
+    Credential returning a new token per call, expiring after `lifetime` seconds.
+    """
+
+    def __init__(self, lifetime: int = 3600):
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+
+        self.calls += 1
+        return AccessToken(f"token-{self.calls}", int(time.time()) + self.lifetime)
+
+
+def test_token_cache_shared(tmp_path):
+    """
+    een nieuw proces gebruikt de token uit de cache, versleuteld opgeslagen
+    """
+    path = str(tmp_path / "tokens.db")
+    first = ExpiringCredential()
+    assert CachedCredential(first, secret="secret", path=path).get_token("scope").token == "token-1"
+    assert CachedCredential(first, secret="secret", path=path).get_token("scope").token == "token-1"
+    assert first.calls == 1
+    assert b"token-1" not in (tmp_path / "tokens.db").read_bytes()
+
+    other = ExpiringCredential()
+    assert CachedCredential(other, secret="other secret", path=path).get_token("scope").token == "token-1"
+    assert CachedCredential(other, secret="secret", path=path).get_token("other scope").token == "token-2"
+    assert other.calls == 2
+
+
+def test_token_cache_refresh(tmp_path):
+    """
+    een token die bijna verloopt wordt op de achtergrond vernieuwd, een verlopen token direct
+    """
+    credential = ExpiringCredential(lifetime=120)
+    cache = CachedCredential(credential, secret="secret", path=str(tmp_path / "tokens.db"), refresh_margin=300)
+    assert cache.get_token("scope").token == "token-1"
+    credential.lifetime = 3600
+    assert cache.get_token("scope").token == "token-1"  # still valid, refreshed in the background
+    for _ in range(100):
+        if credential.calls == 2 and not cache._refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get_token("scope").token == "token-2"
+    assert credential.calls == 2
+
+    credential.lifetime = 30
+    cache = CachedCredential(credential, secret="secret", path=str(tmp_path / "expired.db"))
+    assert cache.get_token("scope").token == "token-3"
+    assert cache.get_token("scope").token == "token-4"
+    assert cache.get_token("scope", claims='{"access_token": {}}').token == "token-5"
+
+
+def test_graph_token_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("MAIL_TOKEN_CACHE", str(tmp_path / "tokens.db"))
+    graph = Graph(tenant_id="tenant", client_id="client", client_secret="secret")
+    graph.ensure_graph_for_app_only_auth()
+    assert isinstance(graph.client_credential, CachedCredential)
+    assert graph.client_credential.path == str(tmp_path / "tokens.db")
+    graph.close()
+
+    graph = Graph(tenant_id="tenant", client_id="client", client_secret="secret", token_cache=False)
+    graph.ensure_graph_for_app_only_auth()
+    assert not isinstance(graph.client_credential, CachedCredential)
+    graph.close()
@@ -0,0 +1,118 @@
+import gc
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from babel.numbers import format_currency, format_decimal
+
+from notify import format_numbers
+from notify.tests import import_sample_dfs
+from notify.utils import HTML_HEAD, dataframe_to_html, escape_markdown, iter_html_table, paused_gc
+
+VALUES = [0.0, -0.0, 1.5, -1234567.891, 2.675, 0.125, -0.001, 9.995, 1e20, np.nan, np.inf]
+
+
+@pytest.mark.parametrize("locale", ["nl_NL", "en_US", "fr_FR", "en_IN"])
+def test_format_numbers_same_as_babel(locale):
+    """
+    snelle opmaak geeft dezelfde tekst als babel, ook bij afronden en bijzondere waarden
+    """
+    df = pd.DataFrame({"amount": VALUES, "number": VALUES})
+    expected_amount = [format_currency(x, currency="USD", locale=locale) for x in VALUES]
+    expected_number = [format_decimal(x, locale=locale) for x in VALUES]
+
+    df = format_numbers(df, currency_columns=["amount"], number_columns=["number"], locale=locale, currency="USD")
+    assert df["amount"].tolist() == expected_amount
+    assert df["number"].tolist() == expected_number
+
+
+def test_format_numbers_not_inplace():
+    df = import_sample_dfs().get("Transactions")
+    amounts = df["amount"].copy()
+
+    formatted = format_numbers(df, currency_columns=["amount"], inplace=False)
+    pd.testing.assert_series_equal(df["amount"], amounts)
+    assert formatted["amount"].tolist() == [format_currency(x, currency="EUR", locale="nl_NL") for x in amounts]
+
+
+def test_format_numbers_text_column():
+    df = pd.DataFrame({"number": ["1234.5", "7"]})
+    df = format_numbers(df, number_columns=["number"])
+    assert df["number"].tolist() == ["1.234,5", "7"]
+
+
+def test_dataframe_to_html():
+    """
+    html tabel met escaping, lege waarden, formatters en opmaak per rij
+    """
+    df = pd.DataFrame({"name": ["<b>x</b>", None], "amount": [1.5, -2.0]})
+    html = dataframe_to_html(
+        df,
+        formatters={"amount": lambda x: f"{x:.2f}"},
+        row_style=lambda df: np.where(df["amount"] < 0, "color: red;", ""),
+    )
+
+    assert html.startswith(HTML_HEAD) and html.endswith("</body>")
+    assert "<th>name</th><th>amount</th>" in html
+    assert "<tr><td>&lt;b&gt;x&lt;/b&gt;</td><td>1.50</td></tr>" in html
+    assert '<tr style="color: red;"><td></td><td>-2.00</td></tr>' in html
+
+
+def test_dataframe_to_html_rows():
+    df = import_sample_dfs().get("Transactions")
+    html = dataframe_to_html(df)
+    assert html.count("<tr>") == df.shape[0]
+    assert "".join(iter_html_table(df)) in html
+
+
+def test_html_table_chunks():
+    """
+    de tabel wordt per blok rijen opgebouwd, met dezelfde uitkomst
+    """
+    df = pd.DataFrame({"name": ["a", "<b>", None, "d", "e"], "amount": [1.0, -2.0, 3.0, None, -5.0]})
+    kwargs = dict(
+        formatters={"amount": "{:.2f}".format}, row_style=lambda df: np.where(df["amount"] < 0, "color: red;", "")
+    )
+    chunks = list(iter_html_table(df, chunk_size=2, **kwargs))
+    assert "".join(chunks) == "".join(iter_html_table(df, **kwargs))
+    assert chunks.count('<tr style="color: red;"><td>&lt;b&gt;</td><td>-2.00</td></tr>\n') == 1
+    assert "".join(iter_html_table(df.head(0), chunk_size=2)).count("<tr") == 1
+
+
+def test_paused_gc_threads():
+    """
+    de garbage collector gaat pas weer aan als de laatste thread klaar is
+    """
+    started, done = threading.Event(), threading.Event()
+
+    def build():
+        with paused_gc():
+            started.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=build)
+    thread.start()
+    started.wait(5)
+    with paused_gc():
+        assert not gc.isenabled()
+    assert not gc.isenabled()
+    done.set()
+    thread.join()
+    assert gc.isenabled()
+
+    gc.disable()
+    try:
+        with paused_gc():
+            pass
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def test_escape_markdown():
+    assert escape_markdown(["*a* _b_", "`c` ~d~"]) == ["\\*a\\* \\_b\\_", "\\`c\\` \\~d\\~"]
+    assert escape_markdown(["1. one\n  + two", "- three"]) == ["1\\. one\n  \\+ two", "\\- three"]
+    assert escape_markdown(["2024-01-01", "-1.5", "1.5 x"]) == ["2024-01-01", "-1.5", "1.5 x"]
+    assert escape_markdown(["a\0- b", "*"]) == ["a\0\\- b", "\\*"]
+    assert escape_markdown([]) == []
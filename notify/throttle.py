@@ -0,0 +1,210 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+from notify.types import ThrottleDecision
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS throttle_messages (
+    key TEXT PRIMARY KEY,
+    sent REAL NOT NULL,
+    suppressed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS throttle_channels (
+    channel TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    suppressed INTEGER NOT NULL DEFAULT 0
+);
+"""
+# seconds between removing expired messages and idle channels
+PRUNE_INTERVAL = 60.0
+# seconds counts of suppressed notifications are kept after the window, to report them in a rollup
+ROLLUP_RETENTION = 24 * 3600.0
+
+
+class Throttle:
+    def __init__(self, window: float = 300.0, rate: float = None, burst: int = 10, path: str = None):
+        """
+        Suppression of duplicate notifications and rate limiting per channel, a webhook or the recipients of an e-mail.
+        A notification with the same content as one sent to the same channel within `window` seconds is suppressed.
+        Every channel has a token bucket of `burst` notifications, refilled with `rate` notifications per minute.
+        The number of suppressed notifications is reported with the next notification that is sent, see
+        `rollup_text`.
+
+        Parameters
+        ----------
+        window: float
+            seconds a notification with the same content is suppressed after it was sent, 0 for no deduplication
+        rate: float
+            notifications per minute per channel, None for no rate limit
+        burst: int
+            notifications a channel can send at once before the rate limit applies
+        path: str
+            path of a SQLite database to share the state between processes, the state is kept in memory when not given
+        """
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory = None
+        self._last_prune = 0.0
+        if path is None:
+            self._memory = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        with self._connect() as connection:
+            if path is not None:
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def check(self, channel, *content) -> ThrottleDecision:
+        """
+        Decide whether a notification is sent, and register it as sent when it is. When the notification is not
+        delivered after all, the registration is undone with `release`.
+
+        Parameters
+        ----------
+        channel: str or list of str
+            the webhook, or the recipients of an e-mail. With a list, every channel has its own rate limit and the
+            notification is only sent when all channels are within their limit.
+        content: str or bytes
+            content of the notification, notifications with the same content to the same channels are duplicates
+
+        Returns
+        -------
+        decision: ThrottleDecision
+        """
+        channels = (channel,) if isinstance(channel, str) else tuple(sorted(set(channel)))
+        digest = hashlib.blake2b(digest_size=16)
+        for part in content:
+            digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+            digest.update(b"\0")
+        key = f"{','.join(channels)}\0{digest.hexdigest()}"
+
+        now = time.time()
+        with self._transaction() as connection:
+            return self._decide(connection, channels, key, now)
+
+    def release(self, decision: ThrottleDecision) -> None:
+        """
+        Undo the registration of a notification that was allowed but not delivered, e.g. because the webhook returned
+        a 429 or 5xx. A retry of the notification is not suppressed as duplicate, the rate limit token is returned and
+        the suppressed notifications are reported with the next notification that is delivered.
+
+        Parameters
+        ----------
+        decision: ThrottleDecision
+            the decision of `check` for the notification
+        """
+        if not decision.allowed or decision.key is None:
+            return
+
+        with self._transaction() as connection:
+            # unless another notification registered the same content since, which is then the one that was sent.
+            connection.execute(
+                "UPDATE throttle_messages SET sent = ?, suppressed = suppressed + ? WHERE key = ? AND sent = ?",
+                (decision.previous or 0.0, decision.duplicates, decision.key, decision.sent),
+            )
+            for channel in decision.channels:
+                connection.execute(
+                    "UPDATE throttle_channels SET tokens = MIN(?, tokens + ?), suppressed = suppressed + ? "
+                    "WHERE channel = ?",
+                    (self.burst, 0 if self.rate is None else 1, decision.rate_limited, channel),
+                )
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as connection:
+            # BEGIN IMMEDIATE takes the write lock, so processes sharing the database see each others decisions.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _prune(self, connection: sqlite3.Connection, now: float) -> None:
+        # expired messages are removed after the window. Counts of suppressed notifications are kept for the next
+        # notification, until they are too old to be useful in a rollup.
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+
+        connection.execute(
+            "DELETE FROM throttle_messages WHERE (sent < ? AND suppressed = 0) OR sent < ?",
+            (now - self.window, now - self.window - ROLLUP_RETENTION),
+        )
+        connection.execute("DELETE FROM throttle_channels WHERE updated < ?", (now - ROLLUP_RETENTION,))
+        self._last_prune = now
+
+    def _decide(self, connection: sqlite3.Connection, channels: tuple, key: str, now: float) -> ThrottleDecision:
+        self._prune(connection, now)
+        message = connection.execute("SELECT sent, suppressed FROM throttle_messages WHERE key = ?", (key,)).fetchone()
+        if self.window and message is not None and now - message[0] < self.window:
+            connection.execute("UPDATE throttle_messages SET suppressed = suppressed + 1 WHERE key = ?", (key,))
+            return ThrottleDecision(allowed=False, reason="duplicate")
+
+        buckets = []
+        for channel in channels:
+            bucket = connection.execute(
+                "SELECT tokens, updated, suppressed FROM throttle_channels WHERE channel = ?", (channel,)
+            ).fetchone()
+            tokens, updated, rate_limited = bucket if bucket is not None else (self.burst, now, 0)
+            if self.rate is not None:
+                tokens = min(self.burst, tokens + (now - updated) * self.rate / 60)
+            buckets.append((channel, tokens, rate_limited))
+
+        if self.rate is not None and any(tokens < 1 for _, tokens, _ in buckets):
+            for channel, tokens, rate_limited in buckets:
+                connection.execute(
+                    "INSERT OR REPLACE INTO throttle_channels (channel, tokens, updated, suppressed) VALUES (?, ?, ?, ?)",
+                    (channel, tokens, now, rate_limited + 1),
+                )
+            return ThrottleDecision(allowed=False, reason="rate_limit")
+
+        for channel, tokens, _ in buckets:
+            connection.execute(
+                "INSERT OR REPLACE INTO throttle_channels (channel, tokens, updated, suppressed) VALUES (?, ?, ?, 0)",
+                (channel, tokens - 1 if self.rate is not None else tokens, now),
+            )
+        connection.execute(
+            "INSERT OR REPLACE INTO throttle_messages (key, sent, suppressed) VALUES (?, ?, 0)", (key, now)
+        )
+        return ThrottleDecision(
+            allowed=True,
+            duplicates=message[1] if message is not None else 0,
+            # a notification rate limited on several channels is counted on each of them
+            rate_limited=max(rate_limited for _, _, rate_limited in buckets),
+            key=key,
+            channels=channels,
+            sent=now,
+            previous=message[0] if message is not None else None,
+        )
+
+    @contextmanager
+    def _connect(self):
+        if self._memory is not None:
+            with self._lock:
+                yield self._memory
+        else:
+            # a connection per check, like the notification queue, so the throttle can be used across threads and forks.
+            with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+                # losing the last decisions on a power failure is harmless, so commits do not wait for the disk.
+                connection.execute("PRAGMA synchronous=NORMAL")
+                yield connection
+
+
+def rollup_text(decision: ThrottleDecision) -> str:
+    """
+    Text reporting the notifications that were suppressed before a notification that is sent, e.g.
+    "12 similar and 3 rate limited notifications were suppressed."
+    """
+    counts = []
+    if decision.duplicates:
+        counts.append(f"{decision.duplicates} similar")
+    if decision.rate_limited:
+        counts.append(f"{decision.rate_limited} rate limited")
+
+    return f"{' and '.join(counts)} notifications were suppressed."
@@ -0,0 +1,149 @@
+import base64
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    key TEXT PRIMARY KEY,
+    token BLOB NOT NULL,
+    expires_on INTEGER NOT NULL
+);
+"""
+# cached tokens are not used when they expire within this many seconds
+MIN_VALIDITY = 60
+
+
+def default_path() -> str:
+    """
+    Default location of the token cache, in the user cache directory.
+    """
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "notify", "tokens.db")
+
+
+class CachedCredential:
+    def __init__(self, credential, secret: str, path: str = None, refresh_margin: float = 300.0):
+        """
+        Credential that keeps access tokens in an encrypted SQLite database, shared by all processes using it. A new
+        process uses the cached token instead of requesting one from Azure AD. Tokens expiring within `refresh_margin`
+        seconds are refreshed in a background thread, while the cached token is still used.
+
+        Tokens are encrypted with a key derived from `secret`, so only processes knowing the secret can read them, and
+        tokens of other secrets are not used.
+
+        Parameters
+        ----------
+        credential: TokenCredential
+            credential requesting the tokens, e.g. a ClientSecretCredential
+        secret: str
+            secret the encryption key is derived from, e.g. the tenant, client id and client secret
+        path: str
+            path of the SQLite database, defaults to `default_path()`
+        refresh_margin: float
+            seconds before expiry a token is refreshed in the background
+        """
+        from cryptography.fernet import Fernet
+
+        digest = hashlib.sha256(f"notify-token-cache\0{secret}".encode("utf-8")).digest()
+        self.fernet = Fernet(base64.urlsafe_b64encode(digest))
+        self.namespace = hashlib.blake2b(digest, digest_size=16).hexdigest()
+        self.credential = credential
+        self.path = path or default_path()
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        os.chmod(self.path, 0o600)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get_token(self, *scopes, claims: str = None, tenant_id: str = None, **kwargs):
+        """
+        Get an access token for the scopes, from the cache when it is valid.
+
+        Returns
+        -------
+        token: AccessToken
+        """
+        if claims or tenant_id:
+            # a claims challenge or another tenant always needs a new token
+            return self.credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+
+        key = f"{self.namespace}:{' '.join(sorted(scopes))}"
+        token = self._tokens.get(key) or self._load(key)
+        remaining = token.expires_on - time.time() if token is not None else 0
+        if remaining <= MIN_VALIDITY:
+            return self._fetch(key, scopes, kwargs)
+
+        if remaining <= self.refresh_margin:
+            self._refresh_in_background(key, scopes, kwargs)
+        return token
+
+    def _fetch(self, key: str, scopes: tuple, kwargs: dict):
+        token = self.credential.get_token(*scopes, **kwargs)
+        self._tokens[key] = token
+        try:
+            with closing(self._connect()) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO tokens (key, token, expires_on) VALUES (?, ?, ?)",
+                    (key, self.fernet.encrypt(token.token.encode("utf-8")), token.expires_on),
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Access token not cached! Error: {e}")
+
+        return token
+
+    def _load(self, key: str):
+        from azure.core.credentials import AccessToken
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with closing(self._connect()) as connection:
+                row = connection.execute("SELECT token, expires_on FROM tokens WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Token cache not readable! Error: {e}")
+            return None
+
+        if row is None:
+            return None
+        try:
+            token = AccessToken(self.fernet.decrypt(row[0]).decode("utf-8"), row[1])
+        except InvalidToken:
+            return None
+
+        self._tokens[key] = token
+        return token
+
+    def _refresh_in_background(self, key: str, scopes: tuple, kwargs: dict) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(key, scopes, kwargs)
+            except Exception as e:
+                logging.warning(f"Access token not refreshed! Error: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="notify-token-refresh", daemon=True).start()
+
+    def close(self) -> None:
+        if hasattr(self.credential, "close"):
+            self.credential.close()
@@ -1,6 +1,112 @@
+from dataclasses import dataclass, field
 from typing import TypedDict
 
 
 class DfsInfo(TypedDict):
     df_name: str
     df_shape: tuple
+
+
+@dataclass
+class MailResult:
+    """
+    Result of sending a single e-mail in a batch.
+    """
+
+    index: int
+    to: str
+    success: bool
+    attempts: int
+    error: Exception = None
+    suppressed: bool = False
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retry policy for webhook requests. Throttled (429) and unavailable (5xx) responses and connection errors are retried
+    with an exponential backoff with jitter, honoring the `Retry-After` header.
+    """
+
+    max_retries: int = 3
+    backoff: float = 1.0
+    max_delay: float = 60.0
+
+
+@dataclass
+class DeliveryResult:
+    """
+    Result of posting a message to a webhook.
+    """
+
+    webhook: str
+    success: bool
+    status_code: int = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    error: Exception = None
+    response: object = None
+    suppressed: bool = False
+
+
+@dataclass(frozen=True)
+class TeamsMessage:
+    """
+    Serialized Teams message built by `NotifyTeams.build`, ready to be sent with `NotifyTeams.send`. A message that is
+    split holds one payload per part.
+    """
+
+    payloads: tuple
+    split: bool = False
+
+    @property
+    def size(self) -> int:
+        """
+        Total size of the payloads in bytes.
+        """
+        return sum(len(payload) for payload in self.payloads)
+
+
+@dataclass
+class ThrottleDecision:
+    """
+    Decision of a Throttle on a notification. `reason` is "duplicate" or "rate_limit" for suppressed notifications.
+    For notifications that are sent, `duplicates` and `rate_limited` count the notifications suppressed since the
+    previous one.
+    """
+
+    allowed: bool
+    reason: str = None
+    duplicates: int = 0
+    rate_limited: int = 0
+    # registration of an allowed notification, to undo it with `Throttle.release`
+    key: str = field(default=None, repr=False, compare=False)
+    channels: tuple = field(default=(), repr=False, compare=False)
+    sent: float = field(default=None, repr=False, compare=False)
+    previous: float = field(default=None, repr=False, compare=False)
+
+    @property
+    def suppressed(self) -> int:
+        """
+        Number of notifications suppressed since the previous notification that was sent.
+        """
+        return self.duplicates + self.rate_limited
+
+
+@dataclass
+class StageEvent:
+    """
+    Timing of a stage of a delivery, passed to the instrumentation hooks. `kind` is "mail" or "teams" and `parent` is
+    the stage it is part of, None for the delivery itself. Attributes that do not apply to the stage are None.
+    """
+
+    kind: str
+    stage: str
+    elapsed: float
+    parent: str = None
+    size: int = None
+    status_code: int = None
+    attempts: int = None
+    success: bool = None
+    suppressed: bool = None
+    error: Exception = None
@@ -1,23 +1,122 @@
-import os
+from __future__ import annotations
 
-import pandas as pd
-from babel.numbers import format_currency, format_decimal
+import gc
+import html
+import os
+import random
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from io import StringIO
+from itertools import islice
+from typing import TYPE_CHECKING
 
 from notify.exceptions import EnvironmentVariablesError
+from notify.tables import TableLike, as_table
+
+# pandas, numpy and babel are imported in the functions that use them, so importing the retry and table helpers of
+# this module is cheap for jobs that only send Teams messages.
+if TYPE_CHECKING:
+    import pandas as pd
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# number of threads in `paused_gc`, the collector is enabled again when the last one is done
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = True
+
+# markdown of the TextBlocks of Teams: characters for emphasis, links and code, and list markers at the start of a line
+_MARKDOWN_CHARACTERS = str.maketrans({character: f"\\{character}" for character in "\\*_[]()`~"})
+_LIST_MARKER = re.compile(r"(?:^|(?<=\0))([ \t]*)(?:([-+])|(\d+)\.)(?=\s)", re.MULTILINE)
+
+# head of the html e-mail with the style of the tables, the table and "</body>" follow
+HTML_HEAD = """
+<head>
+    <meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+    <title>Dataframe report</title>
+    <style type="text/css" media="screen">
+        h1 {
+            background-color: #a8a8a8;
+            display: flex;
+            flex-direction: column;
+            justify-content: center;
+            text-align: center;
+        }
+
+        .styled-table {
+            border-collapse: collapse;
+            margin: 25px 0;
+            font-size: 0.9em;
+            font-family: sans-serif;
+            min-width: 400px;
+            box-shadow: 0 0 20px rgba(0, 0, 0, 0.15);
+        }
+
+        .styled-table thead tr {
+            background-color: #009879;
+            color: #ffffff;
+            text-align: left;
+        }
+
+        .styled-table th,
+        .styled-table td {
+            padding: 12px 15px;
+        }
+
+        .styled-table tbody tr {
+            border-bottom: thin solid #dddddd;
+        }
+
+        .styled-table tbody tr:nth-of-type(even) {
+            background-color: #f3f3f3;
+        }
+
+        .styled-table tbody tr.active-row {
+            font-weight: bold;
+            color: #009879;
+        }
 
+        .styled-table tbody tr:last-of-type {
+            border-bottom: 2px solid #009879;
+        }
+    </style>
+</head>
+<body>"""
+HTML_FOOT = "</body>"
 
-def format_numbers(df: pd.DataFrame, currency_columns: list = None, number_columns: list = None):
+
+def format_numbers(
+    df: pd.DataFrame,
+    currency_columns: list = None,
+    number_columns: list = None,
+    locale: str = "nl_NL",
+    currency: str = "EUR",
+    inplace: bool = True,
+):
     """
-    This functions converts currencies (values) and numbers (digits) columns to formatted text columns.
+    This functions converts currencies (values) and numbers (digits) columns to formatted text columns. The pattern of
+    the locale is parsed once and numeric columns are formatted as a whole, values the fast path can not format
+    exactly like babel are formatted with babel.
 
     Parameters
     ----------
     df: pd.DataFrame
         Dataframe with columns which need to be formatted
     currency_columns: list
-        List of columns which will be formatted to currencies with a Euro sign
+        List of columns which will be formatted to currencies with the currency sign
     number_columns: list
-        List with columns which will be formatted to European standard.
+        List with columns which will be formatted as decimal numbers of the locale.
+    locale: str
+        locale of the formatting, defaults to dutch
+    currency: str
+        ISO 4217 code of the currency of the currency columns, defaults to euro
+    inplace: bool
+        convert the columns of `df` itself, otherwise a copy of `df` is converted
 
     Returns
     -------
@@ -32,16 +131,246 @@ def format_numbers(df: pd.DataFrame, currency_columns: list = None, number_colum
     if currency_columns is None:
         currency_columns = []
 
+    if not inplace:
+        df = df.copy()
+
     for col in currency_columns:
-        df[col] = df[col].apply(lambda x: format_currency(number=x, currency="EUR", locale="nl_NL"))
+        df[col] = format_series(df[col], locale=locale, currency=currency)
 
     # format de nummer kolommen
     for col in number_columns:
-        df[col] = df[col].apply(lambda x: format_decimal(number=x, locale="nl_NL"))
+        df[col] = format_series(df[col], locale=locale)
 
     return df
 
 
+def format_series(series: pd.Series, locale: str = "nl_NL", currency: str = None) -> pd.Series:
+    """
+    Format a column to text with the decimal or currency pattern of a locale. Gives the same text as babel's
+    `format_decimal` and `format_currency`.
+
+    Parameters
+    ----------
+    series: pd.Series
+        column with numbers
+    locale: str
+        locale of the formatting
+    currency: str
+        ISO 4217 code of the currency, the column is formatted as decimal numbers when not given
+
+    Returns
+    -------
+    formatted: pd.Series
+        column with the formatted numbers as text
+    """
+    import numpy as np
+    import pandas as pd
+    from babel.numbers import format_currency, format_decimal
+
+    if currency is None:
+
+        def babel_format(x):
+            return format_decimal(number=x, locale=locale)
+
+    else:
+
+        def babel_format(x):
+            return format_currency(number=x, currency=currency, locale=locale)
+
+    number_format = _number_format(locale, currency)
+    if number_format is None or series.dtype.kind not in "iuf":
+        return series.apply(babel_format)
+
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    digits = number_format.digits
+    with np.errstate(invalid="ignore", over="ignore"):
+        scaled = np.abs(values) * 10.0**digits
+        whole = np.floor(scaled)
+        fraction = scaled - whole
+        # babel rounds the decimal representation half to even. Values that are (nearly) a tie in floating point are
+        # left to babel, all other values round the same way on their binary representation. NaN and infinity too.
+        exact = np.isfinite(scaled) & (scaled < 2**53) & (np.abs(fraction - 0.5) > 4 * np.finfo("float64").eps * scaled)
+        rounded = np.where(exact, whole + (fraction > 0.5), 0).astype("int64")
+    integers = (rounded // 10**digits).tolist()
+    fractions = (rounded % 10**digits).tolist()
+    negative = np.signbit(values).tolist()
+
+    prefixes, suffixes, group, decimals = (
+        number_format.prefixes,
+        number_format.suffixes,
+        number_format.group_symbol,
+        number_format.decimals,
+    )
+    formatted = [
+        prefixes[sign] + f"{integer:,}".replace(",", group) + decimals[fraction] + suffixes[sign]
+        for integer, fraction, sign in zip(integers, fractions, negative)
+    ]
+    if not exact.all():
+        for i in np.flatnonzero(~exact).tolist():
+            formatted[i] = babel_format(series.iat[i])
+
+    return pd.Series(formatted, index=series.index, name=series.name, dtype="object")
+
+
+@dataclass(frozen=True)
+class _NumberFormat:
+    prefixes: tuple
+    suffixes: tuple
+    group_symbol: str
+    digits: int
+    # text of every possible fractional part, including the decimal symbol
+    decimals: tuple
+
+
+@lru_cache(maxsize=64)
+def _number_format(locale: str, currency: str = None):
+    # parse the babel pattern of the locale once. Patterns the fast path does not support return None and are formatted
+    # by babel: significant digits, scientific notation, percentages, grouping other than per thousand, padding of the
+    # integer part, currency names and more than 4 decimals.
+    from babel import Locale
+    from babel.numbers import get_currency_precision, get_currency_symbol, get_decimal_symbol, get_group_symbol
+
+    parsed = Locale.parse(locale)
+    pattern = parsed.decimal_formats[None] if currency is None else parsed.currency_formats["standard"]
+    if (
+        "@" in pattern.pattern
+        or "¤¤¤" in pattern.pattern
+        or pattern.exp_prec
+        or pattern.scale
+        or pattern.grouping != (3, 3)
+        or pattern.int_prec[0] > 1
+    ):
+        return None
+
+    if currency is None:
+        min_digits, digits = pattern.frac_prec
+    else:
+        min_digits = digits = get_currency_precision(currency)
+    if digits > 4:
+        return None
+
+    def affix(text: str) -> str:
+        if currency is not None:
+            text = text.replace("¤¤", currency.upper()).replace("¤", get_currency_symbol(currency, parsed))
+        return re.sub(r"'([^']*)'", lambda m: m.group(1) or "'", text)
+
+    decimal_symbol = get_decimal_symbol(parsed)
+    decimals = []
+    for fraction in range(10**digits):
+        text = f"{fraction:0{digits}d}" if digits else ""
+        text = text[:min_digits] + text[min_digits:].rstrip("0")
+        decimals.append(decimal_symbol + text if text else "")
+
+    return _NumberFormat(
+        prefixes=tuple(affix(prefix) for prefix in pattern.prefix),
+        suffixes=tuple(affix(suffix) for suffix in pattern.suffix),
+        group_symbol=get_group_symbol(parsed),
+        digits=digits,
+        decimals=tuple(decimals),
+    )
+
+
+def retry_delay(status_code: int, headers, attempt: int, backoff: float = 1.0, max_delay: float = 60.0):
+    """
+    Compute how long to wait before retrying a throttled or failed request. The `Retry-After` header is honored when
+    present, otherwise an exponential backoff with jitter is used.
+
+    Parameters
+    ----------
+    status_code: int
+        HTTP status code of the failed request
+    headers: Mapping
+        response headers of the failed request
+    attempt: int
+        number of attempts done so far (starting at 1)
+    backoff: float
+        base delay in seconds for the exponential backoff
+    max_delay: float
+        upper bound of the delay in seconds
+
+    Returns
+    -------
+    delay: float
+        seconds to wait, or None when the request should not be retried
+    """
+    if status_code not in RETRY_STATUS_CODES:
+        return None
+
+    retry_after = headers.get("Retry-After") if headers else None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+
+        if delay is not None:
+            return min(max(delay, 0.0), max_delay)
+
+    delay = backoff * 2 ** (attempt - 1)
+    return min(delay + random.uniform(0, delay / 2), max_delay)
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while building large, acyclic structures like the rows of a table. Without this,
+    the collector runs many times while the cells are allocated, which takes most of the build time. The collector is
+    paused until the last thread building a structure is done, and only enabled again when it was enabled before.
+    """
+    global _gc_pauses, _gc_was_enabled
+
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+def escape_markdown(texts: list) -> list:
+    """
+    Escape the markdown of Teams in the texts of e.g. a table column, so they are shown as is in a TextBlock: emphasis,
+    links, code and list markers. The texts are escaped in one pass over the joined column.
+
+    Parameters
+    ----------
+    texts: list of str
+        texts of e.g. the cells of a table column
+
+    Returns
+    -------
+    texts: list of str
+        texts with the markdown characters escaped with a backslash
+    """
+    if not texts:
+        return []
+
+    joined = "\0".join(texts)
+    if joined.count("\0") != len(texts) - 1:
+        # a text contains the separator, so the texts are escaped one by one
+        return [_escape_markdown(text) for text in texts]
+
+    return _escape_markdown(joined).split("\0")
+
+
+def _escape_markdown(text: str) -> str:
+    return _LIST_MARKER.sub(_escape_list_marker, text.translate(_MARKDOWN_CHARACTERS))
+
+
+def _escape_list_marker(match: re.Match) -> str:
+    indent, bullet, number = match.groups()
+    return f"{indent}\\{bullet}" if bullet else f"{indent}{number}\\."
+
+
 def check_environment_variables(required_variables: list):
     """
     Test if environment variables are set.
@@ -61,78 +390,101 @@ def check_environment_variables(required_variables: list):
         raise EnvironmentVariablesError(f"One of the environment variables {', '.join(required_variables)} is not set")
 
 
-def dataframe_to_html(df: pd.DataFrame) -> str:
+def iter_html_table(df: TableLike, formatters: dict = None, row_style=None, chunk_size: int = 10_000):
+    """
+    Render a table to an HTML table, one row at a time. The cells are converted and escaped per column for chunks of
+    `chunk_size` rows, so only the cells of one chunk are kept in memory.
+
+    Parameters
+    ----------
+    df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+        Table which needs to be converted to HTML
+    formatters: dict
+        column names and a function converting a value of the column to text as key value pairs, missing values stay
+        empty (optional)
+    row_style: Callable
+        function receiving `df` and returning the CSS style of every row, e.g.
+        `lambda df: np.where(df["amount"] < 0, "color: red;", "")` (optional)
+    chunk_size: int
+        number of rows converted at a time
+
+    Returns
+    -------
+    chunks: Iterator of str
+        the HTML table in chunks
+    """
+    table = as_table(df)
+    formatters = formatters or {}
+    yield '<table border="1" class="dataframe styled-table">\n<thead>\n<tr style="text-align: center;">'
+    yield "".join(f"<th>{html.escape(str(col))}</th>" for col in table.columns)
+    yield "</tr>\n</thead>\n<tbody>\n"
+
+    styles = iter(row_style(df)) if row_style is not None else None
+    for offset in range(0, table.num_rows, chunk_size):
+        chunk = table.slice(offset, offset + chunk_size)
+        columns = []
+        for position, col in enumerate(chunk.columns):
+            if col in formatters:
+                texts = chunk.format_column(position, formatters[col])
+            else:
+                texts = chunk.column_texts(position)
+            columns.append([f"<td>{html.escape(text, quote=False)}</td>" for text in texts])
+
+        if styles is None:
+            starts = ["<tr>"] * chunk.num_rows
+        else:
+            starts = [
+                f'<tr style="{html.escape(style)}">' if isinstance(style, str) and style else "<tr>"
+                for style in islice(styles, chunk.num_rows)
+            ]
+
+        for start, *cells in zip(starts, *columns):
+            yield start + "".join(cells) + "</tr>\n"
+
+    yield "</tbody>\n</table>"
+
+
+def write_dataframe(df: TableLike, path: str, file_format: str = "csv", chunk_size: int = 100_000) -> None:
+    """
+    Write a table to a gzip compressed CSV or a Parquet file in chunks of rows, so no full copy of the file is built
+    in memory.
+
+    Parameters
+    ----------
+    df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+        Table to write
+    path: str
+        path of the file
+    file_format: str
+        "csv" for a gzip compressed CSV, or "parquet" (requires pyarrow)
+    chunk_size: int
+        number of rows written at a time
+    """
+    as_table(df).write(path, file_format=file_format, chunk_size=chunk_size)
+
+
+def dataframe_to_html(df: TableLike, formatters: dict = None, row_style=None) -> str:
     """
     This functions converts a dataframe to an HTML table.
 
     Parameters
     ----------
-    df: pd.DataFrame
-        Dataframe which needs to be converted to HTML
+    df: pd.DataFrame, pyarrow.Table, polars.DataFrame or iterable of rows
+        Table which needs to be converted to HTML
+    formatters: dict
+        column names and a function converting a value of the column to text as key value pairs (optional)
+    row_style: Callable
+        function receiving the dataframe and returning the CSS style of every row (optional)
 
     Returns
     -------
     pretty_html_table: str
         html body with generated HTML table
     """
+    buffer = StringIO()
+    buffer.write(HTML_HEAD)
+    for chunk in iter_html_table(df, formatters=formatters, row_style=row_style):
+        buffer.write(chunk)
+    buffer.write(HTML_FOOT)
 
-    html_table = df.to_html(index=False, classes="styled-table", justify="center")
-
-    pretty_html_table = (
-        """
-        <head>
-            <meta http-equiv="Content-Type" content="text/html; charset=utf-8">
-            <title>Dataframe report</title>
-            <style type="text/css" media="screen">
-                h1 {
-                    background-color: #a8a8a8;
-                    display: flex;
-                    flex-direction: column;
-                    justify-content: center;
-                    text-align: center;
-                }
-
-                .styled-table {
-                    border-collapse: collapse;
-                    margin: 25px 0;
-                    font-size: 0.9em;
-                    font-family: sans-serif;
-                    min-width: 400px;
-                    box-shadow: 0 0 20px rgba(0, 0, 0, 0.15);
-                }
-
-                .styled-table thead tr {
-                    background-color: #009879;
-                    color: #ffffff;
-                    text-align: left;
-                }
-
-                .styled-table th,
-                .styled-table td {
-                    padding: 12px 15px;
-                }
-
-                .styled-table tbody tr {
-                    border-bottom: thin solid #dddddd;
-                }
-
-                .styled-table tbody tr:nth-of-type(even) {
-                    background-color: #f3f3f3;
-                }
-
-                .styled-table tbody tr.active-row {
-                    font-weight: bold;
-                    color: #009879;
-                }
-
-                .styled-table tbody tr:last-of-type {
-                    border-bottom: 2px solid #009879;
-                }
-            </style>
-        </head>
-        <body>"""
-        + html_table
-        + "</body>"
-    )
-
-    return pretty_html_table
+    return buffer.getvalue()
@@ -0,0 +1,149 @@
+import asyncio
+import gzip
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from notify.types import DeliveryResult, RetryPolicy
+from notify.utils import retry_delay
+
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+DEFAULT_RETRY = RetryPolicy()
+# bodies smaller than this are sent uncompressed, as gzip would barely make them smaller
+GZIP_MIN_SIZE = 1024
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client for the host of an url. Clients keep their connections alive, so messages to the same
+    host reuse the TLS connection. Clients must be used on the shared notify event loop.
+
+    Parameters
+    ----------
+    url: str
+        url of the webhook
+
+    Returns
+    -------
+    client: httpx.AsyncClient
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT)
+            _clients[key] = client
+
+    return client
+
+
+async def close_clients() -> None:
+    """
+    Close the shared HTTP clients. New clients are created on next use.
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        await client.aclose()
+
+
+async def post(
+    url: str,
+    content: bytes = None,
+    json: dict = None,
+    headers: dict = None,
+    timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+    retry: RetryPolicy = DEFAULT_RETRY,
+    compress: bool = False,
+) -> DeliveryResult:
+    """
+    Post a message to a webhook over the pooled client of its host, retrying throttled and failed requests.
+
+    Parameters
+    ----------
+    url: str
+        url of the webhook
+    content: bytes
+        body of the request
+    json: dict
+        body of the request, serialized to JSON
+    headers: dict
+        headers of the request
+    timeout: httpx.Timeout
+        connect and read timeouts
+    retry: RetryPolicy
+        retry policy for throttled and failed requests
+    compress: bool
+        gzip `content` with a Content-Encoding header, when it is larger than GZIP_MIN_SIZE
+
+    Returns
+    -------
+    result: DeliveryResult
+        result of the last attempt
+    """
+    if compress and content is not None and len(content) >= GZIP_MIN_SIZE:
+        # compressed once, retries send the same body.
+        content = gzip.compress(content, compresslevel=6)
+        headers = {**(headers or {}), "Content-Encoding": "gzip"}
+
+    client = get_client(url)
+    start = time.perf_counter()
+    attempts = 0
+    while True:
+        attempts += 1
+        response, error = None, None
+        try:
+            response = await client.post(url, content=content, json=json, headers=headers, timeout=timeout)
+            status_code, retry_headers = response.status_code, response.headers
+            if response.is_success:
+                return DeliveryResult(
+                    webhook=url,
+                    success=True,
+                    status_code=status_code,
+                    attempts=attempts,
+                    elapsed=time.perf_counter() - start,
+                    response=response,
+                )
+            error = httpx.HTTPStatusError(
+                f"Webhook returned {status_code}", request=response.request, response=response
+            )
+        except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+            # connection errors and timeouts are retried like an unavailable service.
+            status_code, retry_headers, error = 503, None, e
+
+        delay = retry_delay(status_code, retry_headers, attempts, backoff=retry.backoff, max_delay=retry.max_delay)
+        if delay is None or attempts > retry.max_retries:
+            return DeliveryResult(
+                webhook=url,
+                success=False,
+                status_code=response.status_code if response is not None else None,
+                attempts=attempts,
+                elapsed=time.perf_counter() - start,
+                error=error,
+                response=response,
+            )
+
+        logging.info(f"Webhook request failed ({error}), retrying in {delay:.1f}s.")
+        await asyncio.sleep(delay)
+
+
+def _reset_after_fork() -> None:
+    # clients belong to the event loop of the parent process, the child creates its own.
+    global _clients_lock
+
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)